@@ -0,0 +1,78 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+# プロセス内の LRU + TTL キャッシュ（スレッドセーフではないが、イベントループ上では await を挟まないので安全）
+
+class TTLCache:
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        on_remove: Optional[Callable[[Hashable, Any], None]] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._on_remove = on_remove
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            self.expirations += 1
+            self.misses += 1
+            self._remove(key)
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if key in self._data:
+            self._data.move_to_end(key)
+        self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        while len(self._data) > self.maxsize:
+            oldest = next(iter(self._data))
+            self.evictions += 1
+            self._remove(oldest)
+
+    def invalidate(self, key: Hashable) -> bool:
+        if key not in self._data:
+            return False
+        self.invalidations += 1
+        self._remove(key)
+        return True
+
+    def clear(self):
+        for key in list(self._data):
+            self._remove(key)
+
+    def _remove(self, key: Hashable):
+        value, _ = self._data.pop(key)
+        if self._on_remove is not None:
+            self._on_remove(key, value)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,48 @@
+import os
+from typing import Optional, Tuple
+from fastapi import Request, Response, status
+from app.core.cache import TTLCache
+
+# ETag による条件付き GET
+#
+# ユーザーごとの users.data_version を、設定・ユーザー情報・トレーニング記録・ゆっちんの書き込みで上げ、
+# GET /settings/me などの ETag に埋め込む。If-None-Match が一致すれば集計もシリアライズもせずに 304 を返す。
+# バージョンは短い TTL でプロセス内にキャッシュするので、当たれば 304 は DB に触れない
+# （同じプロセスでの書き込みはコミット後にすぐ消す。他のワーカーでの書き込みは TTL が切れるまで反映されない）。
+
+DATA_VERSION_CACHE_SIZE = int(os.getenv("DATA_VERSION_CACHE_SIZE", "10000"))
+DATA_VERSION_CACHE_TTL_SECONDS = float(os.getenv("DATA_VERSION_CACHE_TTL_SECONDS", "2"))
+
+# user_id -> (data_version, タイムゾーン名)
+data_version_cache = TTLCache(maxsize=DATA_VERSION_CACHE_SIZE, ttl=DATA_VERSION_CACHE_TTL_SECONDS)
+
+def get_cached_data_version(user_id: int) -> Optional[Tuple[int, str]]:
+    return data_version_cache.get(user_id)
+
+def cache_data_version(user_id: int, version: int, timezone: str):
+    data_version_cache.set(user_id, (version, timezone))
+
+def invalidate_data_version(user_id: int):
+    data_version_cache.invalidate(user_id)
+
+def weak_etag(*parts) -> str:
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match は弱い比較（W/ を無視）で、カンマ区切りの複数指定と * に対応する
+    if not if_none_match:
+        return False
+    etag = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+def not_modified_or_tag(request: Request, response: Response, etag: str) -> Optional[Response]:
+    # 一致すれば 304 のレスポンスを返す。一致しなければ ETag を付けて None（ハンドラはそのまま本文を作る）
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
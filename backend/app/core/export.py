@@ -0,0 +1,44 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Sequence
+
+# training_logs のエクスポート用に、行のストリームを NDJSON / CSV のチャンクへ変換する
+# 1 行ずつ yield すると送信回数が増えるので、ある程度まとめてから返す
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+CHUNK_SIZE = 64 * 1024
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+async def format_rows(rows: AsyncIterator[tuple], columns: Sequence[str], fmt: str) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    if fmt == "csv":
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+
+        def write(row):
+            writer.writerow(["" if v is None else v.isoformat() if isinstance(v, datetime) else v for v in row])
+    elif fmt == "ndjson":
+        def write(row):
+            buffer.write(json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False))
+            buffer.write("\n")
+    else:
+        raise ValueError(f"unsupported export format: {fmt}")
+
+    async for row in rows:
+        write(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,144 @@
+import heapq
+import os
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+from app.models.settings import DEFAULT_TIMEZONE
+
+# 週間・月間・累計ランキングのメモリ上のインデックス（DB に触れない部分）
+#
+# ボード (期間, 期間の初日, 種目) ごとに、全ユーザーのスコアの降順リストと上位 LEADERBOARD_TOP_K 人を持つ。
+# 順位は二分探索、上位 N 人はリストの先頭を切り出すだけなので、ユーザー数が増えても読み取りはほぼ一定。
+# スコアはログの追加でしか増えないので、上位 K 人は追加分を反映していくだけで正確に保てる。
+#
+# 期間の区切りは全ユーザー共通で LEADERBOARD_TIMEZONE の日付（週は月曜始まり）。
+# スコアは期間の初日ごとに別の行なので、期間が切り替わっても集計し直す必要はなく、新しい期間のボードを読み込むだけ。
+
+PERIODS = ("week", "month", "all")
+ALL_TIME_START = date(1970, 1, 1)
+# m0007 で既存のログを集計したときと同じタイムゾーン
+LEADERBOARD_TIMEZONE = ZoneInfo(DEFAULT_TIMEZONE)
+LEADERBOARD_TOP_K = int(os.getenv("LEADERBOARD_TOP_K", "100"))
+
+# (period, period_start, exercise_name)
+BoardKey = Tuple[str, date, str]
+
+def period_start(period: str, day: date) -> date:
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    if period == "all":
+        return ALL_TIME_START
+    raise ValueError(f"unknown leaderboard period {period!r}")
+
+def leaderboard_day(performed_at: datetime) -> date:
+    if performed_at.tzinfo is None:
+        performed_at = performed_at.replace(tzinfo=timezone.utc)
+    return performed_at.astimezone(LEADERBOARD_TIMEZONE).date()
+
+def current_board_key(period: str, exercise_name: str, now: Optional[datetime] = None) -> BoardKey:
+    today = (now or datetime.now(LEADERBOARD_TIMEZONE)).astimezone(LEADERBOARD_TIMEZONE).date()
+    return (period, period_start(period, today), exercise_name)
+
+class Board:
+    def __init__(self, scores: Dict[int, int], top_k: int = LEADERBOARD_TOP_K):
+        self.top_k = top_k
+        self.scores = dict(scores)
+        # スコアを負にして昇順に並べる（先頭が最高スコア）
+        self._sorted = sorted(-score for score in self.scores.values())
+        self._rebuild_top()
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def _rebuild_top(self):
+        # 上位 K 人 (-score, user_id) の昇順。同点なら user_id の小さい順
+        self._top = heapq.nsmallest(self.top_k, ((-score, uid) for uid, score in self.scores.items()))
+
+    def update(self, user_id: int, score: int):
+        # スコアは増えるだけなので、古い値（コミット順が前後した書き込み）は無視する
+        old = self.scores.get(user_id)
+        if old is not None and score <= old:
+            return
+        if old is not None:
+            del self._sorted[bisect_left(self._sorted, -old)]
+            index = bisect_left(self._top, (-old, user_id))
+            if index < len(self._top) and self._top[index] == (-old, user_id):
+                del self._top[index]
+        insort(self._sorted, -score)
+        self.scores[user_id] = score
+
+        entry = (-score, user_id)
+        if len(self._top) < self.top_k or entry < self._top[-1]:
+            insort(self._top, entry)
+            del self._top[self.top_k:]
+
+    def remove(self, user_id: int):
+        old = self.scores.pop(user_id, None)
+        if old is None:
+            return
+        del self._sorted[bisect_left(self._sorted, -old)]
+        if any(uid == user_id for _, uid in self._top):
+            # 上位から抜けた分を埋めるため作り直す（無効化のときだけなのでまれ）
+            self._rebuild_top()
+
+    def rank(self, user_id: int) -> Optional[int]:
+        # 同点は同じ順位（自分より高いスコアの人数 + 1）
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        return bisect_left(self._sorted, -score) + 1
+
+    def top(self, n: int) -> List[Tuple[int, int, int]]:
+        # [(順位, user_id, score), ...]。n は LEADERBOARD_TOP_K まで
+        return [(bisect_left(self._sorted, neg) + 1, uid, -neg) for neg, uid in self._top[:n]]
+
+# 読み込み済みのボード（crud.leaderboard で DB から読み込み、ログ追加時にコミット後の値で更新する）
+_boards: Dict[BoardKey, Board] = {}
+# ランキングに出すユーザー名（user_id -> username）
+_usernames: Dict[int, str] = {}
+
+def get_board(key: BoardKey) -> Optional[Board]:
+    return _boards.get(key)
+
+def set_board(key: BoardKey, board: Board):
+    _boards[key] = board
+
+def loaded_board_keys() -> List[BoardKey]:
+    return list(_boards)
+
+def drop_stale_boards(now: Optional[datetime] = None):
+    # 期間が切り替わったあとの古いボードを捨てる
+    for key in list(_boards):
+        period, start, exercise_name = key
+        if key != current_board_key(period, exercise_name, now):
+            del _boards[key]
+
+def apply_scores(user_id: int, rows: Iterable[Tuple[str, date, str, int]]):
+    # ログ追加のコミット後に、更新後のスコア (period, period_start, exercise_name, score) を反映する
+    # （まだ読み込んでいないボードは、読み込むときに DB から最新の値が入るので何もしない）
+    for period, start, exercise_name, score in rows:
+        board = _boards.get((period, start, exercise_name))
+        if board is not None:
+            board.update(user_id, score)
+
+def remove_user(user_id: int):
+    # 無効化したユーザーをランキングから外す
+    for board in _boards.values():
+        board.remove(user_id)
+    _usernames.pop(user_id, None)
+
+def get_username(user_id: int) -> Optional[str]:
+    return _usernames.get(user_id)
+
+def set_usernames(usernames: Dict[int, str]):
+    _usernames.update(usernames)
+
+def forget_username(user_id: int):
+    _usernames.pop(user_id, None)
+
+def clear_boards():
+    _boards.clear()
+    _usernames.clear()
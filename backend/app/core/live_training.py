@@ -0,0 +1,173 @@
+import asyncio
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from app.core.metrics import Gauge, register
+
+# /ws/training のセッションの状態（DB に触れない部分）
+#
+# 回数・秒数のイベントはセット番号ごとにメモリ上で合計しておき、セットの終わり・セッションの終わりに
+# 1 セット 1 件のログとして記録する（記録は app/crud/live_training.py、接続の処理は app/routers/live_training.py）。
+# セッションは接続が切れても WS_RESUME_SECONDS の間は残し、同じ session_id で再接続すれば続きから送れる。
+# それまでに戻ってこなければ、記録していないセットを記録してから捨てる。
+# プロセスごとの状態なので、再接続が別のワーカーに届いたときは新しいセッションになる
+# （送り直されたセットは idempotency_key が同じなので二重には記録されない）。
+
+WS_HEARTBEAT_SECONDS = float(os.getenv("WS_HEARTBEAT_SECONDS", "20"))
+# この間クライアントから何も届かなければ接続を閉じる
+WS_IDLE_TIMEOUT_SECONDS = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "60"))
+WS_RESUME_SECONDS = float(os.getenv("WS_RESUME_SECONDS", "120"))
+# ワーカーごとのセッション数（切断中のものを含む）の上限
+WS_MAX_SESSIONS = int(os.getenv("WS_MAX_SESSIONS", "10000"))
+# 1 セッションで記録せずに持っておけるセットの数
+MAX_OPEN_SETS = 20
+# 同時に DB に書き込むセットの記録の数。接続が数千本あってもコネクションプールを使い切らず、
+# HTTP のリクエストの分を残しておく（超えた分はプロセス内で順番を待つ）
+WS_SAVE_CONCURRENCY = int(os.getenv("WS_SAVE_CONCURRENCY", "4"))
+
+# idempotency_key ("ws:<session_id>:<set>") が 64 文字に収まる長さ
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,40}$")
+
+class LiveTrainingError(Exception):
+    pass
+
+class SessionLimitError(LiveTrainingError):
+    pass
+
+class OpenSet:
+    __slots__ = ("exercise_name", "count", "duration", "performed_at")
+
+    def __init__(self, exercise_name: str, performed_at: datetime):
+        self.exercise_name = exercise_name
+        self.count = 0
+        self.duration = 0
+        self.performed_at = performed_at
+
+class LiveSession:
+    __slots__ = ("session_id", "user_id", "payload", "ack", "sets", "saved_sets", "connection", "detached_at", "saving")
+
+    def __init__(self, session_id: str, user_id: int, payload: dict):
+        self.session_id = session_id
+        self.user_id = user_id
+        # 記録するときにトークンがまだ有効か確かめるため、接続したときのトークンの中身を持っておく
+        self.payload = payload
+        # 処理済みの最後の seq
+        self.ack = 0
+        self.sets: Dict[int, OpenSet] = {}
+        # 記録済み（記録中を含む）のセット番号
+        self.saved_sets: set = set()
+        # 今つながっている接続（切断中は None）
+        self.connection = None
+        self.detached_at: Optional[float] = None
+        # 最後に始めた記録のタスク（記録は 1 セッションにつき 1 つずつ順番に行う）
+        self.saving: Optional[asyncio.Task] = None
+
+    def accept(self, seq: int) -> bool:
+        # 処理済みの seq（再接続時の送り直し）は無視する
+        if seq <= self.ack:
+            return False
+        self.ack = seq
+        return True
+
+    def add_progress(self, set_no: int, exercise_name: str, count: Optional[int], duration: Optional[int]):
+        if set_no in self.saved_sets:
+            # 記録済みのセットへの送り直し
+            return
+        open_set = self.sets.get(set_no)
+        if open_set is None:
+            if len(self.sets) >= MAX_OPEN_SETS:
+                raise LiveTrainingError("記録していないセットが多すぎます")
+            open_set = self.sets[set_no] = OpenSet(exercise_name, datetime.now(timezone.utc))
+        elif open_set.exercise_name != exercise_name:
+            raise LiveTrainingError("1 つのセットに別の種目は記録できません")
+        open_set.count += count or 0
+        open_set.duration += duration or 0
+
+    def take_sets(self, set_nos: Optional[List[int]] = None) -> List[Tuple[int, OpenSet]]:
+        # 記録するセットを取り出して記録済みにする（記録に失敗したら restore_sets で戻す）
+        if set_nos is None:
+            set_nos = sorted(self.sets)
+        taken = [(set_no, self.sets.pop(set_no)) for set_no in set_nos if set_no in self.sets]
+        self.saved_sets.update(set_no for set_no, _ in taken)
+        return taken
+
+    def restore_sets(self, taken: List[Tuple[int, OpenSet]]):
+        for set_no, open_set in taken:
+            self.sets[set_no] = open_set
+            self.saved_sets.discard(set_no)
+
+def idempotency_key(session_id: str, set_no: int) -> str:
+    return f"ws:{session_id}:{set_no}"
+
+# session_id -> LiveSession
+_sessions: Dict[str, LiveSession] = {}
+
+def open_session(session_id: str, user_id: int, payload: dict) -> Tuple[LiveSession, bool]:
+    # (セッション, 再開したか)。他のユーザーの session_id は使えない
+    session = _sessions.get(session_id)
+    if session is not None:
+        if session.user_id != user_id:
+            raise LiveTrainingError("このセッションは再開できません")
+        session.payload = payload
+        session.detached_at = None
+        return session, True
+    if len(_sessions) >= WS_MAX_SESSIONS:
+        raise SessionLimitError("接続数が上限に達しています")
+    session = _sessions[session_id] = LiveSession(session_id, user_id, payload)
+    return session, False
+
+def detach_session(session: LiveSession, connection):
+    # 切断した接続がまだこのセッションの接続のときだけ（再接続で置き換えられていなければ）切断中にする
+    if session.connection is connection:
+        session.connection = None
+        session.detached_at = time.monotonic()
+
+def close_session(session: LiveSession):
+    if _sessions.get(session.session_id) is session:
+        del _sessions[session.session_id]
+
+def pop_expired_sessions(now: Optional[float] = None) -> List[LiveSession]:
+    # WS_RESUME_SECONDS を過ぎても再接続されなかったセッション
+    now = time.monotonic() if now is None else now
+    expired = [
+        session for session in _sessions.values()
+        if session.connection is None and session.detached_at is not None and now - session.detached_at >= WS_RESUME_SECONDS
+    ]
+    for session in expired:
+        del _sessions[session.session_id]
+    return expired
+
+def pop_all_sessions() -> List[LiveSession]:
+    # 終了時に残りのセットを記録するため、すべてのセッションを取り出す
+    sessions = list(_sessions.values())
+    _sessions.clear()
+    return sessions
+
+_save_semaphore = asyncio.Semaphore(WS_SAVE_CONCURRENCY)
+_pending_saves = 0
+
+@asynccontextmanager
+async def save_slot():
+    global _pending_saves
+    _pending_saves += 1
+    try:
+        async with _save_semaphore:
+            yield
+    finally:
+        _pending_saves -= 1
+
+def get_pending_save_count() -> int:
+    return _pending_saves
+
+def session_count() -> int:
+    return len(_sessions)
+
+def connection_count() -> int:
+    return sum(1 for session in _sessions.values() if session.connection is not None)
+
+register(Gauge("ws_training_sessions", "Live training sessions held by this worker (including detached ones)", session_count))
+register(Gauge("ws_training_connections", "Open /ws/training connections", connection_count))
+register(Gauge("ws_training_pending_saves", "Live training saves running or waiting for a slot", get_pending_save_count))
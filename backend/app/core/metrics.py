@@ -0,0 +1,153 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+
+# プロセス内のメトリクス（Prometheus のテキスト形式で /metrics から出す）
+# ワーカーごとの値なので、複数ワーカーのときは Prometheus 側で合算する。
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # ラベルの値ごとに [バケットごとの件数..., 合計値, 件数]
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {series[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {series[-2]}"
+            yield f"{self.name}_count{_format_labels(self.labels, label_values)} {series[-1]}"
+
+class Gauge:
+    # 値は出力のたびに関数から取る
+    def __init__(self, name: str, documentation: str, read):
+        self.name = name
+        self.documentation = documentation
+        self._read = read
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {self._read()}"
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Request latency by route", ("method", "route", "status"),
+)
+REQUEST_DB_STATEMENTS = Histogram(
+    "http_request_db_statements", "SQL statements issued per request", ("method", "route"), COUNT_BUCKETS,
+)
+REQUEST_DB_DURATION = Histogram(
+    "http_request_db_duration_seconds", "Time spent executing SQL per request", ("method", "route"),
+)
+REQUEST_POOL_WAIT = Histogram(
+    "http_request_db_pool_wait_seconds", "Time spent waiting for a pooled connection per request", ("method", "route"),
+)
+SPAN_DURATION = Histogram(
+    "app_span_duration_seconds", "Duration of named spans on hot paths", ("span",),
+)
+
+REGISTRY: List = [REQUEST_DURATION, REQUEST_DB_STATEMENTS, REQUEST_DB_DURATION, REQUEST_POOL_WAIT, SPAN_DURATION]
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+class RequestStats:
+    __slots__ = ("db_statements", "db_seconds", "pool_wait_seconds")
+
+    def __init__(self):
+        self.db_statements = 0
+        self.db_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+
+# 処理中のリクエストの集計先（リクエストの外で発行された SQL は数えない）
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def start_request_stats() -> RequestStats:
+    stats = RequestStats()
+    _request_stats.set(stats)
+    return stats
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+def record_pool_wait(seconds: float):
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.pool_wait_seconds += seconds
+
+def observe_request(method: str, route: str, status: int, seconds: float, stats: RequestStats):
+    REQUEST_DURATION.observe(seconds, method, route, str(status))
+    REQUEST_DB_STATEMENTS.observe(stats.db_statements, method, route)
+    REQUEST_DB_DURATION.observe(stats.db_seconds, method, route)
+    REQUEST_POOL_WAIT.observe(stats.pool_wait_seconds, method, route)
+
+@contextmanager
+def span(name: str):
+    # ホットパスの処理時間を名前付きで記録する
+    #   with span("unlock_check"):
+    #       ...
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_DURATION.observe(time.perf_counter() - started, name)
+
+def install_db_instrumentation(engine):
+    # SQL の実行回数と実行時間を、処理中のリクエストに加算する
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _request_stats.get() is not None:
+            context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        stats = _request_stats.get()
+        if started is None or stats is None:
+            return
+        stats.db_statements += 1
+        stats.db_seconds += time.perf_counter() - started
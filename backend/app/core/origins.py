@@ -0,0 +1,13 @@
+import os
+
+# フロントエンドのオリジン（CORS と、Cookie で認証する WebSocket の Origin の確認に使う）
+ALLOWED_ORIGINS = [
+    "http://localhost:5173",  # Vite default port
+    "http://localhost:5174",  # Second Vite port
+    "http://127.0.0.1:5173",
+    "http://127.0.0.1:5174",
+]
+
+frontend_url = os.getenv("FRONTEND_URL")
+if frontend_url:
+    ALLOWED_ORIGINS.append(frontend_url)
@@ -0,0 +1,63 @@
+import os
+from typing import Dict, Optional
+from app.core.cache import TTLCache
+from app.core.metrics import Gauge, register
+from app.schemas.user import UserResponse
+
+# 認証済みユーザー（トークンの sub ごと）のキャッシュ
+# get_current_user が毎リクエスト DB を引かないようにする。
+# ユーザー情報・設定の更新や無効化のときは invalidate_principal で明示的に消す。
+# プロセスごとのキャッシュなので、他のワーカーでの更新は TTL が切れるまで反映されない。
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "30"))
+
+# user_id -> sub（ユーザー ID から無効化するための索引）
+_subjects_by_user_id: Dict[int, str] = {}
+
+def _forget_subject(subject: str, principal: UserResponse):
+    if _subjects_by_user_id.get(principal.id) == subject:
+        del _subjects_by_user_id[principal.id]
+
+principal_cache = TTLCache(
+    maxsize=PRINCIPAL_CACHE_SIZE,
+    ttl=PRINCIPAL_CACHE_TTL_SECONDS,
+    on_remove=_forget_subject,
+)
+
+def get_cached_principal(subject: str) -> Optional[UserResponse]:
+    return principal_cache.get(subject)
+
+def cache_principal(subject: str, principal: UserResponse):
+    # メールアドレス変更などで同じユーザーの古い sub が残っていれば消しておく
+    previous = _subjects_by_user_id.get(principal.id)
+    if previous is not None and previous != subject:
+        principal_cache.invalidate(previous)
+    principal_cache.set(subject, principal)
+    _subjects_by_user_id[principal.id] = subject
+
+def invalidate_principal(user_id: int):
+    subject = _subjects_by_user_id.get(user_id)
+    if subject is not None:
+        principal_cache.invalidate(subject)
+    token_version_cache.invalidate(user_id)
+
+# user_id -> 有効なトークンのバージョン（無効化されたユーザーは None）
+# get_current_user_id はこれに当たれば DB を引かずにトークンを検証できる
+token_version_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+
+NOT_CACHED = object()
+
+def get_cached_token_version(user_id: int):
+    # キャッシュにない場合は NOT_CACHED を返す（None は「無効なユーザー」として覚えている値）
+    return token_version_cache.get(user_id, NOT_CACHED)
+
+def cache_token_version(user_id: int, version: Optional[int]):
+    token_version_cache.set(user_id, version)
+
+register(Gauge("principal_cache_entries", "Cached authenticated users", lambda: len(principal_cache)))
+register(Gauge("principal_cache_hit_rate", "Hit rate of the authenticated user cache", lambda: principal_cache.stats()["hit_rate"]))
+register(Gauge("principal_cache_evictions_total", "Entries evicted from the authenticated user cache because it was full", lambda: principal_cache.evictions))
+register(Gauge("token_version_cache_entries", "Cached token versions", lambda: len(token_version_cache)))
+register(Gauge("token_version_cache_hit_rate", "Hit rate of the token version cache", lambda: token_version_cache.stats()["hit_rate"]))
+register(Gauge("token_version_cache_evictions_total", "Entries evicted from the token version cache because it was full", lambda: token_version_cache.evictions))
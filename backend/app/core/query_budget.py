@@ -0,0 +1,58 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
+from sqlalchemy import event
+
+# エンドポイントごとの SQL 発行回数の上限（クエリバジェット）
+# ルーターの関数に @query_budget(n) を付けて宣言し、check_query_budgets.py で超えていないか確認する。
+#
+#   @router.get("/yucchins")
+#   @query_budget(2)
+#   async def read_yucchins(...):
+#
+# 回数は DB との往復 (cursor の実行) を数える。COMMIT / ROLLBACK は含まない。
+
+class QueryRecorder:
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+_recorders: ContextVar[tuple] = ContextVar("query_recorders", default=())
+
+@contextmanager
+def count_queries() -> Iterator[QueryRecorder]:
+    # with ブロック内（同じコンテキストから呼ばれた処理）で発行された SQL を記録する
+    #   with count_queries() as recorder:
+    #       await get_yucchins(db, user_id)
+    #   assert recorder.count <= 1, recorder.statements
+    recorder = QueryRecorder()
+    token = _recorders.set(_recorders.get() + (recorder,))
+    try:
+        yield recorder
+    finally:
+        _recorders.reset(token)
+
+def install_query_recording(engine):
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        for recorder in _recorders.get():
+            recorder.statements.append(statement)
+
+def query_budget(max_queries: int):
+    def decorator(endpoint):
+        endpoint.__query_budget__ = max_queries
+        return endpoint
+    return decorator
+
+def get_query_budget(route) -> Optional[int]:
+    endpoint = getattr(route, "endpoint", None)
+    return getattr(endpoint, "__query_budget__", None)
+
+def format_violation(method: str, path: str, budget: int, recorder: QueryRecorder) -> str:
+    lines = [f"{method} {path}: {recorder.count} queries (budget {budget})"]
+    for index, statement in enumerate(recorder.statements, 1):
+        lines.append(f"  {index:2d}. {' '.join(statement.split())}")
+    return "\n".join(lines)
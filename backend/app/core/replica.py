@@ -0,0 +1,86 @@
+import logging
+import os
+from typing import Optional
+from app.core.cache import TTLCache
+
+# 読み取り用レプリカの状態（DATABASE_REPLICA_URL を設定したときだけ使う）
+#
+# 書き込んだユーザーは DB_READ_YOUR_WRITES_SECONDS の間プライマリから読む（自分の書き込みがすぐに見えるように）。
+# レプリカの遅延は DB_REPLICA_CHECK_SECONDS ごとに測り、DB_REPLICA_MAX_LAG_SECONDS を超えたり
+# 接続できなかったりしたら、次の確認で戻るまで全員プライマリから読む。
+# 測ってから次に測るまでに遅延は最大で DB_REPLICA_CHECK_SECONDS 増えるので、
+# DB_REPLICA_MAX_LAG_SECONDS + DB_REPLICA_CHECK_SECONDS <= DB_READ_YOUR_WRITES_SECONDS にしておけば
+# 書き込んだ本人が古いデータを読むことはない。
+# どちらの状態もワーカーごと（他のワーカーで書き込んだユーザーは固定されない。
+# 書き込みの応答を受け取ってから同じユーザーが別のワーカーで読むと、遅延の分だけ古いことがある）。
+
+DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+DB_READ_YOUR_WRITES_CACHE_SIZE = int(os.getenv("DB_READ_YOUR_WRITES_CACHE_SIZE", "10000"))
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "2"))
+DB_REPLICA_CHECK_SECONDS = float(os.getenv("DB_REPLICA_CHECK_SECONDS", "2"))
+
+logger = logging.getLogger("app.replica")
+
+# user_id -> True（書き込んでから DB_READ_YOUR_WRITES_SECONDS の間）
+pinned_users = TTLCache(maxsize=DB_READ_YOUR_WRITES_CACHE_SIZE, ttl=DB_READ_YOUR_WRITES_SECONDS)
+
+def pin_to_primary(user_id: int):
+    # 書き込みのコミット後に呼ぶ
+    if DB_READ_YOUR_WRITES_SECONDS > 0:
+        pinned_users.set(user_id, True)
+
+def is_pinned_to_primary(user_id: int) -> bool:
+    return pinned_users.get(user_id, False)
+
+class ReplicaState:
+    def __init__(self):
+        # 最初の確認が終わるまではレプリカを使わない
+        self.healthy = False
+        self.checked = False
+        self.lag_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.reads = 0
+        self.primary_reads = 0
+        # 使える状態から使えない状態（遅延・接続エラー）になった回数
+        self.failovers = 0
+
+    def record_lag(self, lag_seconds: float):
+        self.checked = True
+        self.lag_seconds = lag_seconds
+        if lag_seconds > DB_REPLICA_MAX_LAG_SECONDS:
+            self._set_healthy(False, f"replication lag {lag_seconds:.1f}s exceeds {DB_REPLICA_MAX_LAG_SECONDS:g}s")
+        else:
+            self._set_healthy(True, None)
+
+    def record_failure(self, error: str):
+        self.checked = True
+        self.lag_seconds = None
+        self._set_healthy(False, error)
+
+    def _set_healthy(self, healthy: bool, error: Optional[str]):
+        # 切り替わったときだけ stderr に出す
+        if not logger.handlers:
+            logger.addHandler(logging.StreamHandler())
+            logger.setLevel(logging.INFO)
+        if healthy and not self.healthy:
+            logger.info("read replica is available")
+        elif not healthy and (self.healthy or self.last_error is None):
+            if self.healthy:
+                self.failovers += 1
+            logger.warning("read replica is unavailable, reading from the primary: %s", error)
+        self.healthy = healthy
+        self.last_error = error
+
+    def status(self) -> dict:
+        return {
+            "healthy": self.healthy,
+            "checked": self.checked,
+            "lag_seconds": self.lag_seconds,
+            "max_lag_seconds": DB_REPLICA_MAX_LAG_SECONDS,
+            "last_error": self.last_error,
+            "reads": self.reads,
+            "primary_reads": self.primary_reads,
+            "failovers": self.failovers,
+        }
+
+replica_state = ReplicaState()
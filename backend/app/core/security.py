@@ -1,8 +1,11 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
 import jwt
 from passlib.context import CryptContext
+from app.core.metrics import span
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,11 +19,47 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 120
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# bcrypt は 1 回で数十〜数百 ms かかるので、イベントループ上では実行せず専用のスレッドプールで回す
+# (bcrypt は計算中に GIL を解放する)。
+# 待ち行列が PASSWORD_HASH_MAX_PENDING を超えたら PasswordHashingBusyError を投げて 503 で返す。
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 8)))
+PASSWORD_HASH_RETRY_AFTER_SECONDS = int(os.getenv("PASSWORD_HASH_RETRY_AFTER_SECONDS", "1"))
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_pending_hashes = 0
+
+class PasswordHashingBusyError(Exception):
+    pass
+
+async def _run_in_hash_pool(func, *args):
+    global _pending_hashes
+    if _pending_hashes >= PASSWORD_HASH_MAX_PENDING:
+        raise PasswordHashingBusyError()
+    _pending_hashes += 1
+    try:
+        with span("bcrypt"):
+            return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+    finally:
+        _pending_hashes -= 1
+
+def get_pending_hash_count() -> int:
+    return _pending_hashes
+
+async def verify_password(plain_password, hashed_password):
+    return await _run_in_hash_pool(pwd_context.verify, plain_password, hashed_password)
+
+async def get_password_hash(password):
+    return await _run_in_hash_pool(pwd_context.hash, password)
+
+def _warm_up_hash():
+    # bcrypt のバックエンドの読み込み（passlib は最初の 1 回で行う）を済ませる。コストを最小にするので数 ms で終わる
+    pwd_context.handler("bcrypt").using(rounds=4).hash("warmup")
+
+async def warm_up_security():
+    # 起動直後の最初のログインで、バックエンドの読み込みとスレッドの起動を待たせない
+    await asyncio.get_running_loop().run_in_executor(_hash_executor, _warm_up_hash)
+    jwt.decode(create_access_token({"sub": "warmup"}), SECRET_KEY, algorithms=[ALGORITHM])
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -0,0 +1,182 @@
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from importlib.machinery import SourceFileLoader, ExtensionFileLoader
+from typing import Dict, List, Optional, Tuple
+
+# 起動にかかった時間の記録と準備完了の状態（GET /healthz/ready）
+#
+# main.py の最初で読み込むと、それ以降の import をモジュールごとに測る（ほかのモジュールの import にかかった分を除いた時間）。
+# 測る前に import が起きないよう、このモジュールは標準ライブラリだけを使う。
+# lifespan の各段階（スキーマの確認・接続プールの準備など）は startup_phase で測り、
+# 準備が終わったら mark_ready() で記録をログに出す。
+
+logger = logging.getLogger("app.startup")
+
+# 起動時の import の時間を測るか（測っている間は import ごとに finder を 1 つ余分に通る）
+STARTUP_IMPORT_TIMING = os.getenv("STARTUP_IMPORT_TIMING", "true").lower() == "true"
+# レポートに出すパッケージ・モジュールの数
+STARTUP_REPORT_TOP = 10
+
+_imports_started = time.perf_counter()
+
+def _process_age_seconds() -> Optional[float]:
+    # プロセスが起動してからの秒数（Linux のみ。インタープリターと uvicorn の起動の分を含めるため）
+    try:
+        with open("/proc/self/stat") as f:
+            # comm に空白が含まれることがあるので ")" より後ろを使う
+            fields = f.read().rpartition(")")[2].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+_process_age_at_import = _process_age_seconds()
+
+class _TimedSourceFileLoader(SourceFileLoader):
+    def exec_module(self, module):
+        with _import_timer.measure(module.__name__):
+            super().exec_module(module)
+
+class _TimedExtensionFileLoader(ExtensionFileLoader):
+    # 拡張モジュールは読み込み (create_module) のほうに時間がかかる
+    def create_module(self, spec):
+        with _import_timer.measure(spec.name):
+            return super().create_module(spec)
+
+    def exec_module(self, module):
+        with _import_timer.measure(module.__name__):
+            super().exec_module(module)
+
+_TIMED_LOADERS = {SourceFileLoader: _TimedSourceFileLoader, ExtensionFileLoader: _TimedExtensionFileLoader}
+
+class _ImportTimer:
+    # sys.meta_path の先頭に入れて、ほかの finder が見つけたモジュールのローダーを時間を測るものに差し替える
+    def __init__(self):
+        self.self_seconds: Dict[str, float] = {}
+        self._local = threading.local()
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            find_spec = getattr(finder, "find_spec", None)
+            if finder is self or find_spec is None:
+                continue
+            spec = find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        timed = _TIMED_LOADERS.get(type(spec.loader))
+        if timed is not None:
+            spec.loader = timed(spec.loader.name, spec.loader.path)
+        return spec
+
+    @contextmanager
+    def measure(self, name: str):
+        # 入れ子の import の時間は呼び出し元から引く（-X importtime の self と同じ）
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self.self_seconds[name] = self.self_seconds.get(name, 0.0) + elapsed - children
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+_import_timer = _ImportTimer()
+if STARTUP_IMPORT_TIMING:
+    _import_timer.install()
+
+# (段階の名前, 秒数)
+_phases: List[Tuple[str, float]] = []
+if _process_age_at_import is not None:
+    _phases.append(("before_import", _process_age_at_import))
+_imports_finished = False
+_ready = False
+_startup_seconds: Optional[float] = None
+
+def finish_imports():
+    # lifespan の開始時に呼ぶ。ここまでを import の時間とし、以降の import は測らない
+    global _imports_finished
+    if _imports_finished:
+        return
+    _imports_finished = True
+    _import_timer.uninstall()
+    _phases.append(("import", time.perf_counter() - _imports_started))
+
+@contextmanager
+def startup_phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((name, time.perf_counter() - started))
+
+def mark_ready():
+    global _ready, _startup_seconds
+    _ready = True
+    _startup_seconds = sum(seconds for _, seconds in _phases)
+    # SQL のサンプリングのログと同じく stderr に出す
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
+        logger.setLevel(logging.INFO)
+    for line in format_startup_report():
+        logger.info(line)
+
+def mark_not_ready():
+    global _ready
+    _ready = False
+
+def is_ready() -> bool:
+    return _ready
+
+def _top(seconds_by_name: Dict[str, float]) -> List[Tuple[str, float]]:
+    return sorted(seconds_by_name.items(), key=lambda item: item[1], reverse=True)[:STARTUP_REPORT_TOP]
+
+def get_import_times() -> Tuple[List[Tuple[str, float]], List[Tuple[str, float]]]:
+    # (トップレベルのパッケージごとの合計, アプリのモジュールごと) をそれぞれ時間の長い順に
+    packages: Dict[str, float] = {}
+    modules: Dict[str, float] = {}
+    for name, seconds in _import_timer.self_seconds.items():
+        package = name.partition(".")[0]
+        if package == "app":
+            modules[name] = seconds
+        else:
+            packages[package] = packages.get(package, 0.0) + seconds
+    return _top(packages), _top(modules)
+
+def get_startup_report() -> dict:
+    packages, modules = get_import_times()
+    return {
+        "ready": _ready,
+        "startup_ms": _startup_seconds * 1000 if _startup_seconds is not None else None,
+        "phases_ms": {name: seconds * 1000 for name, seconds in _phases},
+        "import_ms_by_package": {name: seconds * 1000 for name, seconds in packages},
+        "import_ms_by_module": {name: seconds * 1000 for name, seconds in modules},
+    }
+
+def format_startup_report() -> List[str]:
+    packages, modules = get_import_times()
+    lines = [f"startup finished in {_startup_seconds * 1000:.0f}ms: " + ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in _phases)]
+    if packages:
+        lines.append("slowest imports (package): " + ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in packages))
+    if modules:
+        lines.append("slowest imports (app): " + ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in modules))
+    return lines
+
+def get_startup_seconds() -> Optional[float]:
+    return _startup_seconds
@@ -0,0 +1,136 @@
+import os
+import sys
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional, Tuple
+from zoneinfo import ZoneInfo
+from pydantic import BaseModel
+from app.core.cache import TTLCache
+from app.core.metrics import Gauge, register
+
+# GET /training-logs/stats のレスポンスのキャッシュ（user_id ごと）
+#
+# 統計が変わるのはそのユーザーのログ追加・タイムゾーン変更のときだけなので、
+# 書き込み側のコミット後に invalidate_training_stats で消す。
+# today_stats と streak_days は日付で変わるので、ユーザーのタイムゾーンでの次の 0 時に期限切れにする。
+# プロセスごとのキャッシュなので、他のワーカーでの書き込みは STATS_CACHE_TTL_SECONDS が切れるまで反映されない。
+#
+# 保存先は StatsCacheBackend を実装すれば差し替えられる（set_stats_cache_backend）。
+
+STATS_CACHE_BACKEND = os.getenv("STATS_CACHE_BACKEND", "memory")
+STATS_CACHE_SIZE = int(os.getenv("STATS_CACHE_SIZE", "10000"))
+STATS_CACHE_TTL_SECONDS = float(os.getenv("STATS_CACHE_TTL_SECONDS", "300"))
+
+# (レスポンス, ETag)
+CachedStats = Tuple[BaseModel, str]
+
+class StatsCacheBackend(ABC):
+    @abstractmethod
+    def get(self, user_id: int) -> Optional[CachedStats]:
+        ...
+
+    @abstractmethod
+    def set(self, user_id: int, value: CachedStats, ttl: float):
+        ...
+
+    @abstractmethod
+    def invalidate(self, user_id: int):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        # メトリクスで使うので少なくとも size, hit_rate, memory_bytes を含める
+        ...
+
+class NullStatsCache(StatsCacheBackend):
+    # キャッシュしない（STATS_CACHE_BACKEND=none）
+    def get(self, user_id: int) -> Optional[CachedStats]:
+        return None
+
+    def set(self, user_id: int, value: CachedStats, ttl: float):
+        pass
+
+    def invalidate(self, user_id: int):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"size": 0, "maxsize": 0, "hits": 0, "misses": 0, "hit_rate": 0.0, "memory_bytes": 0}
+
+def approximate_size(value: Any) -> int:
+    # レスポンスのおおよそのメモリ使用量（モデル・リスト・文字列などをたどって合計する）
+    size = sys.getsizeof(value)
+    if isinstance(value, BaseModel):
+        size += sum(approximate_size(field) for field in value.__dict__.values())
+    elif isinstance(value, (list, tuple)):
+        size += sum(approximate_size(item) for item in value)
+    return size
+
+class InMemoryStatsCache(StatsCacheBackend):
+    def __init__(self, maxsize: int):
+        self.memory_bytes = 0
+        self._cache = TTLCache(maxsize=maxsize, ttl=STATS_CACHE_TTL_SECONDS, on_remove=self._forget)
+
+    def _forget(self, user_id: int, entry: tuple):
+        self.memory_bytes -= entry[1]
+
+    def get(self, user_id: int) -> Optional[CachedStats]:
+        entry = self._cache.get(user_id)
+        return entry[0] if entry is not None else None
+
+    def set(self, user_id: int, value: CachedStats, ttl: float):
+        self._cache.invalidate(user_id)
+        size = approximate_size(value)
+        self._cache.set(user_id, (value, size), ttl)
+        self.memory_bytes += size
+
+    def invalidate(self, user_id: int):
+        self._cache.invalidate(user_id)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {**self._cache.stats(), "memory_bytes": self.memory_bytes}
+
+def create_backend(name: str) -> StatsCacheBackend:
+    if name == "memory":
+        return InMemoryStatsCache(STATS_CACHE_SIZE)
+    if name == "none":
+        return NullStatsCache()
+    raise ValueError(f"unknown STATS_CACHE_BACKEND {name!r}")
+
+_backend: StatsCacheBackend = create_backend(STATS_CACHE_BACKEND)
+
+def get_stats_cache() -> StatsCacheBackend:
+    return _backend
+
+def set_stats_cache_backend(backend: StatsCacheBackend):
+    global _backend
+    _backend = backend
+
+def seconds_until_local_midnight(tz: ZoneInfo, now: Optional[datetime] = None) -> float:
+    now = now or datetime.now(tz)
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tz)
+    # 同じ tzinfo 同士の引き算は夏時間の切り替えを無視するので UTC にそろえてから引く
+    return max((tomorrow.astimezone(timezone.utc) - now.astimezone(timezone.utc)).total_seconds(), 0.0)
+
+def get_cached_training_stats(user_id: int) -> Optional[CachedStats]:
+    return _backend.get(user_id)
+
+def cache_training_stats(user_id: int, response: BaseModel, etag: str, tz: ZoneInfo):
+    ttl = min(seconds_until_local_midnight(tz), STATS_CACHE_TTL_SECONDS)
+    _backend.set(user_id, (response, etag), ttl)
+
+def invalidate_training_stats(user_id: int):
+    _backend.invalidate(user_id)
+
+register(Gauge("stats_cache_entries", "Cached /training-logs/stats responses", lambda: _backend.stats()["size"]))
+register(Gauge("stats_cache_hit_rate", "Hit rate of the stats response cache", lambda: _backend.stats()["hit_rate"]))
+register(Gauge("stats_cache_memory_bytes", "Approximate memory used by the stats response cache", lambda: _backend.stats()["memory_bytes"]))
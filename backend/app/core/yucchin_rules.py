@@ -0,0 +1,152 @@
+import hashlib
+import json
+import random
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# ゆっちんの獲得条件を、metric ごとのしきい値の昇順インデックスに変換して判定する（DB に触れない純粋な部分）
+#
+# 判定では metric ごとに「前回の値 < しきい値 <= 今回の値」の範囲を二分探索で切り出すだけなので、
+# ゆっちんの数が増えても、実際にまたいだ条件のぶんしかコストはかからない。
+#
+#   rules = UnlockRules(entries)   # entries は yucchin_catalog の行（CatalogEntry）
+#   rules.select(owned_ids, old_exercises, new_exercises)   # 優先順位の高い順の獲得候補
+
+UNKNOWN_YUCCHIN_NAME = "謎のゆっちん"
+
+# (metric, exercise_name)。metric が total のときは exercise_name は None
+MetricKey = Tuple[str, Optional[str]]
+Exercises = Dict[str, Tuple[int, int]]
+
+class CatalogEntry:
+    __slots__ = ("id", "name", "rarity", "priority", "unlock_kind", "metric", "exercise_name", "unlock_value")
+
+    def __init__(self, id, name, rarity, priority, unlock_kind, metric, exercise_name, unlock_value):
+        if unlock_kind not in ("threshold", "interval"):
+            raise ValueError(f"unknown unlock_kind {unlock_kind!r} for yucchin {id}")
+        if metric not in ("total", "count", "duration"):
+            raise ValueError(f"unknown metric {metric!r} for yucchin {id}")
+        if metric != "total" and not exercise_name:
+            raise ValueError(f"metric {metric!r} needs exercise_name for yucchin {id}")
+        if unlock_value <= 0:
+            raise ValueError(f"unlock_value must be positive for yucchin {id}")
+        self.id = id
+        self.name = name
+        self.rarity = rarity
+        self.priority = priority
+        self.unlock_kind = unlock_kind
+        self.metric = metric
+        self.exercise_name = exercise_name if metric != "total" else None
+        self.unlock_value = unlock_value
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_row(cls, row) -> "CatalogEntry":
+        return cls(
+            row.id, row.name, row.rarity, row.priority,
+            row.unlock_kind, row.metric, row.exercise_name, row.unlock_value,
+        )
+
+def get_total_units(exercises: Exercises) -> int:
+    return sum(total_count + total_duration for total_count, total_duration in exercises.values())
+
+def metric_value(key: MetricKey, exercises: Exercises) -> int:
+    metric, exercise_name = key
+    if metric == "total":
+        return get_total_units(exercises)
+    count, duration = exercises.get(exercise_name, (0, 0))
+    return count if metric == "count" else duration
+
+class UnlockRules:
+    def __init__(self, entries: Iterable[CatalogEntry]):
+        self.entries = {entry.id: entry for entry in entries}
+        self.names = {entry.id: entry.name for entry in self.entries.values()}
+        self.priorities = {entry.id: entry.priority for entry in self.entries.values()}
+
+        # threshold: metric -> (しきい値の昇順リスト, 同じ順のゆっちん ID)
+        thresholds: Dict[MetricKey, List[Tuple[int, int]]] = {}
+        # interval: (metric, 間隔) -> 抽選対象のゆっちん ID
+        pools: Dict[Tuple[MetricKey, int], List[int]] = {}
+        for entry in self.entries.values():
+            key = (entry.metric, entry.exercise_name)
+            if entry.unlock_kind == "threshold":
+                thresholds.setdefault(key, []).append((entry.unlock_value, entry.id))
+            else:
+                pools.setdefault((key, entry.unlock_value), []).append(entry.id)
+
+        self._thresholds: Dict[MetricKey, Tuple[List[int], List[int]]] = {}
+        for key, items in thresholds.items():
+            # 同じしきい値なら優先順位の高い順
+            items.sort(key=lambda item: (item[0], -self.priorities[item[1]], item[1]))
+            self._thresholds[key] = ([value for value, _ in items], [uid for _, uid in items])
+        self._pools = [(key, interval, sorted(ids)) for (key, interval), ids in pools.items()]
+
+    def name_of(self, yucchin_id: int) -> str:
+        return self.names.get(yucchin_id, UNKNOWN_YUCCHIN_NAME)
+
+    def priority_of(self, yucchin_id: int) -> int:
+        return self.priorities.get(yucchin_id, 0)
+
+    def select(
+        self,
+        owned_ids: set,
+        old_exercises: Exercises,
+        new_exercises: Exercises,
+        rng: random.Random = random,
+    ) -> List[int]:
+        # 獲得候補を優先順位の高い順に返す
+        candidates = []
+        values: Dict[MetricKey, Tuple[int, int]] = {}
+
+        def old_new(key: MetricKey) -> Tuple[int, int]:
+            if key not in values:
+                values[key] = (metric_value(key, old_exercises), metric_value(key, new_exercises))
+            return values[key]
+
+        # しきい値: old < しきい値 <= new の範囲だけを見る
+        for key, (thresholds, ids) in self._thresholds.items():
+            old, new = old_new(key)
+            if new <= old:
+                continue
+            start = bisect_right(thresholds, old)
+            end = bisect_right(thresholds, new)
+            candidates.extend(uid for uid in ids[start:end] if uid not in owned_ids)
+
+        # 間隔: 倍数をまたいだ回数だけ、未獲得のものからランダムに選ぶ（一括登録で複数回またいだときはその回数ぶん）
+        for key, interval, ids in self._pools:
+            old, new = old_new(key)
+            crossings = new // interval - old // interval
+            if crossings <= 0:
+                continue
+            available = [uid for uid in ids if uid not in owned_ids]
+            candidates.extend(rng.sample(available, min(crossings, len(available))))
+
+        # 優先順位が高い順にソート（同じ優先順位なら見つけた順）
+        candidates.sort(key=self.priority_of, reverse=True)
+        return candidates
+
+def serialize_catalog(entries: Iterable[CatalogEntry]) -> Tuple[bytes, str]:
+    # GET /yucchins/catalog でそのまま返す JSON と、その内容から作る強い ETag
+    # （ID 順・キー順を固定しているので、内容が同じなら何度作っても同じ ETag になる）
+    body = json.dumps(
+        [entry.to_dict() for entry in sorted(entries, key=lambda entry: entry.id)],
+        ensure_ascii=False, separators=(",", ":"), sort_keys=True,
+    ).encode("utf-8")
+    return body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+# 起動時に yucchin_catalog から読み込んだルールと、シリアライズ済みの一覧
+# （crud.yucchin.load_unlock_rules で設定する。差し替えは両方まとめて行う）
+_current_rules: Optional[UnlockRules] = None
+_current_catalog: Optional[Tuple[bytes, str]] = None
+
+def get_current_rules() -> Optional[UnlockRules]:
+    return _current_rules
+
+def get_current_catalog() -> Optional[Tuple[bytes, str]]:
+    return _current_catalog
+
+def set_current_rules(rules: UnlockRules):
+    global _current_rules, _current_catalog
+    _current_rules, _current_catalog = rules, serialize_catalog(rules.entries.values())
@@ -1,4 +1,6 @@
-from .user import create_user, get_user_by_email, get_user_by_username, update_user
-from .settings import get_settings_by_user_id, create_default_settings, update_settings
-from .yucchin import get_yucchins, create_user_yucchin
-from .training import get_training_logs, create_training_log, get_training_stats
+from .user import create_user, get_user_by_email, get_user_by_username, update_user, deactivate_user, get_data_version, bump_data_version
+from .settings import get_settings_by_user_id, get_user_timezone, get_or_create_settings, update_settings
+from .yucchin import get_yucchins, create_user_yucchin, load_unlock_rules, reload_unlock_rules_if_changed, get_unlock_rules
+from .training import get_training_logs, create_training_log, create_training_logs, get_training_stats
+from .aggregates import get_exercise_totals, rebuild_exercise_totals, check_exercise_totals, get_daily_totals, rebuild_daily_totals, check_daily_totals, rebuild_streaks, check_streaks, rebuild_leaderboard_scores, check_leaderboard_scores
+from .leaderboard import add_to_leaderboards, get_leaderboard, refresh_leaderboards, get_usernames
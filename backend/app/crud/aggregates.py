@@ -0,0 +1,373 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, func, literal_column, cast, union_all, Date, Integer
+from sqlalchemy.dialects.postgresql import insert
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+from app.models.settings import UserSettings, DEFAULT_TIMEZONE
+from app.models.training import TrainingLog, UserExerciseTotal, UserDailyTotal, UserStreak
+from app.models.leaderboard import LeaderboardScore
+from app.core.leaderboard import PERIODS, ALL_TIME_START, LEADERBOARD_TIMEZONE
+
+# 集計テーブル（user_exercise_totals など）の更新・再構築・整合性チェック
+
+async def get_exercise_totals(db: AsyncSession, user_id: int) -> Dict[str, Tuple[int, int]]:
+    result = await db.execute(
+        select(UserExerciseTotal.exercise_name, UserExerciseTotal.total_count, UserExerciseTotal.total_duration)
+        .where(UserExerciseTotal.user_id == user_id)
+    )
+    return {row.exercise_name: (row.total_count, row.total_duration) for row in result}
+
+async def add_to_exercise_totals(db: AsyncSession, user_id: int, deltas: Dict[str, Tuple[int, int]]) -> Dict[str, Tuple[int, int]]:
+    # 種目ごとの (count, duration) の増分を 1 回の UPSERT でまとめて加算し、加算後の全種目の累計を返す
+    # （行ロックを取るので同時書き込みでも値がずれない）
+    # 加算した種目は RETURNING の値、それ以外は同じ文のスナップショット（UPSERT の前の値＝変わらない値）から読む
+    stmt = insert(UserExerciseTotal).values([
+        {"user_id": user_id, "exercise_name": name, "total_count": count, "total_duration": duration}
+        for name, (count, duration) in deltas.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserExerciseTotal.user_id, UserExerciseTotal.exercise_name],
+        set_={
+            "total_count": UserExerciseTotal.total_count + stmt.excluded.total_count,
+            "total_duration": UserExerciseTotal.total_duration + stmt.excluded.total_duration,
+            "updated_at": func.now(),
+        },
+    ).returning(UserExerciseTotal.exercise_name, UserExerciseTotal.total_count, UserExerciseTotal.total_duration)
+    upserted = stmt.cte("upserted")
+    untouched = select(
+        UserExerciseTotal.exercise_name, UserExerciseTotal.total_count, UserExerciseTotal.total_duration,
+    ).where(UserExerciseTotal.user_id == user_id, UserExerciseTotal.exercise_name.notin_(list(deltas)))
+    result = await db.execute(union_all(select(upserted), untouched))
+    return {row.exercise_name: (row.total_count, row.total_duration) for row in result}
+
+def _raw_totals_query(user_id: Optional[int] = None):
+    query = select(
+        TrainingLog.user_id,
+        TrainingLog.exercise_name,
+        func.coalesce(func.sum(TrainingLog.count), 0).label("total_count"),
+        func.coalesce(func.sum(TrainingLog.duration), 0).label("total_duration"),
+    ).group_by(TrainingLog.user_id, TrainingLog.exercise_name)
+    if user_id is not None:
+        query = query.where(TrainingLog.user_id == user_id)
+    return query
+
+async def rebuild_exercise_totals(db: AsyncSession, user_id: Optional[int] = None) -> int:
+    # training_logs から集計し直す（user_id 指定なしなら全ユーザー）。commit は呼び出し側で行う
+    delete_stmt = delete(UserExerciseTotal)
+    if user_id is not None:
+        delete_stmt = delete_stmt.where(UserExerciseTotal.user_id == user_id)
+    await db.execute(delete_stmt)
+
+    raw = _raw_totals_query(user_id)
+    result = await db.execute(
+        insert(UserExerciseTotal).from_select(
+            ["user_id", "exercise_name", "total_count", "total_duration"], raw
+        )
+    )
+    return result.rowcount
+
+async def check_exercise_totals(db: AsyncSession, user_id: Optional[int] = None) -> List[dict]:
+    # 集計テーブルと training_logs の生データを突き合わせ、食い違いを返す
+    agg_query = select(UserExerciseTotal)
+    if user_id is not None:
+        agg_query = agg_query.where(UserExerciseTotal.user_id == user_id)
+    return await _find_mismatches(
+        db,
+        _raw_totals_query(user_id).subquery("raw"),
+        agg_query.subquery("agg"),
+        ["user_id", "exercise_name"],
+    )
+
+async def _find_mismatches(
+    db: AsyncSession,
+    raw,
+    agg,
+    keys: List[str],
+    values: Sequence[str] = ("total_count", "total_duration"),
+) -> List[dict]:
+    # raw / agg を keys で FULL OUTER JOIN し、values の列（既定は total_count / total_duration）が異なる行を返す
+    # 結果の列名は expected_<列名から total_ を除いたもの> / actual_<同>
+    on_clause = None
+    for key in keys:
+        cond = raw.c[key] == agg.c[key]
+        on_clause = cond if on_clause is None else on_clause & cond
+
+    differs = raw.c.user_id.is_(None) | agg.c.user_id.is_(None)
+    for value in values:
+        differs = differs | (func.coalesce(raw.c[value], 0) != func.coalesce(agg.c[value], 0))
+
+    query = select(
+        *[func.coalesce(raw.c[key], agg.c[key]).label(key) for key in keys],
+        *[func.coalesce(raw.c[value], 0).label("expected_" + value.removeprefix("total_")) for value in values],
+        *[func.coalesce(agg.c[value], 0).label("actual_" + value.removeprefix("total_")) for value in values],
+    ).select_from(
+        raw.join(agg, on_clause, full=True)
+    ).where(differs).order_by(*[literal_column(key) for key in keys])
+
+    result = await db.execute(query)
+    return [dict(row._mapping) for row in result]
+
+# --- 日別集計 (user_daily_totals) ---
+
+def to_local_day(performed_at: datetime, tz: ZoneInfo) -> date:
+    # タイムゾーンなしの日時は UTC とみなす (asyncpg が timestamptz に保存するときと同じ扱い)
+    if performed_at.tzinfo is None:
+        performed_at = performed_at.replace(tzinfo=timezone.utc)
+    return performed_at.astimezone(tz).date()
+
+async def add_to_daily_totals(db: AsyncSession, user_id: int, deltas: Dict[Tuple[date, str], Tuple[int, int]]):
+    # (日付, 種目) ごとの増分を 1 回の UPSERT でまとめて加算する
+    stmt = insert(UserDailyTotal).values([
+        {"user_id": user_id, "day": day, "exercise_name": name, "total_count": count, "total_duration": duration}
+        for (day, name), (count, duration) in deltas.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserDailyTotal.user_id, UserDailyTotal.day, UserDailyTotal.exercise_name],
+        set_={
+            "total_count": UserDailyTotal.total_count + stmt.excluded.total_count,
+            "total_duration": UserDailyTotal.total_duration + stmt.excluded.total_duration,
+        },
+    )
+    await db.execute(stmt)
+
+async def get_daily_totals(
+    db: AsyncSession,
+    user_id: int,
+    start: date,
+    end: date,
+    exercise_name: Optional[str] = None,
+) -> List[UserDailyTotal]:
+    # 主キー (user_id, day, exercise_name) の範囲検索になる
+    query = select(UserDailyTotal).where(
+        UserDailyTotal.user_id == user_id,
+        UserDailyTotal.day >= start,
+        UserDailyTotal.day <= end,
+    )
+    if exercise_name is not None:
+        query = query.where(UserDailyTotal.exercise_name == exercise_name)
+    result = await db.execute(query.order_by(UserDailyTotal.day, UserDailyTotal.exercise_name))
+    return result.scalars().all()
+
+def _raw_daily_totals_query(user_id: Optional[int] = None):
+    # performed_at をユーザーのタイムゾーンの日付に変換して集計する
+    tz_name = func.coalesce(UserSettings.timezone, DEFAULT_TIMEZONE)
+    day = cast(func.timezone(tz_name, TrainingLog.performed_at), Date)
+    query = select(
+        TrainingLog.user_id,
+        day.label("day"),
+        TrainingLog.exercise_name,
+        func.coalesce(func.sum(TrainingLog.count), 0).label("total_count"),
+        func.coalesce(func.sum(TrainingLog.duration), 0).label("total_duration"),
+    ).select_from(
+        TrainingLog.__table__.outerjoin(UserSettings.__table__, UserSettings.user_id == TrainingLog.user_id)
+    ).group_by(TrainingLog.user_id, day, TrainingLog.exercise_name)
+    if user_id is not None:
+        query = query.where(TrainingLog.user_id == user_id)
+    return query
+
+async def rebuild_daily_totals(db: AsyncSession, user_id: Optional[int] = None) -> int:
+    delete_stmt = delete(UserDailyTotal)
+    if user_id is not None:
+        delete_stmt = delete_stmt.where(UserDailyTotal.user_id == user_id)
+    await db.execute(delete_stmt)
+
+    result = await db.execute(
+        insert(UserDailyTotal).from_select(
+            ["user_id", "day", "exercise_name", "total_count", "total_duration"],
+            _raw_daily_totals_query(user_id),
+        )
+    )
+    return result.rowcount
+
+async def check_daily_totals(db: AsyncSession, user_id: Optional[int] = None) -> List[dict]:
+    agg_query = select(UserDailyTotal)
+    if user_id is not None:
+        agg_query = agg_query.where(UserDailyTotal.user_id == user_id)
+    return await _find_mismatches(
+        db,
+        _raw_daily_totals_query(user_id).subquery("raw"),
+        agg_query.subquery("agg"),
+        ["user_id", "day", "exercise_name"],
+    )
+
+# --- 連続日数 (user_streaks) ---
+
+def compute_streak_state(days: Sequence[date]) -> Tuple[int, int, Optional[date]]:
+    # 活動日 (昇順・重複なし) から (current_streak, longest_streak, last_active_day) を求める
+    # current_streak は last_active_day で終わる連続区間の長さ
+    current = longest = 0
+    prev = None
+    for day in days:
+        current = current + 1 if prev is not None and day == prev + timedelta(days=1) else 1
+        longest = max(longest, current)
+        prev = day
+    return current, longest, prev
+
+def streak_days_as_of(streak: Optional[UserStreak], today: date) -> int:
+    # 最終活動日が今日か昨日なら連続中、それ以外は途切れている
+    if streak is None or streak.last_active_day is None:
+        return 0
+    if streak.last_active_day >= today - timedelta(days=1):
+        return streak.current_streak
+    return 0
+
+async def get_streak(db: AsyncSession, user_id: int) -> Optional[UserStreak]:
+    result = await db.execute(select(UserStreak).where(UserStreak.user_id == user_id))
+    return result.scalars().first()
+
+async def _runs_ending_since(db: AsyncSession, user_id: int, since: date, window_start: date) -> List[Tuple[date, date, int]]:
+    # window_start 以降の活動日の連続区間 (最初の日, 最後の日, 日数) のうち since 以降に終わるものを 1 回の SQL で求める
+    # （日付から昇順の行番号を引いた値が同じ日は同じ連続区間）。
+    # 主キー (user_id, day) の window_start 以降の範囲だけを読むので、履歴の長さに関係なく一定コスト。
+    # window_start より前から続く区間は途中から数えてしまうので、呼び出し側でそうならない範囲を渡すこと
+    days = select(UserDailyTotal.day).where(
+        UserDailyTotal.user_id == user_id, UserDailyTotal.day >= window_start,
+    ).distinct().subquery()
+    numbered = select(
+        days.c.day,
+        (days.c.day - cast(func.row_number().over(order_by=days.c.day), Integer)).label("run"),
+    ).subquery()
+    result = await db.execute(
+        select(func.min(numbered.c.day), func.max(numbered.c.day), func.count())
+        .group_by(numbered.c.run)
+        .having(func.max(numbered.c.day) >= since)
+    )
+    return [tuple(row) for row in result]
+
+async def advance_streak(db: AsyncSession, user_id: int, days: Iterable[date]):
+    # ログ追加時に連続日数を更新する。追加したログの日付 (days) を日別集計 (user_daily_totals) に加えた「後」に呼ぶこと
+    # 最終活動日以降の日だけなら SQL なしで進める。過去の日が含まれるときは、同じバッチの日どうしもつながるよう
+    # 加えた後の日別集計から連続区間を 1 回で数え直す（何日分のバッチでも SQL の数は同じ）。
+    # 数え直すのは最も古い追加日の (最長連続日数 + 1) 日前から: その日をまたぐ区間の追加日より前の部分は
+    # 既存の連続区間なので、最長連続日数より長くはさかのぼらない
+    days = sorted(set(days))
+    # 行がなければ作り、あれば何も変えない UPDATE で行ロックを取る（SELECT ... FOR UPDATE と同じく同時書き込みを直列にする）
+    stmt = insert(UserStreak).values(user_id=user_id)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserStreak.user_id], set_={"user_id": stmt.excluded.user_id},
+    ).returning(UserStreak)
+    streak = await db.scalar(stmt, execution_options={"populate_existing": True})
+
+    last = streak.last_active_day
+    if last is None or days[0] >= last:
+        for day in days:
+            if last is None or day > last + timedelta(days=1):
+                streak.current_streak = 1
+            elif day == last + timedelta(days=1):
+                streak.current_streak += 1
+            last = day
+        streak.last_active_day = last
+    else:
+        # 過去日付: 追加した日を含む区間と、最終活動日で終わる区間（現在の連続日数）の長さを取り直す
+        last = max(last, days[-1])
+        window_start = days[0] - timedelta(days=streak.longest_streak + 1)
+        for _, run_end, length in await _runs_ending_since(db, user_id, days[0], window_start):
+            streak.longest_streak = max(streak.longest_streak, length)
+            if run_end == last:
+                streak.current_streak = length
+        streak.last_active_day = last
+
+    streak.longest_streak = max(streak.longest_streak, streak.current_streak)
+
+async def _active_days_by_user(db: AsyncSession, user_id: Optional[int] = None) -> Dict[int, List[date]]:
+    query = select(UserDailyTotal.user_id, UserDailyTotal.day).distinct().order_by(UserDailyTotal.user_id, UserDailyTotal.day)
+    if user_id is not None:
+        query = query.where(UserDailyTotal.user_id == user_id)
+    days_by_user: Dict[int, List[date]] = {}
+    for row in await db.execute(query):
+        days_by_user.setdefault(row.user_id, []).append(row.day)
+    return days_by_user
+
+async def rebuild_streaks(db: AsyncSession, user_id: Optional[int] = None) -> int:
+    # user_daily_totals から作り直す。日別集計を再構築したあとに呼ぶこと
+    delete_stmt = delete(UserStreak)
+    if user_id is not None:
+        delete_stmt = delete_stmt.where(UserStreak.user_id == user_id)
+    await db.execute(delete_stmt)
+
+    rows = []
+    for uid, days in (await _active_days_by_user(db, user_id)).items():
+        current, longest, last = compute_streak_state(days)
+        rows.append({"user_id": uid, "current_streak": current, "longest_streak": longest, "last_active_day": last})
+    if rows:
+        await db.execute(insert(UserStreak), rows)
+    return len(rows)
+
+async def check_streaks(db: AsyncSession, user_id: Optional[int] = None) -> List[dict]:
+    stored_query = select(UserStreak)
+    if user_id is not None:
+        stored_query = stored_query.where(UserStreak.user_id == user_id)
+    stored = {s.user_id: s for s in (await db.execute(stored_query)).scalars()}
+
+    mismatches = []
+    days_by_user = await _active_days_by_user(db, user_id)
+    for uid in sorted(set(stored) | set(days_by_user)):
+        expected = compute_streak_state(days_by_user.get(uid, []))
+        s = stored.get(uid)
+        actual = (s.current_streak, s.longest_streak, s.last_active_day) if s else (0, 0, None)
+        if expected != actual:
+            mismatches.append({"user_id": uid, "expected": expected, "actual": actual})
+    return mismatches
+
+# --- ランキング用スコア (leaderboard_scores) ---
+
+def _raw_leaderboard_query(user_id: Optional[int] = None):
+    # training_logs から週・月・累計のスコアを集計する（m0007 の初期投入と同じ内容）
+    local = func.timezone(literal_column(f"'{LEADERBOARD_TIMEZONE.key}'"), TrainingLog.performed_at)
+    score = func.sum(func.coalesce(TrainingLog.count, 0) + func.coalesce(TrainingLog.duration, 0)).label("score")
+    starts = {
+        "week": cast(func.date_trunc(literal_column("'week'"), local), Date),
+        "month": cast(func.date_trunc(literal_column("'month'"), local), Date),
+    }
+    queries = []
+    for period in PERIODS:
+        start = starts.get(period)
+        query = select(
+            literal_column(f"'{period}'").label("period"),
+            (start if start is not None else literal_column(f"DATE '{ALL_TIME_START.isoformat()}'")).label("period_start"),
+            TrainingLog.exercise_name,
+            TrainingLog.user_id,
+            score,
+        ).group_by(
+            *([start] if start is not None else []), TrainingLog.exercise_name, TrainingLog.user_id,
+        )
+        if user_id is not None:
+            query = query.where(TrainingLog.user_id == user_id)
+        queries.append(query)
+    return union_all(*queries)
+
+async def rebuild_leaderboard_scores(db: AsyncSession, user_id: Optional[int] = None) -> int:
+    delete_stmt = delete(LeaderboardScore)
+    if user_id is not None:
+        delete_stmt = delete_stmt.where(LeaderboardScore.user_id == user_id)
+    await db.execute(delete_stmt)
+
+    result = await db.execute(
+        insert(LeaderboardScore).from_select(
+            ["period", "period_start", "exercise_name", "user_id", "score"],
+            _raw_leaderboard_query(user_id),
+        )
+    )
+    return result.rowcount
+
+async def check_leaderboard_scores(db: AsyncSession, user_id: Optional[int] = None) -> List[dict]:
+    agg_query = select(LeaderboardScore)
+    if user_id is not None:
+        agg_query = agg_query.where(LeaderboardScore.user_id == user_id)
+    return await _find_mismatches(
+        db,
+        _raw_leaderboard_query(user_id).subquery("raw"),
+        agg_query.subquery("agg"),
+        ["period", "period_start", "exercise_name", "user_id"],
+        values=("score",),
+    )
+
+# (テーブル, 再構築, 整合性チェック) を再構築する順に並べたもの（rebuild_aggregates.py・seed_data.py）
+# user_streaks は user_daily_totals から作るので必ずその後
+AGGREGATES = [
+    ("user_exercise_totals", rebuild_exercise_totals, check_exercise_totals),
+    ("user_daily_totals", rebuild_daily_totals, check_daily_totals),
+    ("user_streaks", rebuild_streaks, check_streaks),
+    ("leaderboard_scores", rebuild_leaderboard_scores, check_leaderboard_scores),
+]
@@ -0,0 +1,24 @@
+from sqlalchemy.exc import IntegrityError
+from typing import Optional
+
+# 書き込みは先に存在を確認せず、一意制約の違反で重複を検出する
+# 一意制約（インデックス）の名前 -> 重複した項目
+UNIQUE_FIELDS = {
+    "ix_users_email": "email",
+    "ix_users_username": "username",
+    "uq_user_yucchins_user_type": "yucchin_type",
+}
+
+class DuplicateError(Exception):
+    def __init__(self, field: str):
+        super().__init__(field)
+        self.field = field
+
+def violated_constraint(error: IntegrityError) -> Optional[str]:
+    # 違反した制約の名前。asyncpg の例外が __cause__ に入っている
+    return getattr(error.orig.__cause__, "constraint_name", None)
+
+def duplicate_error(error: IntegrityError) -> Optional[DuplicateError]:
+    # 一意制約の違反なら DuplicateError、それ以外（外部キーなど）は None
+    field = UNIQUE_FIELDS.get(violated_constraint(error))
+    return DuplicateError(field) if field is not None else None
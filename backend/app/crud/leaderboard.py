@@ -0,0 +1,106 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.models.leaderboard import LeaderboardScore
+from app.models.training import TrainingLog
+from app.models.user import User
+from app.core.leaderboard import (
+    PERIODS, ALL_TIME_START, BoardKey, Board,
+    period_start, leaderboard_day, current_board_key,
+    get_board, set_board, loaded_board_keys, drop_stale_boards, get_username, set_usernames,
+)
+
+# ランキング用スコア (leaderboard_scores) の更新と、メモリ上のボードの読み込み
+# （training_logs からの再構築・整合性チェックは app/crud/aggregates.py）
+
+async def add_to_leaderboards(db: AsyncSession, user_id: int, inserted: Iterable[TrainingLog]) -> List[Tuple[str, date, str, int]]:
+    # 新しく登録したログを、ログの日付の週・月・累計のスコアに 1 回の UPSERT で加算する
+    # 戻り値は加算後のスコア。コミット後に app.core.leaderboard.apply_scores に渡す
+    deltas: Dict[Tuple[str, date, str], int] = {}
+    for l in inserted:
+        day = leaderboard_day(l.performed_at)
+        score = (l.count or 0) + (l.duration or 0)
+        for period in PERIODS:
+            key = (period, period_start(period, day), l.exercise_name)
+            deltas[key] = deltas.get(key, 0) + score
+
+    # 同時に書き込むトランザクション同士で行ロックの順番をそろえる
+    stmt = insert(LeaderboardScore).values([
+        {"period": period, "period_start": start, "exercise_name": name, "user_id": user_id, "score": score}
+        for (period, start, name), score in sorted(deltas.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            LeaderboardScore.period, LeaderboardScore.period_start,
+            LeaderboardScore.exercise_name, LeaderboardScore.user_id,
+        ],
+        set_={"score": LeaderboardScore.score + stmt.excluded.score},
+    ).returning(
+        LeaderboardScore.period, LeaderboardScore.period_start, LeaderboardScore.exercise_name, LeaderboardScore.score,
+    )
+    result = await db.execute(stmt)
+    return [tuple(row) for row in result]
+
+async def load_board(db: AsyncSession, key: BoardKey) -> Board:
+    # ボード 1 つ分のスコアを DB から読む（無効化されたユーザーは除く）。主キーの範囲検索になる
+    # メモリに載せるのは呼び出し側 (set_board)
+    period, start, exercise_name = key
+    result = await db.execute(
+        select(LeaderboardScore.user_id, LeaderboardScore.score, User.username)
+        .join(User, User.id == LeaderboardScore.user_id)
+        .where(
+            LeaderboardScore.period == period,
+            LeaderboardScore.period_start == start,
+            LeaderboardScore.exercise_name == exercise_name,
+            User.is_active.is_(True),
+        )
+    )
+    rows = result.all()
+    set_usernames({row.user_id: row.username for row in rows})
+    return Board({row.user_id: row.score for row in rows})
+
+async def has_leaderboard(db: AsyncSession, exercise_name: str) -> bool:
+    # 累計のスコアが 1 行でもあれば、ランキングのある種目（主キーの先頭 3 列の検索）
+    result = await db.execute(
+        select(LeaderboardScore.user_id).where(
+            LeaderboardScore.period == "all",
+            LeaderboardScore.period_start == ALL_TIME_START,
+            LeaderboardScore.exercise_name == exercise_name,
+        ).limit(1)
+    )
+    return result.first() is not None
+
+async def get_leaderboard(db: AsyncSession, period: str, exercise_name: str) -> Optional[Tuple[BoardKey, Board]]:
+    # 今の期間のボード。通常はメモリ上にあり DB は引かない（期間が切り替わった直後・初回だけ読み込む）
+    # 記録のない種目は None。ボードを作らないので、任意の種目名を指定されてもメモリと読み直しの対象は増えない
+    # （記録のある種目の空のボード、たとえば今週まだ誰も記録していない種目は読み込んでおく）
+    key = current_board_key(period, exercise_name)
+    board = get_board(key)
+    if board is None:
+        drop_stale_boards()
+        board = await load_board(db, key)
+        if not board and (period == "all" or not await has_leaderboard(db, exercise_name)):
+            return None
+        set_board(key, board)
+    return key, board
+
+async def refresh_leaderboards(db: AsyncSession) -> int:
+    # 読み込み済みの今の期間のボードを DB から読み直す（他のワーカーでの書き込みを反映する）
+    drop_stale_boards()
+    keys = loaded_board_keys()
+    for key in keys:
+        set_board(key, await load_board(db, key))
+    return len(keys)
+
+async def get_usernames(db: AsyncSession, user_ids: Iterable[int]) -> Dict[int, str]:
+    # ボードを読み込んだあとに上位に入ったユーザーの名前だけ DB から引く
+    usernames = {uid: get_username(uid) for uid in set(user_ids)}
+    missing = [uid for uid, name in usernames.items() if name is None]
+    if missing:
+        result = await db.execute(select(User.id, User.username).where(User.id.in_(missing)))
+        found = {row.id: row.username for row in result}
+        set_usernames(found)
+        usernames.update(found)
+    return {uid: name for uid, name in usernames.items() if name is not None}
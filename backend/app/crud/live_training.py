@@ -0,0 +1,67 @@
+import logging
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
+from app.core.live_training import LiveSession, OpenSet, idempotency_key, pop_expired_sessions, pop_all_sessions
+from app.crud.training import create_training_logs
+from app.models.training import TrainingLog
+from app.schemas.training import TrainingLogCreate
+
+logger = logging.getLogger("app")
+
+# /ws/training で合計したセットの記録
+
+SavedSet = Tuple[int, OpenSet, Optional[TrainingLog], bool]
+
+async def save_live_sets(
+    db: AsyncSession,
+    session: LiveSession,
+    set_nos: Optional[List[int]] = None,
+) -> Tuple[List[SavedSet], List[int]]:
+    # セット（省略時は記録していないすべてのセット）を 1 トランザクションで記録する
+    # 戻り値: ([(セット番号, セット, ログ, 今回新しく登録したか), ...], 獲得したゆっちんの ID)
+    # 回数も秒数も 0 のセットはログにしない（ログは None）。失敗したときはセットを戻して例外を投げる
+    taken = session.take_sets(set_nos)
+    logs = [
+        TrainingLogCreate(
+            performed_at=open_set.performed_at,
+            exercise_name=open_set.exercise_name,
+            count=open_set.count or None,
+            duration=open_set.duration or None,
+            idempotency_key=idempotency_key(session.session_id, set_no),
+        )
+        for set_no, open_set in taken
+        if open_set.count or open_set.duration
+    ]
+    if not logs:
+        return [(set_no, open_set, None, False) for set_no, open_set in taken], []
+    try:
+        items, unlocked_ids = await create_training_logs(db, logs, user_id=session.user_id)
+    except BaseException:
+        # 終了時のキャンセルでも戻しておき、flush_all_live_sessions で記録する
+        session.restore_sets(taken)
+        raise
+    by_key = {log.idempotency_key: (log, created) for log, created in items}
+    saved = []
+    for set_no, open_set in taken:
+        log, created = by_key.get(idempotency_key(session.session_id, set_no), (None, False))
+        saved.append((set_no, open_set, log, created))
+    return saved, unlocked_ids
+
+async def _flush_sessions(db: AsyncSession, sessions: List[LiveSession]) -> int:
+    flushed = 0
+    for session in sessions:
+        try:
+            saved, _ = await save_live_sets(db, session)
+        except Exception:
+            logger.exception("failed to save live training session %s", session.session_id)
+            continue
+        flushed += sum(1 for _, _, log, _ in saved if log is not None)
+    return flushed
+
+async def flush_expired_live_sessions(db: AsyncSession) -> int:
+    # WS_RESUME_SECONDS の間に再接続されなかったセッションの残りのセットを記録して捨てる
+    return await _flush_sessions(db, pop_expired_sessions())
+
+async def flush_all_live_sessions(db: AsyncSession) -> int:
+    # 終了時に、切断中のものも含めてすべてのセッションの残りのセットを記録する
+    return await _flush_sessions(db, pop_all_sessions())
@@ -1,25 +1,69 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.models.settings import UserSettings
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
+from zoneinfo import ZoneInfo
+from typing import Optional
+from app.models.settings import UserSettings, DEFAULT_TIMEZONE
 from app.schemas.settings import UserSettingsUpdate
+from app.crud.aggregates import rebuild_daily_totals, rebuild_streaks
+from app.crud.user import bump_data_version
+from app.core.principal import invalidate_principal
+from app.core.conditional import invalidate_data_version
+from app.core.replica import pin_to_primary
+from app.core.stats_cache import invalidate_training_stats
 
 async def get_settings_by_user_id(db: AsyncSession, user_id: int):
     result = await db.execute(select(UserSettings).where(UserSettings.user_id == user_id))
     return result.scalars().first()
 
-async def create_default_settings(db: AsyncSession, user_id: int):
-    db_settings = UserSettings(user_id=user_id)
-    db.add(db_settings)
-    await db.commit()
-    await db.refresh(db_settings)
+def user_timezone_column(user_id: int):
+    # ほかの文の RETURNING などに埋め込んで、タイムゾーンを読むためだけの往復を省く（設定がなければ NULL）
+    return select(UserSettings.timezone).where(UserSettings.user_id == user_id).scalar_subquery()
+
+def to_zoneinfo(timezone: Optional[str]) -> ZoneInfo:
+    return ZoneInfo(timezone or DEFAULT_TIMEZONE)
+
+async def get_user_timezone(db: AsyncSession, user_id: int) -> ZoneInfo:
+    return to_zoneinfo(await db.scalar(select(UserSettings.timezone).where(UserSettings.user_id == user_id)))
+
+async def get_or_create_settings(db: AsyncSession, user_id: int) -> UserSettings:
+    # 設定のない古いユーザーは初回の読み込みで既定値の行を作る
+    # （同時に作られても一意制約 user_settings_user_id_key で 1 行にまとまり、どちらのリクエストもその行を受け取る）
+    db_settings = await get_settings_by_user_id(db, user_id)
+    if db_settings is None:
+        stmt = insert(UserSettings).values(user_id=user_id)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserSettings.user_id], set_={"user_id": stmt.excluded.user_id},
+        ).returning(UserSettings)
+        db_settings = await db.scalar(stmt)
+        await db.commit()
     return db_settings
 
-async def update_settings(db: AsyncSession, db_settings: UserSettings, settings_in: UserSettingsUpdate):
-    update_data = settings_in.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_settings, field, value)
-    
-    db.add(db_settings)
+async def update_settings(db: AsyncSession, user_id: int, settings_in: UserSettingsUpdate) -> UserSettings:
+    # 読み込まずに 1 回の UPSERT で更新する（設定の行がなければ既定値に更新分を加えて作る）
+    # RETURNING のサブクエリは更新前のスナップショットを見るので、変更前のタイムゾーンも一緒に返せる
+    # null を指定した項目は変更しない（timezone は NOT NULL、ほかの項目もレスポンスでは必須なので書き込まない）
+    update_data = settings_in.model_dump(exclude_unset=True, exclude_none=True)
+    previous_timezone = select(UserSettings.timezone).where(UserSettings.user_id == user_id).scalar_subquery()
+    stmt = insert(UserSettings).values(user_id=user_id, **update_data)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserSettings.user_id],
+        set_={**{field: stmt.excluded[field] for field in update_data}, "updated_at": func.now()},
+    ).returning(UserSettings, previous_timezone)
+    db_settings, previous = (await db.execute(stmt)).one()
+    # 行がなかったユーザーの日付の区切りは既定のタイムゾーンだった
+    timezone_changed = db_settings.timezone != (previous or DEFAULT_TIMEZONE)
+
+    if timezone_changed:
+        # 日付の区切りが変わるので、日別集計と連続日数をこのユーザー分だけ作り直す
+        await rebuild_daily_totals(db, user_id=user_id)
+        await rebuild_streaks(db, user_id=user_id)
+    await bump_data_version(db, user_id)
     await db.commit()
-    await db.refresh(db_settings)
+    # キャッシュ済みのユーザー情報は設定を含むので消しておく
+    invalidate_principal(user_id)
+    invalidate_data_version(user_id)
+    pin_to_primary(user_id)
+    if timezone_changed:
+        invalidate_training_stats(user_id)
     return db_settings
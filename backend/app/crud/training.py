@@ -1,200 +1,398 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy import func, desc, cast, Date
-from datetime import datetime, date, timedelta
-from typing import List, Dict
-from app.models.training import TrainingLog
+from sqlalchemy import select, tuple_, func, cast, literal_column, Date
+from sqlalchemy.dialects.postgresql import insert
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+import base64
+from app.models.training import TrainingLog, UserDailyTotal
 from app.models.yucchin import UserYucchin
-from app.schemas.training import TrainingLogCreate, ExerciseStats, TrainingStatsResponse
-import random
+from app.crud.aggregates import (
+    add_to_exercise_totals, get_exercise_totals, add_to_daily_totals, get_daily_totals, to_local_day,
+    advance_streak, get_streak, streak_days_as_of,
+)
+from app.core.metrics import span
+from app.core.conditional import invalidate_data_version
+from app.core.replica import pin_to_primary
+from app.core.stats_cache import invalidate_training_stats
+from app.core.leaderboard import apply_scores
+from app.crud.settings import get_user_timezone, user_timezone_column, to_zoneinfo
+from app.crud.user import bump_data_version
+from app.crud.leaderboard import add_to_leaderboards
+from app.crud.yucchin import get_unlock_rules
+from app.schemas.training import (
+    TrainingLogCreate, ExerciseStats, TrainingStatsResponse, TrainingLogPage, ExerciseSeries, TrainingSeriesResponse,
+)
 
-async def get_training_logs(db: AsyncSession, user_id: int):
-    # Order by performed_at descending to show newest first
-    result = await db.execute(select(TrainingLog).where(TrainingLog.user_id == user_id).order_by(TrainingLog.performed_at.desc()))
-    return result.scalars().all()
+DEFAULT_LOG_PAGE_SIZE = 50
+MAX_LOG_PAGE_SIZE = 200
+
+def encode_log_cursor(log: TrainingLog) -> str:
+    raw = f"{log.performed_at.isoformat()}|{log.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_log_cursor(cursor: str) -> Tuple[datetime, int]:
+    # 不正なカーソルは ValueError
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        performed_at, log_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(performed_at), int(log_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("invalid cursor") from e
+
+async def get_training_logs(
+    db: AsyncSession,
+    user_id: int,
+    limit: int = DEFAULT_LOG_PAGE_SIZE,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    exercise_name: Optional[str] = None,
+) -> TrainingLogPage:
+    # (performed_at, id) のキーセットページング。新しい順に limit 件ずつ返す
+    #   before: このカーソルより古いログ（次のページ）
+    #   after:  このカーソルより新しいログ（前のページ）
+    #   start / end: performed_at の範囲 (start <= performed_at < end)
+    if before and after:
+        raise ValueError("before and after cannot be combined")
+    limit = max(1, min(limit, MAX_LOG_PAGE_SIZE))
+
+    key = tuple_(TrainingLog.performed_at, TrainingLog.id)
+    query = select(TrainingLog).where(TrainingLog.user_id == user_id)
+    if start is not None:
+        query = query.where(TrainingLog.performed_at >= start)
+    if end is not None:
+        query = query.where(TrainingLog.performed_at < end)
+    if exercise_name is not None:
+        query = query.where(TrainingLog.exercise_name == exercise_name)
+
+    if after:
+        # 古い方から limit + 1 件取り、新しい順に並べ直す
+        query = query.where(key > tuple_(*decode_log_cursor(after)))
+        query = query.order_by(TrainingLog.performed_at.asc(), TrainingLog.id.asc())
+    else:
+        if before:
+            query = query.where(key < tuple_(*decode_log_cursor(before)))
+        query = query.order_by(TrainingLog.performed_at.desc(), TrainingLog.id.desc())
+
+    result = await db.execute(query.limit(limit + 1))
+    logs = list(result.scalars().all())
+    has_more = len(logs) > limit
+    logs = logs[:limit]
+    if after:
+        logs.reverse()
+
+    # after で取得したときは「より古いもの」、before で取得したときは「より新しいもの」が必ず存在する
+    has_older = has_more if not after else True
+    has_newer = has_more if after else before is not None
+    return TrainingLogPage(
+        items=logs,
+        next_cursor=encode_log_cursor(logs[-1]) if logs and has_older else None,
+        prev_cursor=encode_log_cursor(logs[0]) if logs and has_newer else None,
+    )
+
+# エクスポートで出力する列（ORM オブジェクトを作らずに行のまま流す）
+EXPORT_COLUMNS = ("id", "user_id", "performed_at", "exercise_name", "count", "duration", "created_at")
+
+async def stream_training_log_rows(
+    db: AsyncSession,
+    user_id: Optional[int] = None,
+    batch_size: int = 1000,
+) -> AsyncIterator[tuple]:
+    # サーバーサイドカーソルで batch_size 件ずつ読み出すので、件数に関係なくメモリ使用量は一定
+    # user_id を省略すると全ユーザー分（管理用の一括エクスポート）
+    query = select(*[getattr(TrainingLog, name) for name in EXPORT_COLUMNS])
+    if user_id is not None:
+        query = query.where(TrainingLog.user_id == user_id).order_by(TrainingLog.performed_at, TrainingLog.id)
+    else:
+        query = query.order_by(TrainingLog.id)
+
+    result = await db.stream(query.execution_options(yield_per=batch_size))
+    async for partition in result.partitions():
+        for row in partition:
+            yield tuple(row)
 
 async def create_training_log(db: AsyncSession, log: TrainingLogCreate, user_id: int):
-    # 獲得判定のための以前の統計を取得
-    stats_before = await get_training_stats(db, user_id)
-    
-    def get_totals(stats):
-        total_units = sum(s.total_count + s.total_duration for s in stats.total_stats)
-        exercise_map = {s.exercise_name: (s.total_count, s.total_duration) for s in stats.total_stats}
-        return total_units, exercise_map
+    # 1 件だけのときも一括登録と同じ処理を通す。獲得できるゆっちんは従来どおり 1 体まで
+    items, unlocked_ids = await create_training_logs(db, [log], user_id, max_unlocks=1)
+    db_log, _ = items[0]
 
-    old_total, old_exercises = get_totals(stats_before)
+    # スキーマに合わせて返却するために属性を追加
+    db_log.unlocked_yucchin_types = unlocked_ids
+    return db_log
 
+async def create_training_logs(
+    db: AsyncSession,
+    logs: List[TrainingLogCreate],
+    user_id: int,
+    max_unlocks: Optional[int] = None,
+) -> Tuple[List[Tuple[TrainingLog, bool]], List[int]]:
+    # 複数のログを 1 回の INSERT・1 トランザクションで登録し、獲得判定も全体の前後の累計で 1 回だけ行う
+    # 戻り値: ([(ログ, 今回新しく登録したか), ...] を入力と同じ順で, 獲得したゆっちんの ID)
+    # idempotency_key が登録済みのものは挿入せず既存のログを返す（再送しても二重登録にならない）
+    # max_unlocks を省略すると、新しく登録したログの件数までゆっちんを獲得できる
     try:
-        db_log = TrainingLog(
-            user_id=user_id,
-            performed_at=log.performed_at,
-            exercise_name=log.exercise_name,
-            count=log.count,
-            duration=log.duration
-        )
-        db.add(db_log)
-        # flushしておかないと、直後の get_training_stats で新レコードが反映されない可能性がある
-        await db.flush()
+        stmt = insert(TrainingLog).values([
+            {
+                "user_id": user_id,
+                "performed_at": log.performed_at,
+                "exercise_name": log.exercise_name,
+                "count": log.count,
+                "duration": log.duration,
+                "idempotency_key": log.idempotency_key,
+            }
+            for log in logs
+        ]).on_conflict_do_nothing(
+            index_elements=[TrainingLog.user_id, TrainingLog.idempotency_key],
+            index_where=TrainingLog.idempotency_key.isnot(None),
+        ).returning(TrainingLog, user_timezone_column(user_id))
+        # 集計に使うタイムゾーンも同じ文で受け取る（挿入した行ごとに同じ値が付く）
+        rows = (await db.execute(stmt)).all()
+        inserted = sorted((l for l, _ in rows), key=lambda l: l.id)
 
-        # 保存後の統計を取得
-        stats_after = await get_training_stats(db, user_id)
-        new_total, new_exercises = get_totals(stats_after)
+        items = await _match_inserted_logs(db, user_id, logs, inserted)
+        unlocked_ids = []
+        leaderboard_scores = []
+        if inserted:
+            old_exercises, new_exercises = await _apply_to_aggregates(db, user_id, inserted, to_zoneinfo(rows[0][1]))
+            leaderboard_scores = await add_to_leaderboards(db, user_id, inserted)
+            with span("unlock_check"):
+                unlocked_ids = await check_and_unlock_yucchin(
+                    db, user_id,
+                    old_exercises, new_exercises,
+                    max_unlocks=len(inserted) if max_unlocks is None else max_unlocks,
+                )
+            # 集計・獲得したゆっちんが変わるので、GET の ETag も変える
+            await bump_data_version(db, user_id)
 
-        unlocked_ids = await check_and_unlock_yucchin(db, user_id, old_total, new_total, old_exercises, new_exercises)
-        
         await db.commit()
-        await db.refresh(db_log)
-        
-        # スキーマに合わせて返却するために属性を追加
-        db_log.unlocked_yucchin_types = unlocked_ids
-        return db_log
+        if inserted:
+            invalidate_data_version(user_id)
+            invalidate_training_stats(user_id)
+            # しばらくは自分の記録が反映されたプライマリから読む
+            pin_to_primary(user_id)
+            # メモリ上のランキングにはコミットしてから反映する
+            apply_scores(user_id, leaderboard_scores)
+        return items, unlocked_ids
     except Exception as e:
         await db.rollback()
         raise e
 
-YUCCHIN_NAMES = {
-    1: "ねこゆっちん", 2: "かぶとゆっちん", 3: "ティールゆっちんブーケ", 4: "ブルーゆっちんブーケ", 5: "ブルーゆっちん",
-    6: "青鬼ゆっちん", 7: "パープルゆっちん", 8: "紫鬼ゆっちん", 9: "デビルマンゆっちん", 10: "花火ゆっちん",
-    101: "しかゆっちん", 102: "トリケラトユチン", 103: "カラフルゆっちんブーケ", 104: "ウマゆっちん", 105: "愛の伝道師ゆっちん",
-    201: "リスカゆっちん", 202: "たまごゆっちん", 203: "しかゆっちん【神鹿】", 
-    301: "エンジェルゆっちん", 401: "レントゲンゆっちん"
-}
+async def _match_inserted_logs(
+    db: AsyncSession,
+    user_id: int,
+    logs: List[TrainingLogCreate],
+    inserted: List[TrainingLog],
+) -> List[Tuple[TrainingLog, bool]]:
+    # 入力の順に (ログ, 新規登録か) を並べる。id は VALUES の順に採番されるので、
+    # キーなしのログは id 順に対応づける
+    inserted_by_key = {l.idempotency_key: l for l in inserted if l.idempotency_key is not None}
+    unkeyed = iter([l for l in inserted if l.idempotency_key is None])
+
+    existing_keys = {log.idempotency_key for log in logs if log.idempotency_key is not None} - set(inserted_by_key)
+    existing_by_key = {}
+    if existing_keys:
+        result = await db.scalars(
+            select(TrainingLog).where(TrainingLog.user_id == user_id, TrainingLog.idempotency_key.in_(existing_keys))
+        )
+        existing_by_key = {l.idempotency_key: l for l in result}
+
+    items = []
+    claimed = set()
+    for log in logs:
+        key = log.idempotency_key
+        if key is None:
+            items.append((next(unkeyed), True))
+        elif key in inserted_by_key and key not in claimed:
+            # 同じリクエスト内でキーが重複している場合は最初のものだけが新規
+            claimed.add(key)
+            items.append((inserted_by_key[key], True))
+        else:
+            items.append((inserted_by_key.get(key) or existing_by_key[key], False))
+    return items
+
+async def _apply_to_aggregates(
+    db: AsyncSession,
+    user_id: int,
+    inserted: List[TrainingLog],
+    tz: ZoneInfo,
+) -> Tuple[Dict[str, Tuple[int, int]], Dict[str, Tuple[int, int]]]:
+    # 新しく登録したログを集計テーブル（累計・日別・連続日数）に反映し、反映前後の種目別累計を返す
+    # (ログ全体を集計し直さないので、履歴の長さに関係なく一定コスト)
+    exercise_deltas: Dict[str, Tuple[int, int]] = {}
+    daily_deltas: Dict[Tuple[date, str], Tuple[int, int]] = {}
+    for l in inserted:
+        count, duration = l.count or 0, l.duration or 0
+        day = to_local_day(l.performed_at, tz)
+        c, d = exercise_deltas.get(l.exercise_name, (0, 0))
+        exercise_deltas[l.exercise_name] = (c + count, d + duration)
+        c, d = daily_deltas.get((day, l.exercise_name), (0, 0))
+        daily_deltas[(day, l.exercise_name)] = (c + count, d + duration)
+
+    new_exercises = await add_to_exercise_totals(db, user_id, exercise_deltas)
+    await add_to_daily_totals(db, user_id, daily_deltas)
+    # 連続日数は日別集計に加えた後の状態から進める（同じバッチの過去の日どうしもつながる）
+    await advance_streak(db, user_id, {day for day, _ in daily_deltas})
+
+    # 加算前の値は加算後の値から逆算する
+    old_exercises = dict(new_exercises)
+    for name, (count, duration) in exercise_deltas.items():
+        new_count, new_duration = new_exercises[name]
+        old_exercises[name] = (new_count - count, new_duration - duration)
+    return old_exercises, new_exercises
+
+async def check_and_unlock_yucchin(
+    db: AsyncSession,
+    user_id: int,
+    old_exercises: dict,
+    new_exercises: dict,
+    max_unlocks: int = 1,
+) -> List[int]:
+    # 獲得条件は yucchin_catalog から作ったインデックスで判定する (app/core/yucchin_rules.py)
+    rules = await get_unlock_rules(db)
 
-async def check_and_unlock_yucchin(db: AsyncSession, user_id: int, old_total: int, new_total: int, old_exercises: dict, new_exercises: dict) -> List[int]:
     # すでに持っているゆっちんを取得
     owned_result = await db.execute(select(UserYucchin.yucchin_type).where(UserYucchin.user_id == user_id))
     owned_ids = set(owned_result.scalars().all())
 
-    candidates = []
-    
-    # 全ての条件を独立して判定し、候補リスト(candidates)に集める
-    
-    # Secret: 累計 3000 に到達
-    if old_total < 3000 <= new_total and 401 not in owned_ids:
-        candidates.append(401)
-    
-    # UR: 累計 1000 に到達
-    if old_total < 1000 <= new_total and 301 not in owned_ids:
-        candidates.append(301)
-        
-    # SR: 腕立て 300 (たまご)
-    if old_exercises.get("pushup", (0,0))[0] < 300 <= new_exercises.get("pushup", (0,0))[0] and 202 not in owned_ids:
-        candidates.append(202)
-        
-    # SR: スクワット 300 (リスカ)
-    if old_exercises.get("squat", (0,0))[0] < 300 <= new_exercises.get("squat", (0,0))[0] and 201 not in owned_ids:
-        candidates.append(201)
-        
-    # SR: プランク 300 (神鹿)
-    if old_exercises.get("plank", (0,0))[1] < 300 <= new_exercises.get("plank", (0,0))[1] and 203 not in owned_ids:
-        candidates.append(203)
-        
-    # Rare: 100 ごとに一回
-    if (new_total // 100) > (old_total // 100):
-        available = [i for i in range(101, 106) if i not in owned_ids]
-        if available:
-            candidates.append(random.choice(available))
-            
-    # Normal: 30 ごとに一回
-    if (new_total // 30) > (old_total // 30):
-        available = [i for i in range(1, 11) if i not in owned_ids]
-        if available:
-            candidates.append(random.choice(available))
-
-    if not candidates:
+    # 優先順位が高いものから max_unlocks 体だけを選択
+    unlocked_ids = rules.select(owned_ids, old_exercises, new_exercises)[:max_unlocks]
+    if not unlocked_ids:
         return []
 
-    # レアリティによる優先順位付け
-    def get_priority(uid):
-        if uid == 401: return 5  # Secret
-        if uid == 301: return 4  # UR
-        if 200 <= uid < 300: return 3 # SR
-        if 100 <= uid < 200: return 2 # Rare
-        return 1 # Normal
-
-    # 優先順位が高い順にソートして、一番上の1体だけを選択
-    candidates.sort(key=get_priority, reverse=True)
-    unlocked_id = candidates[0]
-    
-    # 1体のみDB保存
-    new_yucchin = UserYucchin(
-        user_id=user_id,
-        yucchin_type=unlocked_id,
-        yucchin_name=YUCCHIN_NAMES.get(unlocked_id, "謎のゆっちん")
+    # まとめて DB 保存（同時リクエストで先に獲得済みになっていたものは除く）
+    result = await db.execute(
+        insert(UserYucchin).values([
+            {
+                "user_id": user_id,
+                "yucchin_type": uid,
+                "yucchin_name": rules.name_of(uid),
+            }
+            for uid in unlocked_ids
+        ]).on_conflict_do_nothing(
+            index_elements=[UserYucchin.user_id, UserYucchin.yucchin_type]
+        ).returning(UserYucchin.yucchin_type)
     )
-    db.add(new_yucchin)
-    
-    return [unlocked_id]
-
-async def get_training_stats(db: AsyncSession, user_id: int) -> TrainingStatsResponse:
-    # 1. Total Stats
-    total_query = select(
-        TrainingLog.exercise_name,
-        func.sum(TrainingLog.count).label("total_count"),
-        func.sum(TrainingLog.duration).label("total_duration")
-    ).where(TrainingLog.user_id == user_id).group_by(TrainingLog.exercise_name)
-    
-    total_result = await db.execute(total_query)
-    total_stats = []
-    for row in total_result:
-        total_stats.append(ExerciseStats(
-            exercise_name=row.exercise_name,
-            total_count=row.total_count or 0,
-            total_duration=row.total_duration or 0
-        ))
-
-    # 2. Today's Stats
-    today = datetime.now().date()
-    # Note: performed_at is DateTime, so we need to filter safely.
-    # Depending on DB, func.date() might vary. casting to Date is usually safe.
-    today_query = select(
-        TrainingLog.exercise_name,
-        func.sum(TrainingLog.count).label("total_count"),
-        func.sum(TrainingLog.duration).label("total_duration")
-    ).where(
-        TrainingLog.user_id == user_id,
-        cast(TrainingLog.performed_at, Date) == today
-    ).group_by(TrainingLog.exercise_name)
-
-    today_result = await db.execute(today_query)
-    today_stats = []
-    for row in today_result:
-        today_stats.append(ExerciseStats(
-            exercise_name=row.exercise_name,
-            total_count=row.total_count or 0,
-            total_duration=row.total_duration or 0
-        ))
-
-    # 3. Streak Calculation
-    # Get all distinct dates performed by user, ordered desc
-    dates_query = select(cast(TrainingLog.performed_at, Date)).where(
-        TrainingLog.user_id == user_id
-    ).distinct().order_by(desc(cast(TrainingLog.performed_at, Date)))
-    
-    dates_result = await db.execute(dates_query)
-    performed_dates = dates_result.scalars().all()
-
-    streak_days = 0
-    if performed_dates:
-        # Check if performed today or yesterday to keep streak alive
-        last_date = performed_dates[0]
-        if last_date == today or last_date == today - timedelta(days=1):
-            # Reset check to the most recent performed date to start counting backwards
-            current_checking_date = last_date
-            streak_days = 1 # We know at least one day (last_date) exists
-            
-            for i in range(1, len(performed_dates)):
-                prev_date = performed_dates[i]
-                if prev_date == current_checking_date - timedelta(days=1):
-                    streak_days += 1
-                    current_checking_date = prev_date
-                else:
-                    break
-        else:
-             streak_days = 0
+    saved = set(result.scalars().all())
+    return [uid for uid in unlocked_ids if uid in saved]
+
+async def get_training_stats(db: AsyncSession, user_id: int, tz: Optional[ZoneInfo] = None) -> TrainingStatsResponse:
+    # 1. Total Stats (集計テーブルから読むので種目数ぶんの行だけ)
+    exercise_totals = await get_exercise_totals(db, user_id)
+    total_stats = [
+        ExerciseStats(exercise_name=name, total_count=total_count, total_duration=total_duration)
+        for name, (total_count, total_duration) in exercise_totals.items()
+    ]
+
+    # 2. Today's Stats (ユーザーのタイムゾーンでの「今日」を日別集計から引く)
+    if tz is None:
+        tz = await get_user_timezone(db, user_id)
+    today = datetime.now(tz).date()
+    today_stats = [
+        ExerciseStats(exercise_name=row.exercise_name, total_count=row.total_count, total_duration=row.total_duration)
+        for row in await get_daily_totals(db, user_id, today, today)
+    ]
+
+    # 3. Streak (ログ追加時に更新している状態を読むだけ)
+    streak = await get_streak(db, user_id)
 
     return TrainingStatsResponse(
-        streak_days=streak_days,
+        streak_days=streak_days_as_of(streak, today),
+        longest_streak=streak.longest_streak if streak else 0,
         today_stats=today_stats,
         total_stats=total_stats
     )
+
+# --- 期間ごとの推移 (GET /training-logs/series) ---
+
+SERIES_BUCKETS = ("day", "week", "month")
+# 既定の期間（バケット数）と、1 回に返せるバケット数の上限
+DEFAULT_SERIES_LENGTH = {"day": 365, "week": 26, "month": 12}
+MAX_SERIES_LENGTH = {"day": 366, "week": 260, "month": 120}
+
+def series_bucket_start(day: date, bucket: str) -> date:
+    # PostgreSQL の date_trunc と同じ区切り（週は月曜始まり）
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+def series_bucket_index(start: date, day: date, bucket: str) -> int:
+    if bucket == "day":
+        return (day - start).days
+    if bucket == "week":
+        return (day - start).days // 7
+    return (day.year - start.year) * 12 + day.month - start.month
+
+def series_bucket_add(start: date, n: int, bucket: str) -> date:
+    if bucket == "day":
+        return start + timedelta(days=n)
+    if bucket == "week":
+        return start + timedelta(weeks=n)
+    months = start.year * 12 + start.month - 1 + n
+    return date(months // 12, months % 12 + 1, 1)
+
+def series_range(bucket: str, today: date, start: Optional[date], end: Optional[date]) -> Tuple[date, date, int]:
+    # (最初のバケットの初日, 最後のバケットの初日, バケット数)。上限を超える・逆順のときは ValueError
+    last = series_bucket_start(end or today, bucket)
+    if start is None:
+        first = series_bucket_add(last, -(DEFAULT_SERIES_LENGTH[bucket] - 1), bucket)
+    else:
+        first = series_bucket_start(start, bucket)
+    length = series_bucket_index(first, last, bucket) + 1
+    if length < 1:
+        raise ValueError("from must not be after to")
+    if length > MAX_SERIES_LENGTH[bucket]:
+        raise ValueError(f"at most {MAX_SERIES_LENGTH[bucket]} {bucket} buckets can be requested")
+    return first, last, length
+
+async def get_training_series(
+    db: AsyncSession,
+    user_id: int,
+    bucket: str,
+    first: date,
+    last: date,
+    length: int,
+    tz: ZoneInfo,
+    exercise_name: Optional[str] = None,
+) -> TrainingSeriesResponse:
+    # 日別集計（ユーザーのタイムゾーンでの日付）を date_trunc でバケットにまとめる。
+    # 主キー (user_id, day, exercise_name) の範囲検索 1 回なので、1 年分の日別（ヒートマップ）でも軽い。
+    # 記録のないバケットは SQL では返らないので、配列の位置で 0 埋めする
+    if bucket not in SERIES_BUCKETS:
+        raise ValueError(f"unknown bucket {bucket!r}")
+    bucket_start = cast(func.date_trunc(literal_column(f"'{bucket}'"), UserDailyTotal.day), Date).label("bucket_start")
+    query = select(
+        bucket_start,
+        UserDailyTotal.exercise_name,
+        func.sum(UserDailyTotal.total_count).label("total_count"),
+        func.sum(UserDailyTotal.total_duration).label("total_duration"),
+    ).where(
+        UserDailyTotal.user_id == user_id,
+        UserDailyTotal.day >= first,
+        UserDailyTotal.day < series_bucket_add(last, 1, bucket),
+    ).group_by(bucket_start, UserDailyTotal.exercise_name)
+    if exercise_name is not None:
+        query = query.where(UserDailyTotal.exercise_name == exercise_name)
+
+    series: Dict[str, ExerciseSeries] = {}
+    for row in await db.execute(query):
+        item = series.get(row.exercise_name)
+        if item is None:
+            item = series[row.exercise_name] = ExerciseSeries(
+                exercise_name=row.exercise_name, count=[0] * length, duration=[0] * length,
+            )
+        index = series_bucket_index(first, row.bucket_start, bucket)
+        item.count[index] = row.total_count
+        item.duration[index] = row.total_duration
+
+    return TrainingSeriesResponse(
+        bucket=bucket,
+        timezone=tz.key,
+        start=first,
+        end=last,
+        length=length,
+        series=[series[name] for name in sorted(series)],
+    )
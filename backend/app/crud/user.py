@@ -1,9 +1,18 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
-from sqlalchemy import select
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import select, insert, update, case
+from sqlalchemy.exc import IntegrityError
+from typing import Optional, Tuple
 from app.models.user import User
+from app.models.settings import UserSettings, DEFAULT_TIMEZONE
 from app.schemas.user import UserCreate, UserUpdate
 from app.core.security import get_password_hash
+from app.crud.errors import duplicate_error
+from app.core.principal import invalidate_principal
+from app.core.conditional import get_cached_data_version, cache_data_version, invalidate_data_version
+from app.core.replica import pin_to_primary
+from app.core.leaderboard import forget_username, remove_user as remove_from_leaderboards
 
 async def get_user_by_email(db: AsyncSession, email: str):
     result = await db.execute(select(User).options(selectinload(User.settings)).where(User.email == email))
@@ -13,39 +22,114 @@ async def get_user_by_username(db: AsyncSession, username: str):
     result = await db.execute(select(User).options(selectinload(User.settings)).where(User.username == username))
     return result.scalars().first()
 
-async def create_user(db: AsyncSession, user: UserCreate):
-    hashed_password = get_password_hash(user.password)
-    db_user = User(
-        email=user.email,
-        username=user.username,
-        hashed_password=hashed_password
+async def get_active_token_version(db: AsyncSession, user_id: int) -> Optional[int]:
+    # 無効化されたユーザー・存在しないユーザーは None
+    result = await db.execute(
+        select(User.token_version).where(User.id == user_id, User.is_active.is_(True))
     )
-    db.add(db_user)
-    await db.commit()
-    await db.refresh(db_user)
+    return result.scalar()
+
+def _data_version_query(user_id: int):
+    return (
+        select(User.data_version, UserSettings.timezone)
+        .outerjoin(UserSettings, UserSettings.user_id == User.id)
+        .where(User.id == user_id)
+    )
+
+async def get_data_version(db: AsyncSession, user_id: int) -> Tuple[int, str]:
+    # ETag 用の (data_version, タイムゾーン名)。キャッシュに当たれば DB は引かない
+    cached = get_cached_data_version(user_id)
+    if cached is not None:
+        return cached
+    row = (await db.execute(_data_version_query(user_id))).first()
+    version, timezone = (row[0], row[1] or DEFAULT_TIMEZONE) if row else (0, DEFAULT_TIMEZONE)
+    cache_data_version(user_id, version, timezone)
+    return version, timezone
+
+async def warm_up_auth_queries(db: AsyncSession):
+    # ログインと認証で毎回使う SQL を存在しないユーザーで 1 回ずつ実行し、
+    # マッパーの設定と SQL のコンパイルを起動時に済ませておく（キャッシュには入れない）
+    await get_user_by_email(db, email="")
+    await get_active_token_version(db, 0)
+    await db.execute(_data_version_query(0))
+    # 設定の selectinload の SQL はユーザーが見つかったときにしか実行されないので、誰か 1 人を読む
+    (await db.execute(select(User).options(selectinload(User.settings)).limit(1))).scalars().first()
+    db.expunge_all()
 
-    # Create default settings
-    from app.crud.settings import create_default_settings
-    await create_default_settings(db, db_user.id)
-    
-    # Reload user with settings
-    # Since we just added settings in a separate transaction/commit, we need to refresh or re-fetch
-    # A simple refresh with specific attributes is efficient
-    await db.refresh(db_user, attribute_names=["settings"])
+async def bump_data_version(db: AsyncSession, user_id: int):
+    # 書き込みと同じトランザクションで呼ぶ。コミット後に invalidate_data_version でキャッシュを消すこと
+    # (ユーザー情報自体は変わらないので updated_at はそのままにする)
+    await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(data_version=User.data_version + 1, updated_at=User.updated_at)
+    )
 
+async def create_user(db: AsyncSession, user: UserCreate) -> User:
+    # ユーザーと既定の設定を 1 トランザクションで作る（INSERT ... RETURNING を 2 回）
+    # メールアドレス・ユーザー名の重複は一意制約で検出して DuplicateError を投げる
+    hashed_password = await get_password_hash(user.password)
+    try:
+        db_user = await db.scalar(
+            insert(User)
+            .values(email=user.email, username=user.username, hashed_password=hashed_password)
+            .returning(User)
+        )
+        db_settings = await db.scalar(insert(UserSettings).values(user_id=db_user.id).returning(UserSettings))
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        raise duplicate_error(e) or e
+    # 登録直後の GET /settings/me などがまだ届いていないレプリカを読まないように
+    pin_to_primary(db_user.id)
+    set_committed_value(db_user, "settings", db_settings)
     return db_user
 
-async def update_user(db: AsyncSession, db_user: User, user_in: UserUpdate):
-    update_data = user_in.model_dump(exclude_unset=True)
-    if "password" in update_data:
-        hashed_password = get_password_hash(update_data["password"])
-        del update_data["password"]
-        db_user.hashed_password = hashed_password
-    
-    for field, value in update_data.items():
-        setattr(db_user, field, value)
-
-    db.add(db_user)
+async def update_user(db: AsyncSession, user_id: int, user_in: UserUpdate) -> Optional[User]:
+    # 読み込まずに UPDATE ... RETURNING で更新し、レスポンス用に設定を読んでコミットする
+    # 無効化されたユーザーは None。重複は一意制約で検出して DuplicateError を投げる
+    values = user_in.model_dump(exclude_unset=True)
+    token_version = User.token_version
+    if "password" in values:
+        values["hashed_password"] = await get_password_hash(values.pop("password"))
+        token_version = User.token_version + 1
+    elif "email" in values:
+        # トークンの sub はメールアドレスなので、変わったときだけ変更前に発行したトークンを失効させる
+        token_version = case((User.email != values["email"], User.token_version + 1), else_=User.token_version)
+
+    try:
+        db_user = await db.scalar(
+            update(User)
+            .where(User.id == user_id, User.is_active.is_(True))
+            .values(**values, token_version=token_version, data_version=User.data_version + 1)
+            .returning(User)
+        )
+        if db_user is None:
+            await db.rollback()
+            return None
+        db_settings = await db.scalar(select(UserSettings).where(UserSettings.user_id == user_id))
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        raise duplicate_error(e) or e
+    invalidate_principal(user_id)
+    invalidate_data_version(user_id)
+    pin_to_primary(user_id)
+    # ランキングに出す名前も変わっているかもしれない
+    forget_username(user_id)
+    set_committed_value(db_user, "settings", db_settings)
+    return db_user
+
+async def deactivate_user(db: AsyncSession, user_id: int) -> Optional[User]:
+    db_user = await db.scalar(
+        update(User)
+        .where(User.id == user_id)
+        .values(is_active=False, token_version=User.token_version + 1, data_version=User.data_version + 1)
+        .returning(User)
+    )
     await db.commit()
-    await db.refresh(db_user)
+    # キャッシュに残っているとTTLが切れるまでログインできてしまうので、すぐに消す
+    invalidate_principal(user_id)
+    invalidate_data_version(user_id)
+    remove_from_leaderboards(user_id)
     return db_user
@@ -1,6 +1,12 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.models.yucchin import UserYucchin
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+from app.models.yucchin import UserYucchin, YucchinCatalog
+from app.core.yucchin_rules import CatalogEntry, UnlockRules, get_current_rules, get_current_catalog, set_current_rules, serialize_catalog
+from app.core.conditional import invalidate_data_version
+from app.core.replica import pin_to_primary
+from app.crud.user import bump_data_version
+from app.crud.errors import duplicate_error
 from app.schemas.yucchin import UserYucchinCreate
 
 async def get_yucchins(db: AsyncSession, user_id: int):
@@ -8,12 +14,40 @@ async def get_yucchins(db: AsyncSession, user_id: int):
     return result.scalars().all()
 
 async def create_user_yucchin(db: AsyncSession, yucchin: UserYucchinCreate, user_id: int):
-    db_yucchin = UserYucchin(
-        user_id=user_id,
-        yucchin_type=yucchin.yucchin_type,
-        yucchin_name=yucchin.yucchin_name
-    )
-    db.add(db_yucchin)
-    await db.commit()
-    await db.refresh(db_yucchin)
+    # INSERT ... RETURNING とバージョンの更新を 1 トランザクションで行う
+    # 獲得済みのゆっちんは一意制約 uq_user_yucchins_user_type で検出して DuplicateError を投げる
+    try:
+        db_yucchin = await db.scalar(
+            insert(UserYucchin)
+            .values(user_id=user_id, yucchin_type=yucchin.yucchin_type, yucchin_name=yucchin.yucchin_name)
+            .returning(UserYucchin)
+        )
+        await bump_data_version(db, user_id)
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        raise duplicate_error(e) or e
+    invalidate_data_version(user_id)
+    pin_to_primary(user_id)
     return db_yucchin
+
+async def load_unlock_rules(db: AsyncSession) -> UnlockRules:
+    # yucchin_catalog を読み直して判定用のインデックスを作り直す
+    result = await db.execute(select(YucchinCatalog).where(YucchinCatalog.is_active.is_(True)))
+    rules = UnlockRules(CatalogEntry.from_row(row) for row in result.scalars().all())
+    set_current_rules(rules)
+    return rules
+
+async def reload_unlock_rules_if_changed(db: AsyncSession) -> bool:
+    # 定期的に yucchin_catalog を読み直し、内容が変わったときだけルールと ETag を差し替える
+    result = await db.execute(select(YucchinCatalog).where(YucchinCatalog.is_active.is_(True)))
+    entries = [CatalogEntry.from_row(row) for row in result.scalars().all()]
+    current = get_current_catalog()
+    if current is not None and serialize_catalog(entries)[1] == current[1]:
+        return False
+    set_current_rules(UnlockRules(entries))
+    return True
+
+async def get_unlock_rules(db: AsyncSession) -> UnlockRules:
+    # 通常は起動時に読み込み済み（スクリプトなどから呼ばれた場合はここで読み込む）
+    return get_current_rules() or await load_unlock_rules(db)
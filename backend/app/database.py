@@ -1,7 +1,20 @@
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError, DBAPIError
 from dotenv import load_dotenv
+from app.core.metrics import Gauge, register, record_pool_wait, install_db_instrumentation
+from app.core.query_budget import install_query_recording
+from app.core.replica import replica_state, is_pinned_to_primary
+from uuid import uuid4
+import asyncio
+import logging
 import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
 
 load_dotenv()
 
@@ -13,17 +26,227 @@ if DATABASE_URL is None:
         "Please set it in your .env file or environment."
     )
 
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+asyncpg://", 1)
-elif DATABASE_URL.startswith("postgresql://"):
-    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+def _async_url(url: str) -> str:
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+DATABASE_URL = _async_url(DATABASE_URL)
+# 読み取り用のレプリカ（任意）。設定すると get_read_db を使うエンドポイントはレプリカから読む
+DATABASE_REPLICA_URL = _async_url(os.getenv("DATABASE_REPLICA_URL", "")) or None
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+# コネクションプールの設定（ワーカー数 × (DB_POOL_SIZE + DB_MAX_OVERFLOW) が DB の接続上限を超えないようにする）
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+# 1 つの SQL の実行時間の上限（ミリ秒、0 で無制限）
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+# pgbouncer などトランザクションモードのプーラー越しに接続する場合は true にする。
+# 接続ごとに別のサーバー接続に振り分けられるので、asyncpg のプリペアドステートメントのキャッシュを切り、
+# ステートメント名も毎回一意にする。
+# また起動パラメータの statement_timeout はプーラーが受け付けないので送らない
+# （その場合は ALTER ROLE ... SET statement_timeout で DB 側に設定する）。
+DB_PGBOUNCER = _env_bool("DB_PGBOUNCER", False)
+# 発行した SQL を割合 (0.0〜1.0) でサンプリングしてログに出す。0 で出さない
+DB_LOG_SQL_SAMPLE_RATE = float(os.getenv("DB_LOG_SQL_SAMPLE_RATE", "0"))
+# 起動時に開いておく接続の数（最初のリクエストで接続を張る時間を待たせないため。0 で開かない）
+DB_POOL_WARMUP_CONNECTIONS = min(int(os.getenv("DB_POOL_WARMUP_CONNECTIONS", str(DB_POOL_SIZE))), DB_POOL_SIZE)
+# GET /healthz/ready で DB に接続できるか確かめるときの待ち時間の上限
+DB_READY_TIMEOUT_SECONDS = float(os.getenv("DB_READY_TIMEOUT_SECONDS", "2"))
+# レプリカに接続するときの待ち時間の上限（止まっていたらすぐにプライマリに切り替えるため）
+DB_REPLICA_CONNECT_TIMEOUT_SECONDS = float(os.getenv("DB_REPLICA_CONNECT_TIMEOUT_SECONDS", "2"))
+
+logger = logging.getLogger("app")
+sql_logger = logging.getLogger("app.sql")
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    # 接続の取得にかかった待ち時間を記録するプール
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            record_pool_wait(waited)
+
+    def recreate(self):
+        # dispose() 後に作り直されたプールにも統計を引き継ぐ
+        new_pool = super().recreate()
+        new_pool.checkouts = self.checkouts
+        new_pool.wait_seconds_total = self.wait_seconds_total
+        new_pool.wait_seconds_max = self.wait_seconds_max
+        new_pool.timeouts = self.timeouts
+        return new_pool
+
+def _connect_args(connect_timeout: Optional[float] = None) -> dict:
+    args = {} if connect_timeout is None else {"timeout": connect_timeout}
+    if DB_PGBOUNCER:
+        return {
+            **args,
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        return {**args, "server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    return args
+
+def _install_sql_sampling(target_engine, rate: float):
+    # stdout はエクスポートなどの出力に使うので、ログは stderr に出す
+    if not sql_logger.handlers:
+        sql_logger.addHandler(logging.StreamHandler())
+        sql_logger.setLevel(logging.INFO)
+
+    @event.listens_for(target_engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if random.random() < rate:
+            context._sql_log_started = time.perf_counter()
+
+    @event.listens_for(target_engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_sql_log_started", None)
+        if started is not None:
+            sql_logger.info("%.2fms %s", (time.perf_counter() - started) * 1000, " ".join(statement.split()))
+
+def create_engine_from_settings(url: str = DATABASE_URL, connect_timeout: Optional[float] = None):
+    created = create_async_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=DB_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=_connect_args(connect_timeout),
+    )
+    if DB_LOG_SQL_SAMPLE_RATE > 0:
+        _install_sql_sampling(created, DB_LOG_SQL_SAMPLE_RATE)
+    install_db_instrumentation(created)
+    install_query_recording(created)
+    return created
+
+def get_pool_status(target_engine=None) -> dict:
+    pool = (target_engine or engine).pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "timeout_seconds": DB_POOL_TIMEOUT_SECONDS,
+        "checkouts": pool.checkouts,
+        "timeouts": pool.timeouts,
+        "wait_ms_avg": pool.wait_seconds_total / pool.checkouts * 1000 if pool.checkouts else 0.0,
+        "wait_ms_max": pool.wait_seconds_max * 1000,
+    }
+
+async def warm_up_pool(target_engine=None, connections: int = DB_POOL_WARMUP_CONNECTIONS, prepare=None) -> int:
+    # 接続を同時に開いてからまとめて返し、プールに connections 本を残しておく（開けた数を返す）
+    # プリペアドステートメントは接続ごとなので、prepare（セッションを受け取る関数）があれば各接続で実行する
+    target_engine = target_engine or engine
+
+    async def open_connection():
+        connection = await target_engine.connect()
+        try:
+            if prepare is None:
+                await connection.execute(text("SELECT 1"))
+            else:
+                async with AsyncSession(bind=connection) as session:
+                    await prepare(session)
+        except BaseException:
+            await connection.close()
+            raise
+        return connection
+
+    opened = await asyncio.gather(*(open_connection() for _ in range(connections)), return_exceptions=True)
+    failures = [result for result in opened if isinstance(result, BaseException)]
+    for result in opened:
+        if not isinstance(result, BaseException):
+            await result.close()
+    if failures:
+        logger.warning("could not open %d of %d pooled connections: %r", len(failures), connections, failures[0])
+    return connections - len(failures)
+
+async def check_database(target_engine=None, timeout: float = DB_READY_TIMEOUT_SECONDS) -> bool:
+    try:
+        async with asyncio.timeout(timeout):
+            async with (target_engine or engine).connect() as connection:
+                await connection.execute(text("SELECT 1"))
+    except Exception:
+        # 接続できない・timeout 秒以内に返ってこない
+        return False
+    return True
+
+# レプリカの遅延（秒）。レプリカでない（プライマリを指している）ときは 0
+# 受け取った WAL をすべて適用済みなら遅れはない（書き込みがないあいだ最後の適用時刻からの経過を遅延としない）。
+# 再起動直後は受信位置がセグメントの先頭に戻るので等号ではなく <= で比べる。ストリーミングしていなければ (NULL) 適用時刻から測る
+REPLICA_LAG_SQL = text(
+    "SELECT CASE"
+    " WHEN NOT pg_is_in_recovery() THEN 0"
+    " WHEN pg_last_wal_receive_lsn() <= pg_last_wal_replay_lsn() THEN 0"
+    " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+    " END"
+)
+
+async def check_replica(timeout: float = DB_READY_TIMEOUT_SECONDS) -> bool:
+    # レプリカの遅延を測って状態を更新する（使えるなら True）
+    if replica_engine is None:
+        return False
+    try:
+        async with asyncio.timeout(timeout):
+            async with replica_engine.connect() as connection:
+                lag = float(await connection.scalar(REPLICA_LAG_SQL))
+    except Exception as e:
+        replica_state.record_failure(repr(e))
+        return False
+    replica_state.record_lag(lag)
+    return replica_state.healthy
+
+engine = create_engine_from_settings()
+replica_engine = (
+    create_engine_from_settings(DATABASE_REPLICA_URL, connect_timeout=DB_REPLICA_CONNECT_TIMEOUT_SECONDS)
+    if DATABASE_REPLICA_URL else None
+)
+
+register(Gauge("db_pool_checked_out", "Connections currently checked out of the pool", lambda: engine.pool.checkedout()))
+register(Gauge("db_pool_overflow", "Overflow connections currently open", lambda: max(engine.pool.overflow(), 0)))
+register(Gauge("db_pool_timeouts_total", "Pool checkouts that timed out", lambda: engine.pool.timeouts))
+if replica_engine is not None:
+    register(Gauge("db_replica_pool_checked_out", "Replica connections currently checked out of the pool", lambda: replica_engine.pool.checkedout()))
+    register(Gauge("db_replica_healthy", "1 while reads are routed to the replica", lambda: int(replica_state.healthy)))
+    register(Gauge("db_replica_lag_seconds", "Replication lag measured by the last check", lambda: replica_state.lag_seconds or 0))
+    register(Gauge("db_replica_reads_total", "Read sessions served by the replica", lambda: replica_state.reads))
+    register(Gauge("db_replica_primary_reads_total", "Read sessions served by the primary (pinned or replica unavailable)", lambda: replica_state.primary_reads))
+    register(Gauge("db_replica_failovers_total", "Times reads were switched from the replica to the primary", lambda: replica_state.failovers))
 
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
     expire_on_commit=False,
 )
+ReplicaSessionLocal = async_sessionmaker(bind=replica_engine, expire_on_commit=False) if replica_engine is not None else None
 
 Base = declarative_base()
 
@@ -32,3 +255,39 @@ from typing import AsyncGenerator
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
         yield session
+
+async def _open_replica_session() -> Optional[AsyncSession]:
+    # 接続まで済ませたレプリカのセッション。接続できなければレプリカを使えないことにして None
+    session = ReplicaSessionLocal()
+    try:
+        await session.connection()
+    except Exception as e:
+        await session.close()
+        replica_state.record_failure(repr(e))
+        return None
+    return session
+
+@asynccontextmanager
+async def read_session(user_id: Optional[int] = None, primary: Optional[AsyncSession] = None) -> AsyncIterator[AsyncSession]:
+    # 読み取りだけに使うセッション。レプリカが使えて、user_id が直前に書き込んでいなければレプリカ、
+    # それ以外はプライマリ（primary を渡せばそのセッションをそのまま使う。閉じるのは渡した側）
+    session = None
+    if replica_engine is not None and replica_state.healthy and (user_id is None or not is_pinned_to_primary(user_id)):
+        session = await _open_replica_session()
+    if session is None:
+        replica_state.primary_reads += 1
+        if primary is not None:
+            yield primary
+            return
+        async with AsyncSessionLocal() as session:
+            yield session
+        return
+    replica_state.reads += 1
+    async with session:
+        try:
+            yield session
+        except DBAPIError as e:
+            # 途中で接続が切れたら次の確認まで使わない（このリクエストはエラーになる）
+            if e.connection_invalidated:
+                replica_state.record_failure(repr(e))
+            raise
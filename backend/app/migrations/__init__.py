@@ -0,0 +1,75 @@
+from typing import List, Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from . import (
+    m0001_baseline,
+    m0002_training_logs_keyset_index,
+    m0003_training_logs_idempotency_key,
+    m0004_users_token_version,
+    m0005_yucchin_catalog,
+    m0006_users_data_version,
+    m0007_leaderboard_scores,
+)
+
+# スキーマのバージョン管理
+# 新しいマイグレーションは mXXXX_*.py を追加して MIGRATIONS の末尾に並べる
+# (VERSION は 1 ずつ増やし、適用済みのファイルは書き換えない)
+MIGRATIONS = [
+    m0001_baseline,
+    m0002_training_logs_keyset_index,
+    m0003_training_logs_idempotency_key,
+    m0004_users_token_version,
+    m0005_yucchin_catalog,
+    m0006_users_data_version,
+    m0007_leaderboard_scores,
+]
+
+LATEST_VERSION = MIGRATIONS[-1].VERSION
+
+# 複数のプロセスが同時に migrate.py を実行しても 1 つずつ適用されるようにするためのロック ID
+_ADVISORY_LOCK_ID = 7240001
+
+async def get_schema_version(conn: AsyncConnection) -> Optional[int]:
+    exists = await conn.scalar(text("SELECT to_regclass('schema_version') IS NOT NULL"))
+    if not exists:
+        return None
+    return await conn.scalar(text("SELECT max(version) FROM schema_version"))
+
+async def upgrade(engine: AsyncEngine, target: Optional[int] = None) -> List[int]:
+    # 未適用のマイグレーションを 1 つずつ、それぞれ 1 トランザクションで適用する
+    target = LATEST_VERSION if target is None else target
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.VERSION > target:
+            break
+        async with engine.begin() as conn:
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _ADVISORY_LOCK_ID})
+            # インデックス作成などは DB_STATEMENT_TIMEOUT_MS より長くかかることがある
+            await conn.execute(text("SET LOCAL statement_timeout = 0"))
+            await conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS schema_version ("
+                " version INTEGER PRIMARY KEY,"
+                " description VARCHAR NOT NULL,"
+                " applied_at TIMESTAMP WITH TIME ZONE DEFAULT now())"
+            ))
+            current = await get_schema_version(conn) or 0
+            if migration.VERSION <= current:
+                continue
+            for statement in migration.STATEMENTS:
+                await conn.execute(text(statement))
+            await conn.execute(
+                text("INSERT INTO schema_version (version, description) VALUES (:version, :description)"),
+                {"version": migration.VERSION, "description": migration.DESCRIPTION},
+            )
+            applied.append(migration.VERSION)
+    return applied
+
+async def verify_schema_version(engine: AsyncEngine):
+    # 起動時はバージョンの確認だけを行い、DDL は発行しない
+    async with engine.connect() as conn:
+        current = await get_schema_version(conn)
+    if current != LATEST_VERSION:
+        raise RuntimeError(
+            f"Database schema version is {current}, but this build expects {LATEST_VERSION}. "
+            "Run `uv run python migrate.py` before starting the server."
+        )
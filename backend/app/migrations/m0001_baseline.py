@@ -0,0 +1,131 @@
+# 初期スキーマ。create_all で作られた既存 DB にもそのまま適用できるよう IF NOT EXISTS で書く
+# 集計テーブルは既存のログから集計しておく（rebuild_aggregates.py と同じ内容。日付はユーザーのタイムゾーン）
+
+VERSION = 1
+DESCRIPTION = "baseline schema with indexes for the hot queries"
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        username VARCHAR(10) NOT NULL,
+        email VARCHAR(255) NOT NULL,
+        hashed_password VARCHAR(255) NOT NULL,
+        is_active BOOLEAN,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+        updated_at TIMESTAMP WITH TIME ZONE
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_username ON users (username)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email)",
+    """
+    CREATE TABLE IF NOT EXISTS user_settings (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL UNIQUE REFERENCES users (id),
+        bgm_volume INTEGER,
+        yucchin_sound BOOLEAN,
+        yucchin_hidden BOOLEAN,
+        yucchin_id INTEGER,
+        fps INTEGER,
+        timezone VARCHAR(64) DEFAULT 'Asia/Tokyo' NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+    )
+    """,
+    # create_all で作られた古いテーブルには timezone 列がない
+    "ALTER TABLE user_settings ADD COLUMN IF NOT EXISTS timezone VARCHAR(64) DEFAULT 'Asia/Tokyo' NOT NULL",
+    "CREATE INDEX IF NOT EXISTS ix_user_settings_id ON user_settings (id)",
+    """
+    CREATE TABLE IF NOT EXISTS user_yucchins (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        yucchin_type INTEGER NOT NULL,
+        yucchin_name VARCHAR NOT NULL,
+        obtained_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_user_yucchins_id ON user_yucchins (id)",
+    # 一意制約を張る前に重複を取り除く（最初に獲得したものを残す）
+    """
+    DELETE FROM user_yucchins a
+    USING user_yucchins b
+    WHERE a.user_id = b.user_id AND a.yucchin_type = b.yucchin_type AND a.id > b.id
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_user_yucchins_user_type ON user_yucchins (user_id, yucchin_type)",
+    """
+    CREATE TABLE IF NOT EXISTS training_logs (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        performed_at TIMESTAMP WITH TIME ZONE NOT NULL,
+        exercise_name VARCHAR NOT NULL,
+        count INTEGER,
+        duration INTEGER,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_training_logs_id ON training_logs (id)",
+    # get_training_logs (新しい順の一覧)
+    "CREATE INDEX IF NOT EXISTS ix_training_logs_user_performed ON training_logs (user_id, performed_at DESC)",
+    # 種目ごとの集計・集計テーブルの再構築
+    "CREATE INDEX IF NOT EXISTS ix_training_logs_user_exercise ON training_logs (user_id, exercise_name)",
+    """
+    CREATE TABLE IF NOT EXISTS user_exercise_totals (
+        user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+        exercise_name VARCHAR NOT NULL,
+        total_count INTEGER DEFAULT 0 NOT NULL,
+        total_duration INTEGER DEFAULT 0 NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+        PRIMARY KEY (user_id, exercise_name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_daily_totals (
+        user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+        day DATE NOT NULL,
+        exercise_name VARCHAR NOT NULL,
+        total_count INTEGER DEFAULT 0 NOT NULL,
+        total_duration INTEGER DEFAULT 0 NOT NULL,
+        PRIMARY KEY (user_id, day, exercise_name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_streaks (
+        user_id INTEGER PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+        current_streak INTEGER DEFAULT 0 NOT NULL,
+        longest_streak INTEGER DEFAULT 0 NOT NULL,
+        last_active_day DATE
+    )
+    """,
+    """
+    INSERT INTO user_exercise_totals (user_id, exercise_name, total_count, total_duration)
+    SELECT user_id, exercise_name, COALESCE(sum(count), 0), COALESCE(sum(duration), 0)
+    FROM training_logs
+    GROUP BY user_id, exercise_name
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO user_daily_totals (user_id, day, exercise_name, total_count, total_duration)
+    SELECT l.user_id, timezone(COALESCE(s.timezone, 'Asia/Tokyo'), l.performed_at)::date AS day, l.exercise_name,
+        COALESCE(sum(l.count), 0), COALESCE(sum(l.duration), 0)
+    FROM training_logs l
+    LEFT JOIN user_settings s ON s.user_id = l.user_id
+    GROUP BY l.user_id, day, l.exercise_name
+    ON CONFLICT DO NOTHING
+    """,
+    # 活動日から日付 - 行番号が同じ日を 1 つの連続区間にまとめ、最後の区間の長さを current_streak にする
+    """
+    INSERT INTO user_streaks (user_id, current_streak, longest_streak, last_active_day)
+    SELECT DISTINCT ON (user_id) user_id, length, max(length) OVER (PARTITION BY user_id), last_day
+    FROM (
+        SELECT user_id, count(*) AS length, max(day) AS last_day
+        FROM (
+            SELECT user_id, day, day - (row_number() OVER (PARTITION BY user_id ORDER BY day))::int AS run
+            FROM (SELECT DISTINCT user_id, day FROM user_daily_totals) AS days
+        ) AS numbered
+        GROUP BY user_id, run
+    ) AS runs
+    ORDER BY user_id, last_day DESC
+    ON CONFLICT DO NOTHING
+    """,
+]
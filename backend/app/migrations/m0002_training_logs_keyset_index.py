@@ -0,0 +1,9 @@
+# GET /training-logs のキーセットページング (performed_at, id) 用に、id を含むインデックスへ置き換える
+
+VERSION = 2
+DESCRIPTION = "training_logs keyset pagination index"
+
+STATEMENTS = [
+    "CREATE INDEX IF NOT EXISTS ix_training_logs_user_performed_id ON training_logs (user_id, performed_at DESC, id DESC)",
+    "DROP INDEX IF EXISTS ix_training_logs_user_performed",
+]
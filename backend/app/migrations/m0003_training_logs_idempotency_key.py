@@ -0,0 +1,13 @@
+# 一括登録・再送で同じログを二重に登録しないためのクライアント指定キー
+
+VERSION = 3
+DESCRIPTION = "training_logs idempotency key"
+
+STATEMENTS = [
+    "ALTER TABLE training_logs ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(64)",
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_training_logs_user_idempotency_key
+    ON training_logs (user_id, idempotency_key)
+    WHERE idempotency_key IS NOT NULL
+    """,
+]
@@ -0,0 +1,9 @@
+# アクセストークンに埋め込むユーザーごとのバージョン
+# パスワード変更・無効化などで上げると、それ以前に発行したトークンが使えなくなる
+
+VERSION = 4
+DESCRIPTION = "users token_version"
+
+STATEMENTS = [
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0",
+]
@@ -0,0 +1,50 @@
+# ゆっちんの一覧と獲得条件をコードから DB に移す
+# unlock_kind:
+#   threshold … metric が unlock_value をまたいだときに獲得
+#   interval  … metric が unlock_value の倍数をまたぐたびに、同じ条件 (metric, exercise, unlock_value) の
+#               未獲得のものからランダムに 1 体獲得
+# metric: total (全種目の回数+秒数の合計) / count (exercise の回数) / duration (exercise の秒数)
+
+VERSION = 5
+DESCRIPTION = "yucchin catalog"
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS yucchin_catalog (
+        id INTEGER PRIMARY KEY,
+        name VARCHAR NOT NULL,
+        rarity VARCHAR(16) NOT NULL,
+        priority INTEGER NOT NULL,
+        unlock_kind VARCHAR(16) NOT NULL CHECK (unlock_kind IN ('threshold', 'interval')),
+        metric VARCHAR(16) NOT NULL CHECK (metric IN ('total', 'count', 'duration')),
+        exercise_name VARCHAR,
+        unlock_value INTEGER NOT NULL CHECK (unlock_value > 0),
+        is_active BOOLEAN NOT NULL DEFAULT true,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+    )
+    """,
+    """
+    INSERT INTO yucchin_catalog (id, name, rarity, priority, unlock_kind, metric, exercise_name, unlock_value) VALUES
+        (1, 'ねこゆっちん', 'normal', 1, 'interval', 'total', NULL, 30),
+        (2, 'かぶとゆっちん', 'normal', 1, 'interval', 'total', NULL, 30),
+        (3, 'ティールゆっちんブーケ', 'normal', 1, 'interval', 'total', NULL, 30),
+        (4, 'ブルーゆっちんブーケ', 'normal', 1, 'interval', 'total', NULL, 30),
+        (5, 'ブルーゆっちん', 'normal', 1, 'interval', 'total', NULL, 30),
+        (6, '青鬼ゆっちん', 'normal', 1, 'interval', 'total', NULL, 30),
+        (7, 'パープルゆっちん', 'normal', 1, 'interval', 'total', NULL, 30),
+        (8, '紫鬼ゆっちん', 'normal', 1, 'interval', 'total', NULL, 30),
+        (9, 'デビルマンゆっちん', 'normal', 1, 'interval', 'total', NULL, 30),
+        (10, '花火ゆっちん', 'normal', 1, 'interval', 'total', NULL, 30),
+        (101, 'しかゆっちん', 'rare', 2, 'interval', 'total', NULL, 100),
+        (102, 'トリケラトユチン', 'rare', 2, 'interval', 'total', NULL, 100),
+        (103, 'カラフルゆっちんブーケ', 'rare', 2, 'interval', 'total', NULL, 100),
+        (104, 'ウマゆっちん', 'rare', 2, 'interval', 'total', NULL, 100),
+        (105, '愛の伝道師ゆっちん', 'rare', 2, 'interval', 'total', NULL, 100),
+        (201, 'リスカゆっちん', 'sr', 3, 'threshold', 'count', 'squat', 300),
+        (202, 'たまごゆっちん', 'sr', 3, 'threshold', 'count', 'pushup', 300),
+        (203, 'しかゆっちん【神鹿】', 'sr', 3, 'threshold', 'duration', 'plank', 300),
+        (301, 'エンジェルゆっちん', 'ur', 4, 'threshold', 'total', NULL, 1000),
+        (401, 'レントゲンゆっちん', 'secret', 5, 'threshold', 'total', NULL, 3000)
+    ON CONFLICT (id) DO NOTHING
+    """,
+]
@@ -0,0 +1,9 @@
+# ユーザーごとのデータのバージョン
+# 設定・ユーザー情報・トレーニング記録・ゆっちんが変わるたびに上げ、GET の ETag に使う
+
+VERSION = 6
+DESCRIPTION = "users data_version"
+
+STATEMENTS = [
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS data_version BIGINT NOT NULL DEFAULT 0",
+]
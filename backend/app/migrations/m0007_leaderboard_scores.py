@@ -0,0 +1,34 @@
+# 週間・月間・累計のランキング用スコア
+# 既存のログからも集計しておく（期間の区切りは Asia/Tokyo、週は月曜始まり。app/core/leaderboard.py と同じ）
+
+VERSION = 7
+DESCRIPTION = "leaderboard scores"
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS leaderboard_scores (
+        period VARCHAR(8) NOT NULL CHECK (period IN ('week', 'month', 'all')),
+        period_start DATE NOT NULL,
+        exercise_name VARCHAR NOT NULL,
+        user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+        score BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (period, period_start, exercise_name, user_id)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_leaderboard_scores_board_score
+    ON leaderboard_scores (period, period_start, exercise_name, score DESC)
+    """,
+    """
+    INSERT INTO leaderboard_scores (period, period_start, exercise_name, user_id, score)
+    SELECT p.period, p.period_start, l.exercise_name, l.user_id, sum(COALESCE(l.count, 0) + COALESCE(l.duration, 0))
+    FROM training_logs l
+    CROSS JOIN LATERAL (VALUES
+        ('week', date_trunc('week', timezone('Asia/Tokyo', l.performed_at))::date),
+        ('month', date_trunc('month', timezone('Asia/Tokyo', l.performed_at))::date),
+        ('all', DATE '1970-01-01')
+    ) AS p (period, period_start)
+    GROUP BY p.period, p.period_start, l.exercise_name, l.user_id
+    ON CONFLICT DO NOTHING
+    """,
+]
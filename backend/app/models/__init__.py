@@ -1,4 +1,5 @@
 from .user import User
 from .settings import UserSettings
-from .yucchin import UserYucchin
-from .training import TrainingLog
+from .yucchin import UserYucchin, YucchinCatalog
+from .training import TrainingLog, UserExerciseTotal, UserDailyTotal, UserStreak
+from .leaderboard import LeaderboardScore
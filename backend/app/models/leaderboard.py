@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Date, ForeignKey, Index
+from app.database import Base
+
+class LeaderboardScore(Base):
+    # ランキング用の期間ごと・種目ごとのスコア（回数 + 秒数）。ログ追加と同じトランザクションで加算する
+    # period は week / month / all。period_start は期間の初日（LEADERBOARD_TIMEZONE の日付、all は固定値）
+    __tablename__ = "leaderboard_scores"
+
+    period = Column(String(8), primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    exercise_name = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    score = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+# インデックスは app/migrations で作成する（ここはその定義と一致させておく）
+Index(
+    "ix_leaderboard_scores_board_score",
+    LeaderboardScore.period, LeaderboardScore.period_start, LeaderboardScore.exercise_name,
+    LeaderboardScore.score.desc(),
+)
@@ -1,8 +1,11 @@
-from sqlalchemy import Column, Integer, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
 
+# 日付の区切り（「今日」や日別集計）に使うタイムゾーンの既定値
+DEFAULT_TIMEZONE = "Asia/Tokyo"
+
 class UserSettings(Base):
     __tablename__ = "user_settings"
 
@@ -13,6 +16,7 @@ class UserSettings(Base):
     yucchin_hidden = Column(Boolean, default=False)
     yucchin_id = Column(Integer, default=1)
     fps = Column(Integer, default=20)
+    timezone = Column(String(64), nullable=False, default=DEFAULT_TIMEZONE, server_default=DEFAULT_TIMEZONE)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -12,6 +12,48 @@ class TrainingLog(Base):
     exercise_name = Column(String, nullable=False)
     count = Column(Integer, nullable=True)
     duration = Column(Integer, nullable=True)
+    # クライアントが付けるキー。同じキーの再送は二重登録しない
+    idempotency_key = Column(String(64), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     user = relationship("User", back_populates="training_logs")
+
+# インデックスは app/migrations で作成する（ここはその定義と一致させておく）
+Index("ix_training_logs_user_performed_id", TrainingLog.user_id, TrainingLog.performed_at.desc(), TrainingLog.id.desc())
+Index("ix_training_logs_user_exercise", TrainingLog.user_id, TrainingLog.exercise_name)
+Index(
+    "uq_training_logs_user_idempotency_key",
+    TrainingLog.user_id,
+    TrainingLog.idempotency_key,
+    unique=True,
+    postgresql_where=TrainingLog.idempotency_key.isnot(None),
+)
+
+class UserExerciseTotal(Base):
+    # training_logs の累計を種目ごとに保持する集計テーブル（ログ追加と同じトランザクションで更新）
+    __tablename__ = "user_exercise_totals"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    exercise_name = Column(String, primary_key=True)
+    total_count = Column(Integer, nullable=False, default=0, server_default="0")
+    total_duration = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class UserDailyTotal(Base):
+    # ユーザーのタイムゾーンでの日付ごと・種目ごとの集計（「今日」や期間指定の表示用）
+    __tablename__ = "user_daily_totals"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    exercise_name = Column(String, primary_key=True)
+    total_count = Column(Integer, nullable=False, default=0, server_default="0")
+    total_duration = Column(Integer, nullable=False, default=0, server_default="0")
+
+class UserStreak(Base):
+    # 連続日数の状態。ログ追加時に進めるので、読み取り時に全履歴を走査しなくてよい
+    __tablename__ = "user_streaks"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    current_streak = Column(Integer, nullable=False, default=0, server_default="0")
+    longest_streak = Column(Integer, nullable=False, default=0, server_default="0")
+    last_active_day = Column(Date, nullable=True)
@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
 
 class UserYucchin(Base):
     __tablename__ = "user_yucchins"
+    __table_args__ = (
+        # 同じゆっちんを二重に獲得しない
+        Index("uq_user_yucchins_user_type", "user_id", "yucchin_type", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -13,3 +17,18 @@ class UserYucchin(Base):
     obtained_at = Column(DateTime(timezone=True), server_default=func.now())
 
     user = relationship("User", back_populates="yucchins")
+
+class YucchinCatalog(Base):
+    # ゆっちんの一覧と獲得条件（app/core/yucchin_rules.py でインデックスに変換して使う）
+    __tablename__ = "yucchin_catalog"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    rarity = Column(String(16), nullable=False)
+    priority = Column(Integer, nullable=False)
+    unlock_kind = Column(String(16), nullable=False)
+    metric = Column(String(16), nullable=False)
+    exercise_name = Column(String, nullable=True)
+    unlock_value = Column(Integer, nullable=False)
+    is_active = Column(Boolean, nullable=False, default=True, server_default="true")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,24 +1,34 @@
 import os
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
+from typing import AsyncGenerator, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Request, WebSocket
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 import jwt
 from jwt.exceptions import PyJWTError
-from app.database import get_db
+from app.database import get_db, read_session
+from app.core.query_budget import query_budget
+from app.core.conditional import weak_etag, not_modified_or_tag
 from app.core.security import create_access_token, verify_password, ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY, ALGORITHM
-from app.crud.user import get_user_by_email
+from app.core.principal import get_cached_principal, cache_principal, get_cached_token_version, cache_token_version, NOT_CACHED
+from app.crud.user import get_user_by_email, get_active_token_version, get_data_version
 from app.schemas.token import Token
 from app.schemas.user import UserResponse, UserLogin
 
 router = APIRouter()
 security = HTTPBearer(auto_error=False)
 
-async def get_current_user(
+def credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="認証情報が無効です",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def get_token_payload(
     request: Request,
     token_auth: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_db)
-):
+) -> dict:
     # 1. Try to get token from HttpOnly Cookie
     token = request.cookies.get("access_token")
     
@@ -26,34 +36,89 @@ async def get_current_user(
     if not token and token_auth:
         token = token_auth.credentials
 
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="認証情報が無効です",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
+    return decode_access_token(token)
+
+def get_websocket_token_payload(websocket: WebSocket) -> dict:
+    # WebSocket でも HTTP と同じく Cookie を優先し、なければ Authorization ヘッダーを使う
+    token = websocket.cookies.get("access_token")
     if not token:
-        raise credentials_exception
+        scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer":
+            token = credentials
+    return decode_access_token(token)
+
+def decode_access_token(token: Optional[str]) -> dict:
+    if not token:
+        raise credentials_exception()
 
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except PyJWTError:
-        raise credentials_exception from None
-    
-    user = await get_user_by_email(db, email=email)
-    if user is None:
-        raise credentials_exception
-    if not user.is_active:
-        raise credentials_exception
-    return user
+        raise credentials_exception() from None
+    if payload.get("sub") is None:
+        raise credentials_exception()
+    return payload
+
+async def _check_token_version(db: AsyncSession, payload: dict):
+    # uid / ver を含むトークンは、ユーザーの現在の token_version と一致するときだけ有効
+    # (キャッシュに当たれば DB は引かない)
+    user_id = payload.get("uid")
+    version = payload.get("ver")
+    if user_id is None or version is None:
+        return
+    current = get_cached_token_version(user_id)
+    if current is NOT_CACHED:
+        current = await get_active_token_version(db, user_id)
+        cache_token_version(user_id, current)
+    if current is None or current != version:
+        raise credentials_exception()
+
+async def _resolve_principal(db: AsyncSession, email: str) -> UserResponse:
+    principal = get_cached_principal(email)
+    if principal is None:
+        user = await get_user_by_email(db, email=email)
+        if user is None:
+            raise credentials_exception()
+        principal = UserResponse.model_validate(user)
+        cache_principal(email, principal)
+    if not principal.is_active:
+        raise credentials_exception()
+    return principal
+
+async def get_current_user(
+    payload: dict = Depends(get_token_payload),
+    db: AsyncSession = Depends(get_db)
+) -> UserResponse:
+    # 読み取り用: キャッシュ済みのユーザー情報（ORM オブジェクトではなくスナップショット）を返す
+    # キャッシュに当たれば DB へのクエリは発行しない
+    await _check_token_version(db, payload)
+    return await _resolve_principal(db, payload["sub"])
+
+async def get_current_user_id(
+    payload: dict = Depends(get_token_payload),
+    db: AsyncSession = Depends(get_db)
+) -> int:
+    # user_id だけが必要なハンドラ用: トークンの uid と token_version だけで認証する
+    if payload.get("uid") is None or payload.get("ver") is None:
+        # uid を含まない旧形式のトークンはメールアドレスから引く
+        return (await _resolve_principal(db, payload["sub"])).id
+    await _check_token_version(db, payload)
+    return payload["uid"]
+
+async def get_read_db(
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+) -> AsyncGenerator[AsyncSession, None]:
+    # 読み取りだけのエンドポイント用: レプリカがあればレプリカのセッション
+    # （認証はプライマリで行う。直前に書き込んだユーザーとレプリカが使えないときはリクエストのプライマリのセッション）
+    async with read_session(user_id, primary=db) as session:
+        yield session
 
 @router.post("/token")
+@query_budget(2)
 async def login_for_access_token(response: Response, form_data: UserLogin, db: AsyncSession = Depends(get_db)):
     user = await get_user_by_email(db, email=form_data.email)
-    if not user or not verify_password(form_data.password, user.hashed_password) or not user.is_active:
+    if not user or not await verify_password(form_data.password, user.hashed_password) or not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="メールアドレスまたはパスワードが間違っています",
@@ -61,7 +126,8 @@ async def login_for_access_token(response: Response, form_data: UserLogin, db: A
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": user.email, "uid": user.id, "ver": user.token_version},
+        expires_delta=access_token_expires
     )
     
     # Set HttpOnly Cookie
@@ -91,5 +157,15 @@ async def logout(response: Response):
     return {"message": "Logout successful"}
 
 @router.get("/users/me", response_model=UserResponse)
-async def read_users_me(current_user = Depends(get_current_user)):
+@query_budget(4)
+async def read_users_me(
+    request: Request,
+    response: Response,
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    version, _ = await get_data_version(db, current_user.id)
+    not_modified = not_modified_or_tag(request, response, weak_etag("me", current_user.id, version))
+    if not_modified:
+        return not_modified
     return current_user
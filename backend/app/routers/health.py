@@ -0,0 +1,66 @@
+import hmac
+import os
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse, JSONResponse
+from app.core.metrics import Gauge, register, render_metrics
+from app.core.startup import is_ready, get_startup_report, get_startup_seconds
+from app.database import get_pool_status, check_database, replica_engine
+from app.core.replica import replica_state
+
+router = APIRouter()
+
+# /metrics・/healthz/pool と /healthz/ready の詳細は内部の状態（プール・レプリカのエラー・import の時間）を出すので、
+# METRICS_TOKEN を設定して Authorization: Bearer <METRICS_TOKEN> を付けたときだけ返す（未設定なら 404）
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or None
+
+def _has_metrics_token(authorization: Optional[str]) -> bool:
+    if METRICS_TOKEN is None or authorization is None:
+        return False
+    scheme, _, token = authorization.partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode())
+
+async def require_metrics_token(authorization: Optional[str] = Header(None)):
+    if METRICS_TOKEN is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not _has_metrics_token(authorization):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="METRICS_TOKEN が必要です",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+register(Gauge("app_startup_seconds", "Seconds from process start until the worker was ready (0 until ready)", lambda: get_startup_seconds() or 0))
+
+def _replica_status():
+    return replica_state.status() if replica_engine is not None else None
+
+@router.get("/healthz/ready")
+async def read_readiness(authorization: Optional[str] = Header(None)):
+    # 起動時の準備が終わっていて DB に接続できれば 200、それ以外は 503
+    # (デプロイのヘルスチェックに使う。METRICS_TOKEN を付けたときだけ、本文に起動の各段階と import にかかった時間・レプリカの状態を入れる)
+    # レプリカが使えなくても読み取りはプライマリに切り替わるので 503 にはしない（状態は replica に出す）
+    detailed = _has_metrics_token(authorization)
+    if not is_ready():
+        # 一度準備が終わっていれば終了中
+        state = "stopping" if get_startup_seconds() is not None else "starting"
+        content = {"status": state, "startup": get_startup_report()} if detailed else {"status": state}
+        return JSONResponse(status_code=503, content=content)
+    state = "ready" if await check_database() else "database_unavailable"
+    content = {"status": state, "startup": get_startup_report(), "replica": _replica_status()} if detailed else {"status": state}
+    if state != "ready":
+        return JSONResponse(status_code=503, content=content)
+    return content
+
+@router.get("/healthz/pool", dependencies=[Depends(require_metrics_token)])
+async def read_pool_status():
+    # コネクションプールの使用状況（使用中・オーバーフロー・取得待ち時間）
+    status = get_pool_status()
+    if replica_engine is not None:
+        status["replica"] = {**get_pool_status(replica_engine), **replica_state.status()}
+    return status
+
+@router.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_metrics_token)])
+async def read_metrics():
+    # Prometheus のテキスト形式
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
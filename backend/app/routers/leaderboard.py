@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Literal
+from app.database import get_db
+from app.core.leaderboard import LEADERBOARD_TOP_K
+from app.core.query_budget import query_budget
+from app.routers.auth import get_current_user_id
+from app.schemas.leaderboard import LeaderboardEntry, LeaderboardResponse
+from app.crud import get_leaderboard, get_usernames
+
+router = APIRouter()
+
+@router.get("/leaderboards/{exercise_name}", response_model=LeaderboardResponse)
+@query_budget(3)
+async def read_leaderboard(
+    exercise_name: str,
+    period: Literal["week", "month", "all"] = "week",
+    limit: int = Query(10, ge=1, le=LEADERBOARD_TOP_K),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    # 種目ごとの今週・今月・累計のランキング（回数 + 秒数）と自分の順位
+    # 通常はメモリ上のボードから返すので DB は引かない
+    leaderboard = await get_leaderboard(db, period, exercise_name)
+    if leaderboard is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="この種目のランキングはありません")
+    key, board = leaderboard
+    top = board.top(limit)
+    my_rank = board.rank(user_id)
+    # 自分の名前はボードに載っているときだけ引く
+    usernames = await get_usernames(db, [uid for _, uid, _ in top] + ([user_id] if my_rank is not None else []))
+
+    entries = [
+        LeaderboardEntry(rank=rank, username=usernames.get(uid, ""), score=score, is_me=uid == user_id)
+        for rank, uid, score in top
+    ]
+    me = None
+    if my_rank is not None:
+        me = LeaderboardEntry(rank=my_rank, username=usernames.get(user_id, ""), score=board.scores[user_id], is_me=True)
+
+    return LeaderboardResponse(
+        period=period,
+        period_start=key[1],
+        exercise_name=exercise_name,
+        total_users=len(board),
+        entries=entries,
+        me=me,
+    )
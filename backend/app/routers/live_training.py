@@ -0,0 +1,176 @@
+import asyncio
+import logging
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from pydantic import ValidationError
+from app.database import AsyncSessionLocal
+from app.core.origins import ALLOWED_ORIGINS
+from app.core.live_training import (
+    WS_HEARTBEAT_SECONDS, WS_IDLE_TIMEOUT_SECONDS, WS_RESUME_SECONDS, SESSION_ID_PATTERN,
+    LiveSession, LiveTrainingError, SessionLimitError, open_session, detach_session, close_session, save_slot,
+)
+from app.crud.live_training import save_live_sets
+from app.routers.auth import get_websocket_token_payload, get_current_user_id
+from app.schemas.live_training import live_training_event
+
+logger = logging.getLogger("app")
+
+router = APIRouter()
+
+# 同じ session_id で別の接続がつながったので、古い接続を閉じる
+WS_CLOSE_REPLACED = 4000
+
+# サーバーから送るメッセージ:
+#   ready     接続直後。ack（処理済みの最後の seq）と記録済みのセット番号
+#   saved     セットを記録した（回数も秒数も 0 のセット・何も届いていないセットでは log_id は null）
+#   unlocked  記録でゆっちんを獲得した
+#   ping      WS_HEARTBEAT_SECONDS ごと（pong を返す）。pong はクライアントからの ping への返事
+#   error     メッセージを処理できなかった（接続は閉じない）
+#   closed    end_session の処理が終わった（このあとサーバーが接続を閉じる）
+
+@router.websocket("/ws/training")
+async def live_training(websocket: WebSocket, session_id: str = Query(...)):
+    # Cookie で認証するので、ブラウザからは許可したオリジンのページからだけ受け付ける
+    origin = websocket.headers.get("origin")
+    if (origin is not None and origin not in ALLOWED_ORIGINS) or not SESSION_ID_PATTERN.match(session_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    try:
+        payload = get_websocket_token_payload(websocket)
+        # 認証のあとはセットを記録するときだけ DB を使う（接続中はセッションを持たない）
+        async with AsyncSessionLocal() as db:
+            user_id = await get_current_user_id(payload, db)
+        session, resumed = open_session(session_id, user_id, payload)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    except SessionLimitError:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    except LiveTrainingError:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    # 前の接続が残っていれば、その接続は次のメッセージを受け取ったときに自分で閉じる
+    session.connection = websocket
+    try:
+        await websocket.accept()
+        await websocket.send_json({
+            "type": "ready",
+            "session_id": session.session_id,
+            "resumed": resumed,
+            "ack": session.ack,
+            "saved_sets": sorted(session.saved_sets),
+            "heartbeat_seconds": WS_HEARTBEAT_SECONDS,
+            "resume_seconds": WS_RESUME_SECONDS,
+        })
+        await _receive_events(websocket, session)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        detach_session(session, websocket)
+
+async def _receive_events(websocket: WebSocket, session: LiveSession):
+    loop = asyncio.get_running_loop()
+    last_seen = loop.time()
+    while True:
+        try:
+            text = await asyncio.wait_for(websocket.receive_text(), WS_HEARTBEAT_SECONDS)
+        except asyncio.TimeoutError:
+            if loop.time() - last_seen >= WS_IDLE_TIMEOUT_SECONDS:
+                await websocket.close(code=status.WS_1001_GOING_AWAY)
+                return
+            await websocket.send_json({"type": "ping", "ack": session.ack})
+            continue
+        last_seen = loop.time()
+
+        if session.connection is not websocket:
+            await websocket.close(code=WS_CLOSE_REPLACED)
+            return
+        if not await _handle_event(websocket, session, text):
+            return
+
+async def _handle_event(websocket: WebSocket, session: LiveSession, text: str) -> bool:
+    # 接続を続けるなら True
+    try:
+        event = live_training_event.validate_json(text)
+    except ValidationError:
+        await websocket.send_json({"type": "error", "detail": "メッセージの形式が不正です"})
+        return True
+
+    if event.type == "ping":
+        await websocket.send_json({"type": "pong", "ack": session.ack})
+        return True
+    if event.type == "pong" or not session.accept(event.seq):
+        return True
+
+    if event.type == "progress":
+        try:
+            session.add_progress(event.set, event.exercise_name, event.count, event.duration)
+        except LiveTrainingError as e:
+            await websocket.send_json({"type": "error", "seq": event.seq, "detail": str(e)})
+        return True
+
+    if event.type == "end_set":
+        _queue_save(websocket, session, [event.set])
+        return True
+
+    # end_session: 前の end_set の記録が終わってから、残りのセットをまとめて記録する
+    _queue_save(websocket, session, None)
+    if not await session.saving:
+        return False
+    if session.sets:
+        # 記録に失敗したセットが戻っている。送り直しの end_session を待つ
+        return True
+    close_session(session)
+    await websocket.send_json({"type": "closed", "ack": session.ack})
+    await websocket.close()
+    return False
+
+def _queue_save(websocket: WebSocket, session: LiveSession, set_nos):
+    # 記録は受信とは別のタスクで、セッションごとに順番に行う（DB の順番待ちの間も ping や progress を受け付ける）
+    session.saving = asyncio.create_task(_save(websocket, session, set_nos, session.saving))
+
+async def _save(websocket: WebSocket, session: LiveSession, set_nos, previous) -> bool:
+    # 接続を続けるなら True。記録中に切断されても記録は続ける（結果は再接続後の ready の saved_sets でわかる）
+    if previous is not None:
+        await asyncio.wait([previous])
+    try:
+        async with save_slot(), AsyncSessionLocal() as db:
+            try:
+                # ログアウト・無効化などでトークンが使えなくなっていれば記録せずに閉じる
+                await get_current_user_id(session.payload, db)
+            except HTTPException:
+                close_session(session)
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                return False
+            try:
+                saved, unlocked_ids = await save_live_sets(db, session, set_nos)
+            except Exception:
+                logger.exception("failed to save live training sets")
+                await websocket.send_json({"type": "error", "sets": set_nos, "detail": "記録に失敗しました"})
+                return True
+
+        for set_no, open_set, log, created in saved:
+            await websocket.send_json({
+                "type": "saved",
+                "set": set_no,
+                "log_id": log.id if log is not None else None,
+                "created": created,
+                "exercise_name": open_set.exercise_name,
+                "count": open_set.count,
+                "duration": open_set.duration,
+                "ack": session.ack,
+            })
+        if set_nos is not None:
+            # 何も届いていない（または記録済みの）セットの end_set にも返事をする
+            for set_no in set(set_nos) - {set_no for set_no, _, _, _ in saved}:
+                await websocket.send_json({
+                    "type": "saved", "set": set_no, "log_id": None, "created": False,
+                    "exercise_name": None, "count": 0, "duration": 0, "ack": session.ack,
+                })
+        if unlocked_ids:
+            await websocket.send_json({"type": "unlocked", "yucchin_types": unlocked_ids})
+    except (WebSocketDisconnect, RuntimeError):
+        # 送る前に接続が閉じた（Starlette は閉じたあとの send で RuntimeError を投げる）
+        return False
+    return True
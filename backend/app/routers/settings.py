@@ -1,33 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
-from app.routers.auth import get_current_user
+from app.core.query_budget import query_budget
+from app.core.conditional import weak_etag, not_modified_or_tag
+from app.routers.auth import get_current_user_id, get_read_db
 from app.schemas.settings import UserSettingsResponse, UserSettingsUpdate
-from app.crud.settings import get_settings_by_user_id, update_settings, create_default_settings
-from app.models.user import User
+from app.crud.settings import get_settings_by_user_id, get_or_create_settings, update_settings
+from app.crud.user import get_data_version
 
 router = APIRouter()
 
 @router.get("/me", response_model=UserSettingsResponse)
+@query_budget(3)
 async def read_user_settings(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_read_db),
+    primary_db: AsyncSession = Depends(get_db)
 ):
-    settings = await get_settings_by_user_id(db, current_user.id)
-    if not settings:
-        # Lazy creation for existing users who don't have settings yet
-        settings = await create_default_settings(db, current_user.id)
+    version, _ = await get_data_version(db, user_id)
+    not_modified = not_modified_or_tag(request, response, weak_etag("settings", user_id, version))
+    if not_modified:
+        return not_modified
+    settings = await get_settings_by_user_id(db, user_id)
+    if settings is None:
+        # 設定のない古いユーザー（またはまだレプリカに届いていない）の分はプライマリで作る
+        settings = await get_or_create_settings(primary_db, user_id)
     return settings
 
 @router.put("/me", response_model=UserSettingsResponse)
+@query_budget(3)
 async def update_user_settings(
     settings_in: UserSettingsUpdate,
-    current_user: User = Depends(get_current_user),
+    user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
-    settings = await get_settings_by_user_id(db, current_user.id)
-    if not settings:
-         # Should not happen if GET is called first, but safe to handle
-        settings = await create_default_settings(db, current_user.id)
-    
-    return await update_settings(db, settings, settings_in)
+    return await update_settings(db, user_id, settings_in)
@@ -1,32 +1,151 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
-from app.database import get_db
-from app.routers.auth import get_current_user
-from app.models.user import User
-from app.schemas.training import TrainingLogCreate, TrainingLogResponse, TrainingStatsResponse
-from app.crud import get_training_logs, create_training_log, get_training_stats
+from datetime import date, datetime
+from typing import Literal, Optional
+from zoneinfo import ZoneInfo
+from app.database import get_db, read_session
+from app.core.export import EXPORT_FORMATS, format_rows
+from app.core.metrics import span
+from app.core.query_budget import query_budget
+from app.core.conditional import weak_etag, not_modified_or_tag, get_cached_data_version
+from app.core.stats_cache import get_cached_training_stats, cache_training_stats
+from app.routers.auth import get_current_user_id, get_read_db
+from app.schemas.training import (
+    TrainingLogCreate, TrainingLogResponse, TrainingLogPage, TrainingStatsResponse, TrainingSeriesResponse,
+    TrainingLogBatchCreate, TrainingLogBatchItem, TrainingLogBatchResponse,
+)
+from app.crud import get_training_logs, create_training_log, create_training_logs, get_training_stats, get_data_version
+from app.crud.training import (
+    DEFAULT_LOG_PAGE_SIZE, MAX_LOG_PAGE_SIZE, EXPORT_COLUMNS, stream_training_log_rows, series_range, get_training_series,
+)
 
 router = APIRouter()
 
 @router.get("/training-logs/stats", response_model=TrainingStatsResponse)
+@query_budget(5)
 async def read_training_stats(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_read_db)
+):
+    # キャッシュ済みならバージョンも引かない（ログ追加などで消え、ユーザーの 0 時に期限が切れる）
+    cached = get_cached_training_stats(user_id)
+    if cached is not None:
+        stats, etag = cached
+        return not_modified_or_tag(request, response, etag) or stats
+
+    # 書き込みがなくても日付が変われば「今日」と連続日数が変わるので、ユーザーのタイムゾーンでの日付も ETag に含める
+    version, timezone = await get_data_version(db, user_id)
+    tz = ZoneInfo(timezone)
+    today = datetime.now(tz).date()
+    etag = weak_etag("stats", user_id, version, today.isoformat())
+    not_modified = not_modified_or_tag(request, response, etag)
+    if not_modified:
+        return not_modified
+    with span("training_stats"):
+        stats = await get_training_stats(db, user_id=user_id, tz=tz)
+    # 集計中に同じプロセスでログが追加されていれば（バージョンのキャッシュが消えていれば）古いのでキャッシュしない
+    if get_cached_data_version(user_id) == (version, timezone):
+        cache_training_stats(user_id, stats, etag, tz)
+    return stats
+
+@router.get("/training-logs/series", response_model=TrainingSeriesResponse)
+@query_budget(3)
+async def read_training_series(
+    request: Request,
+    response: Response,
+    bucket: Literal["day", "week", "month"] = "day",
+    start: Optional[date] = Query(None, alias="from", description="最初の日（ユーザーのタイムゾーン）。省略時は bucket ごとの既定の長さ"),
+    end: Optional[date] = Query(None, alias="to", description="最後の日（ユーザーのタイムゾーン、この日を含む）。省略時は今日"),
+    exercise_name: Optional[str] = Query(None, alias="exercise"),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    return await get_training_stats(db, user_id=current_user.id)
+    # 週・月ごとのグラフや 1 年分のヒートマップ用に、日別集計をバケットにまとめた推移を返す
+    version, timezone = await get_data_version(db, user_id)
+    tz = ZoneInfo(timezone)
+    today = datetime.now(tz).date()
+    try:
+        first, last, length = series_range(bucket, today, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    # from / to を省略したときは今日によって範囲が変わるので、日付も ETag に含める
+    not_modified = not_modified_or_tag(request, response, weak_etag("series", user_id, version, today.isoformat()))
+    if not_modified:
+        return not_modified
+    return await get_training_series(db, user_id, bucket, first, last, length, tz, exercise_name=exercise_name)
 
-@router.get("/training-logs", response_model=List[TrainingLogResponse])
+@router.get("/training-logs", response_model=TrainingLogPage)
+@query_budget(2)
 async def read_training_logs(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    limit: int = Query(DEFAULT_LOG_PAGE_SIZE, ge=1, le=MAX_LOG_PAGE_SIZE),
+    before: Optional[str] = Query(None, description="next_cursor の値。これより古いログを返す"),
+    after: Optional[str] = Query(None, description="prev_cursor の値。これより新しいログを返す"),
+    start: Optional[datetime] = Query(None, alias="from", description="performed_at >= from"),
+    end: Optional[datetime] = Query(None, alias="to", description="performed_at < to"),
+    exercise_name: Optional[str] = None,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_read_db)
+):
+    try:
+        return await get_training_logs(
+            db,
+            user_id=user_id,
+            limit=limit,
+            before=before,
+            after=after,
+            start=start,
+            end=end,
+            exercise_name=exercise_name,
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="カーソルの指定が不正です"
+        )
+
+@router.get("/training-logs/export")
+async def export_training_logs(
+    fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    user_id: int = Depends(get_current_user_id),
 ):
-    return await get_training_logs(db, user_id=current_user.id)
+    async def body():
+        # レスポンスを返し終わるまでセッションを保持するため、ここで専用のセッションを開く
+        async with read_session(user_id) as db:
+            async for chunk in format_rows(stream_training_log_rows(db, user_id=user_id), EXPORT_COLUMNS, fmt):
+                yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="training_logs.{fmt}"'},
+    )
 
 @router.post("/training-logs", response_model=TrainingLogResponse)
+@query_budget(11)
 async def create_new_training_log(
     log: TrainingLogCreate,
-    current_user: User = Depends(get_current_user),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    return await create_training_log(db, log=log, user_id=user_id)
+
+
+@router.post("/training-logs/batch", response_model=TrainingLogBatchResponse)
+@query_budget(11)
+async def create_training_log_batch(
+    batch: TrainingLogBatchCreate,
+    user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
-    return await create_training_log(db, log=log, user_id=current_user.id)
+    # オフラインで記録したセッションなどをまとめて登録する
+    items, unlocked_ids = await create_training_logs(db, batch.logs, user_id=user_id)
+    return TrainingLogBatchResponse(
+        items=[
+            TrainingLogBatchItem(id=log.id, idempotency_key=log.idempotency_key, created=created)
+            for log, created in items
+        ],
+        unlocked_yucchin_types=unlocked_ids,
+    )
@@ -1,25 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
+import os
 from app.database import get_db
-from app.routers.auth import get_current_user
-from app.schemas.yucchin import UserYucchinCreate, UserYucchinResponse
-from app.models.user import User
-from app.crud import get_yucchins, create_user_yucchin
+from app.core.query_budget import query_budget
+from app.routers.auth import get_current_user_id, get_read_db
+from app.core.conditional import etag_matches, weak_etag, not_modified_or_tag
+from app.core.yucchin_rules import get_current_catalog
+from app.schemas.yucchin import UserYucchinCreate, UserYucchinResponse, YucchinCatalogEntryResponse
+from app.crud import get_yucchins, create_user_yucchin, get_data_version
+from app.crud.errors import DuplicateError
 
 router = APIRouter()
 
+# 一覧はほとんど変わらないので長めにキャッシュさせる（変わったときは ETag で検知できる）
+CATALOG_CACHE_MAX_AGE_SECONDS = int(os.getenv("CATALOG_CACHE_MAX_AGE_SECONDS", "86400"))
+
+@router.get("/yucchins/catalog", response_model=List[YucchinCatalogEntryResponse])
+@query_budget(0)
+async def read_yucchin_catalog(request: Request):
+    # 起動時（と一覧が変わったとき）にシリアライズ済みの JSON をそのまま返す。DB には触れない
+    catalog = get_current_catalog()
+    if catalog is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Yucchin catalog is not loaded")
+    body, etag = catalog
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={CATALOG_CACHE_MAX_AGE_SECONDS}"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get("/yucchins", response_model=List[UserYucchinResponse])
+@query_budget(3)
 async def read_yucchins(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    return await get_yucchins(db, user_id=current_user.id)
+    version, _ = await get_data_version(db, user_id)
+    not_modified = not_modified_or_tag(request, response, weak_etag("yucchins", user_id, version))
+    if not_modified:
+        return not_modified
+    return await get_yucchins(db, user_id=user_id)
 
 @router.post("/yucchins", response_model=UserYucchinResponse)
+@query_budget(3)
 async def create_new_yucchin(
     yucchin: UserYucchinCreate,
-    current_user: User = Depends(get_current_user),
+    user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
-    return await create_user_yucchin(db, yucchin=yucchin, user_id=current_user.id)
+    try:
+        return await create_user_yucchin(db, yucchin=yucchin, user_id=user_id)
+    except DuplicateError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="このゆっちんは既に獲得しています")
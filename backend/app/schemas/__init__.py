@@ -2,4 +2,4 @@ from .user import UserCreate, UserResponse, UserBase, UserUpdate
 from .token import Token, TokenData
 from .settings import UserSettingsBase, UserSettingsUpdate, UserSettingsResponse
 from .yucchin import UserYucchinBase, UserYucchinCreate, UserYucchinResponse
-from .training import TrainingLogBase, TrainingLogCreate, TrainingLogResponse, TrainingStatsResponse
+from .training import TrainingLogBase, TrainingLogCreate, TrainingLogResponse, TrainingLogPage, TrainingStatsResponse, TrainingLogBatchCreate, TrainingLogBatchResponse
@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from datetime import date
+from typing import List, Optional
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    username: str
+    score: int
+    is_me: bool = False
+
+class LeaderboardResponse(BaseModel):
+    period: str
+    # 期間の初日（週は月曜日）。all のときは 1970-01-01
+    period_start: date
+    exercise_name: str
+    # スコアのあるユーザー数
+    total_users: int
+    entries: List[LeaderboardEntry]
+    # 自分の順位（まだスコアがなければ null）
+    me: Optional[LeaderboardEntry] = None
@@ -0,0 +1,41 @@
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import Annotated, Literal, Optional, Union
+
+# /ws/training でクライアントから送るメッセージ（JSON のテキストフレーム）
+# seq はセッション内で 1 から増やしていく番号。サーバーは処理済みの seq (ack) 以下のメッセージを無視するので、
+# 再接続したときは ack より後のメッセージを送り直せばよい。
+
+# 1 つのメッセージで加算できる回数・秒数の上限
+MAX_EVENT_COUNT = 100
+MAX_EVENT_DURATION = 600
+
+class ProgressEvent(BaseModel):
+    # セット番号 set の回数・秒数を加算する（セットの最初のイベントの時刻が performed_at になる）
+    type: Literal["progress"]
+    seq: int = Field(..., ge=1)
+    set: int = Field(..., ge=0)
+    exercise_name: str = Field(..., min_length=1, max_length=50)
+    count: Optional[int] = Field(None, ge=0, le=MAX_EVENT_COUNT)
+    duration: Optional[int] = Field(None, ge=0, le=MAX_EVENT_DURATION)
+
+class EndSetEvent(BaseModel):
+    # セットを終えて記録する
+    type: Literal["end_set"]
+    seq: int = Field(..., ge=1)
+    set: int = Field(..., ge=0)
+
+class EndSessionEvent(BaseModel):
+    # 記録していないセットをすべて記録して接続を閉じる
+    type: Literal["end_session"]
+    seq: int = Field(..., ge=1)
+
+class PingEvent(BaseModel):
+    # クライアントからの ping には pong を返す。サーバーからの ping への返事は pong
+    type: Literal["ping", "pong"]
+
+LiveTrainingEvent = Annotated[
+    Union[ProgressEvent, EndSetEvent, EndSessionEvent, PingEvent],
+    Field(discriminator="type"),
+]
+
+live_training_event = TypeAdapter(LiveTrainingEvent)
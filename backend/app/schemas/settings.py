@@ -1,6 +1,16 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
 from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+def _validate_timezone(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return value
+    try:
+        ZoneInfo(value)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError("タイムゾーンが不正です (例: Asia/Tokyo)")
+    return value
 
 class UserSettingsBase(BaseModel):
     bgm_volume: int = Field(50, ge=0, le=100)
@@ -8,6 +18,7 @@ class UserSettingsBase(BaseModel):
     yucchin_hidden: bool = False
     yucchin_id: int = 1
     fps: int = Field(20, ge=1, le=60)
+    timezone: str = "Asia/Tokyo"
 
 class UserSettingsUpdate(BaseModel):
     bgm_volume: Optional[int] = Field(None, ge=0, le=100)
@@ -15,6 +26,12 @@ class UserSettingsUpdate(BaseModel):
     yucchin_hidden: Optional[bool] = None
     yucchin_id: Optional[int] = None
     fps: Optional[int] = Field(None, ge=1, le=60)
+    timezone: Optional[str] = Field(None, max_length=64)
+
+    @field_validator("timezone")
+    @classmethod
+    def check_timezone(cls, value: Optional[str]) -> Optional[str]:
+        return _validate_timezone(value)
 
 class UserSettingsResponse(UserSettingsBase):
     id: int
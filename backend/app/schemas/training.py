@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from datetime import datetime
+from pydantic import BaseModel, Field
+from datetime import date, datetime
 from typing import Optional, List, Dict
 
 class TrainingLogBase(BaseModel):
@@ -9,7 +9,24 @@ class TrainingLogBase(BaseModel):
     duration: Optional[int] = None
 
 class TrainingLogCreate(TrainingLogBase):
-    pass
+    # 再送時に二重登録しないためのキー（クライアントで一意に生成する。例: UUID）
+    idempotency_key: Optional[str] = Field(None, min_length=1, max_length=64)
+
+# 一度に登録できるログの上限
+MAX_BATCH_SIZE = 500
+
+class TrainingLogBatchCreate(BaseModel):
+    logs: List[TrainingLogCreate] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class TrainingLogBatchItem(BaseModel):
+    id: int
+    idempotency_key: Optional[str] = None
+    # False のときは以前のリクエストで登録済み（今回は挿入していない）
+    created: bool
+
+class TrainingLogBatchResponse(BaseModel):
+    items: List[TrainingLogBatchItem]
+    unlocked_yucchin_types: List[int] = []
 
 class TrainingLogResponse(TrainingLogBase):
     id: int
@@ -20,6 +37,12 @@ class TrainingLogResponse(TrainingLogBase):
     class Config:
         from_attributes = True
 
+class TrainingLogPage(BaseModel):
+    items: List[TrainingLogResponse]
+    # 次のページ（より古いログ）/ 前のページ（より新しいログ）を取得するためのカーソル。なければ null
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
 class ExerciseStats(BaseModel):
     exercise_name: str
     total_count: int = 0
@@ -27,5 +50,21 @@ class ExerciseStats(BaseModel):
 
 class TrainingStatsResponse(BaseModel):
     streak_days: int
+    longest_streak: int = 0
     today_stats: List[ExerciseStats]
     total_stats: List[ExerciseStats]
+
+class ExerciseSeries(BaseModel):
+    exercise_name: str
+    # バケットごとの合計（TrainingSeriesResponse.start から順に length 個。記録のないバケットは 0）
+    count: List[int]
+    duration: List[int]
+
+class TrainingSeriesResponse(BaseModel):
+    bucket: str
+    timezone: str
+    # 最初のバケットの初日（週は月曜日、月は 1 日）と、最後のバケットの初日
+    start: date
+    end: date
+    length: int
+    series: List[ExerciseSeries]
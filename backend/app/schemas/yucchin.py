@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import Optional
 from datetime import datetime
 
 class UserYucchinBase(BaseModel):
@@ -15,3 +16,13 @@ class UserYucchinResponse(UserYucchinBase):
 
     class Config:
         from_attributes = True
+
+class YucchinCatalogEntryResponse(BaseModel):
+    id: int
+    name: str
+    rarity: str
+    priority: int
+    unlock_kind: str
+    metric: str
+    exercise_name: Optional[str] = None
+    unlock_value: int
@@ -0,0 +1,171 @@
+import argparse
+import asyncio
+import sys
+import os
+import time
+from datetime import datetime, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from sqlalchemy import text
+from bench.common import summarize, write_results, load_results, compare
+from main import app
+from app.database import AsyncSessionLocal, engine
+from app.core.security import pwd_context
+from app.crud.aggregates import AGGREGATES
+
+# API のホットパスの負荷テスト
+#   uv run python bench/api_load.py --history 10,10000,1000000 --concurrency 8 --requests 500
+#   uv run python bench/api_load.py --compare bench/results/api_load-....json   # 前回の結果と比較
+#
+# 履歴の件数ごとに専用のユーザーを作り、generate_series でログを入れて集計テーブルを再構築してから、
+# 各エンドポイントを --concurrency 本の並列で合計 --requests 回呼んでスループットと p50/p95/p99 を測る。
+# 既定ではアプリをプロセス内 (ASGI) で動かす。--base-url を付けると起動中のサーバーに HTTP で送る
+# （その場合も履歴の投入は DATABASE_URL の DB に直接行う）。
+# 結果は bench/results/ に JSON で保存する。ベンチ用のユーザーは --keep を付けない限り最後に削除する。
+
+ENDPOINTS = ("token", "create_log", "stats", "logs", "yucchins")
+BENCH_PASSWORD = "bench-password"
+
+def bench_email(history: int) -> str:
+    return f"bench-load-{history}@example.com"
+
+async def seed_user(history: int) -> int:
+    email = bench_email(history)
+    async with AsyncSessionLocal() as db:
+        user_id = await db.scalar(text("SELECT id FROM users WHERE email = :email"), {"email": email})
+        if user_id is None:
+            user_id = await db.scalar(text(
+                "INSERT INTO users (username, email, hashed_password, is_active) "
+                "VALUES (:username, :email, :hashed, true) RETURNING id"
+            ), {"username": f"bl{history}"[:10], "email": email, "hashed": pwd_context.hash(BENCH_PASSWORD)})
+            await db.execute(text("INSERT INTO user_settings (user_id) VALUES (:uid)"), {"uid": user_id})
+        existing = await db.scalar(text("SELECT count(*) FROM training_logs WHERE user_id = :uid"), {"uid": user_id})
+        if existing < history:
+            # 1 分おきに過去へさかのぼって 3 種目を順番に入れる
+            await db.execute(text(
+                "INSERT INTO training_logs (user_id, performed_at, exercise_name, count, duration) "
+                "SELECT :uid, now() - g * interval '1 minute', "
+                "(ARRAY['pushup', 'squat', 'plank'])[g % 3 + 1], "
+                "CASE WHEN g % 3 = 2 THEN NULL ELSE 10 END, CASE WHEN g % 3 = 2 THEN 30 ELSE NULL END "
+                "FROM generate_series(CAST(:start AS integer), CAST(:stop AS integer)) AS g"
+            ), {"uid": user_id, "start": existing + 1, "stop": history})
+            for _, rebuild, _ in AGGREGATES:
+                await rebuild(db, user_id=user_id)
+        await db.commit()
+    return user_id
+
+async def delete_user(history: int):
+    async with AsyncSessionLocal() as db:
+        user_id = await db.scalar(text("SELECT id FROM users WHERE email = :email"), {"email": bench_email(history)})
+        if user_id is None:
+            return
+        for table in ("training_logs", "user_yucchins", "user_settings"):
+            await db.execute(text(f"DELETE FROM {table} WHERE user_id = :uid"), {"uid": user_id})
+        await db.execute(text("DELETE FROM users WHERE id = :uid"), {"uid": user_id})
+        await db.commit()
+
+def make_request(endpoint: str, history: int):
+    if endpoint == "token":
+        return "POST", "/token", {"json": {"email": bench_email(history), "password": BENCH_PASSWORD}}
+    if endpoint == "create_log":
+        log = {"performed_at": datetime.now(timezone.utc).isoformat(), "exercise_name": "pushup", "count": 10}
+        return "POST", "/training-logs", {"json": log}
+    if endpoint == "stats":
+        return "GET", "/training-logs/stats", {}
+    if endpoint == "logs":
+        return "GET", "/training-logs", {}
+    if endpoint == "yucchins":
+        return "GET", "/yucchins", {}
+    raise ValueError(endpoint)
+
+async def run_endpoint(client: httpx.AsyncClient, headers: dict, endpoint: str, history: int, total: int, concurrency: int):
+    latencies = []
+    errors = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            method, path, kwargs = make_request(endpoint, history)
+            started = time.perf_counter()
+            response = await client.request(method, path, headers=headers, **kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result = summarize(latencies, time.perf_counter() - started)
+    result["errors"] = errors
+    return result
+
+async def run(args, client: httpx.AsyncClient):
+    results = []
+    for history in args.history:
+        seed_started = time.perf_counter()
+        await seed_user(history)
+        print(f"history={history}: seeded in {time.perf_counter() - seed_started:.1f}s", flush=True)
+
+        response = await client.post("/token", json={"email": bench_email(history), "password": BENCH_PASSWORD})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        client.cookies.clear()
+
+        try:
+            for endpoint in args.endpoints:
+                # token は bcrypt が支配的なので回数を抑える
+                total = max(args.concurrency, args.requests // 10) if endpoint == "token" else args.requests
+                await run_endpoint(client, headers, endpoint, history, min(total, args.warmup), args.concurrency)
+                result = await run_endpoint(client, headers, endpoint, history, total, args.concurrency)
+                result.update({"history": history, "endpoint": endpoint, "concurrency": args.concurrency})
+                results.append(result)
+                print(
+                    f"  {endpoint:<11} n={result['n']:<5} {result['throughput_rps']:8.1f} req/s "
+                    f"p50={result['p50_ms']:7.2f}ms p95={result['p95_ms']:7.2f}ms p99={result['p99_ms']:7.2f}ms "
+                    f"errors={result['errors']}",
+                    flush=True,
+                )
+        finally:
+            if not args.keep:
+                await delete_user(history)
+    return results
+
+async def main(args):
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+            results = await run(args, client)
+    else:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+                results = await run(args, client)
+
+    await engine.dispose()
+
+    params = {
+        "history": args.history, "endpoints": args.endpoints, "concurrency": args.concurrency,
+        "requests": args.requests, "target": args.base_url or "asgi",
+    }
+    path = write_results("api_load", params, results, args.output)
+    print(f"results written to {path}")
+    if args.compare:
+        compare(load_results(args.compare), results, ("history", "endpoint"), "p99_ms")
+
+def int_list(value: str):
+    return [int(part) for part in value.split(",") if part]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the API hot paths")
+    parser.add_argument("--history", type=int_list, default=[10, 10000], help="comma separated logs per user, e.g. 10,10000,1000000")
+    parser.add_argument("--endpoints", type=lambda v: v.split(","), default=list(ENDPOINTS), help=f"comma separated subset of {','.join(ENDPOINTS)}")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint (token uses a tenth)")
+    parser.add_argument("--warmup", type=int, default=20, help="requests per endpoint before measuring")
+    parser.add_argument("--base-url", default=None, help="send requests to a running server instead of in-process")
+    parser.add_argument("--output", default=None, help="result JSON path (default: bench/results/)")
+    parser.add_argument("--compare", default=None, help="previous result JSON to compare p99 against")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded users for the next run")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,169 @@
+import argparse
+import asyncio
+import statistics
+import subprocess
+import sys
+import os
+import secrets
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from sqlalchemy import text
+from bench.common import write_results, load_results, compare
+from app.database import AsyncSessionLocal, engine
+from app.crud.user import create_user
+from app.schemas.user import UserCreate
+
+# 起動直後のワーカーが最初のログインに成功するまでの時間
+#   uv run python bench/cold_start.py --runs 5
+#   uv run python bench/cold_start.py --compare bench/results/cold_start-....json
+#
+# uvicorn のワーカーを 1 つ子プロセスで起動し、GET /healthz/ready が 200 を返すまで 10ms ごとに確かめてから
+# POST /token と GET /users/me を送る。起動からログイン成功までの時間 (time_to_token_ms) と、
+# 最初の 1 回と 2 回目以降のレイテンシを STARTUP_WARMUP=false / true それぞれ --runs 回ずつ測って中央値を出す。
+# サーバーが報告した起動の各段階の時間 (/healthz/ready の startup) も結果に入れる。
+# --cold-bytecode を付けると毎回空の PYTHONPYCACHEPREFIX で起動し、.pyc のない新しいコンテナでの起動を再現する
+# （デプロイ時に uv sync --compile-bytecode しておく効果の確認用）。
+# ベンチ用のユーザーは --keep を付けない限り最後に削除する。
+
+BENCH_EMAIL = "bench-cold@example.com"
+BENCH_PASSWORD = "bench-password"
+# 2 回目以降のレイテンシを測る回数
+STEADY_REQUESTS = 5
+# /healthz/ready の本文に起動の各段階を入れてもらうため、子プロセスにだけ渡すトークン
+METRICS_TOKEN = secrets.token_urlsafe(16)
+
+async def seed_user():
+    async with AsyncSessionLocal() as db:
+        user_id = await db.scalar(text("SELECT id FROM users WHERE email = :email"), {"email": BENCH_EMAIL})
+        if user_id is None:
+            # GET /users/me で設定も返すので、既定値の設定と一緒に作る
+            await create_user(db, UserCreate(username="benchcold", email=BENCH_EMAIL, password=BENCH_PASSWORD))
+
+async def delete_user():
+    async with AsyncSessionLocal() as db:
+        user_id = await db.scalar(text("SELECT id FROM users WHERE email = :email"), {"email": BENCH_EMAIL})
+        if user_id is not None:
+            await db.execute(text("DELETE FROM user_settings WHERE user_id = :uid"), {"uid": user_id})
+            await db.execute(text("DELETE FROM users WHERE id = :uid"), {"uid": user_id})
+            await db.commit()
+
+def start_server(port: int, warmup: bool, pycache_prefix: str = None) -> subprocess.Popen:
+    env = {**os.environ, "STARTUP_WARMUP": "true" if warmup else "false", "METRICS_TOKEN": METRICS_TOKEN}
+    if pycache_prefix is not None:
+        env["PYTHONPYCACHEPREFIX"] = pycache_prefix
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env,
+        stderr=subprocess.DEVNULL,
+    )
+
+async def timed(request) -> tuple:
+    started = time.perf_counter()
+    response = await request
+    response.raise_for_status()
+    return response, (time.perf_counter() - started) * 1000
+
+async def run_once(port: int, warmup: bool, timeout: float, cold_bytecode: bool) -> dict:
+    pycache = tempfile.TemporaryDirectory() if cold_bytecode else None
+    started = time.perf_counter()
+    server = start_server(port, warmup, pycache.name if pycache else None)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+            while True:
+                try:
+                    ready = await client.get("/healthz/ready", headers={"Authorization": f"Bearer {METRICS_TOKEN}"})
+                    if ready.status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.perf_counter() - started > timeout:
+                    raise TimeoutError("server did not become ready")
+                await asyncio.sleep(0.01)
+            ready_ms = (time.perf_counter() - started) * 1000
+
+            login = {"email": BENCH_EMAIL, "password": BENCH_PASSWORD}
+            response, first_token_ms = await timed(client.post("/token", json=login))
+            time_to_token_ms = (time.perf_counter() - started) * 1000
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            client.cookies.clear()
+            _, first_me_ms = await timed(client.get("/users/me", headers=headers))
+            steady_token = [(await timed(client.post("/token", json=login)))[1] for _ in range(STEADY_REQUESTS)]
+            client.cookies.clear()
+            steady_me = [(await timed(client.get("/users/me", headers=headers)))[1] for _ in range(STEADY_REQUESTS)]
+    finally:
+        server.terminate()
+        server.wait()
+        if pycache is not None:
+            pycache.cleanup()
+    return {
+        "ready_ms": ready_ms,
+        "time_to_token_ms": time_to_token_ms,
+        "first_token_ms": first_token_ms,
+        "steady_token_ms": statistics.median(steady_token),
+        "first_me_ms": first_me_ms,
+        "steady_me_ms": statistics.median(steady_me),
+        "startup": ready.json()["startup"],
+    }
+
+METRICS = ("ready_ms", "time_to_token_ms", "first_token_ms", "steady_token_ms", "first_me_ms", "steady_me_ms")
+
+def summarize_runs(warmup: bool, cold_bytecode: bool, runs: list) -> dict:
+    result = {"warmup": warmup, "cold_bytecode": cold_bytecode, "runs": len(runs)}
+    for metric in METRICS:
+        result[metric] = statistics.median(run[metric] for run in runs)
+    phases = {}
+    for run in runs:
+        for name, ms in run["startup"]["phases_ms"].items():
+            phases.setdefault(name, []).append(ms)
+    result["server_phases_ms"] = {name: statistics.median(values) for name, values in phases.items()}
+    return result
+
+def print_result(result: dict):
+    print(
+        f"warmup={str(result['warmup']).lower():<5} cold_bytecode={str(result['cold_bytecode']).lower():<5} ready={result['ready_ms']:7.0f}ms "
+        f"first /token at {result['time_to_token_ms']:7.0f}ms "
+        f"/token first={result['first_token_ms']:6.1f}ms then={result['steady_token_ms']:6.1f}ms "
+        f"/users/me first={result['first_me_ms']:5.1f}ms then={result['steady_me_ms']:5.1f}ms",
+        flush=True,
+    )
+    print("  server: " + ", ".join(f"{name}={ms:.0f}ms" for name, ms in result["server_phases_ms"].items()), flush=True)
+
+async def main(args):
+    await seed_user()
+    results = []
+    try:
+        for warmup in args.warmup:
+            runs = [await run_once(args.port, warmup, args.timeout, args.cold_bytecode) for _ in range(args.runs)]
+            result = summarize_runs(warmup, args.cold_bytecode, runs)
+            results.append(result)
+            print_result(result)
+    finally:
+        if not args.keep:
+            await delete_user()
+        await engine.dispose()
+
+    params = {"runs": args.runs, "warmup": args.warmup, "cold_bytecode": args.cold_bytecode}
+    path = write_results("cold_start", params, results, args.output)
+    print(f"results written to {path}")
+    if args.compare:
+        compare(load_results(args.compare), results, ("warmup", "cold_bytecode"), "time_to_token_ms")
+
+def bool_list(value: str):
+    return [part.strip().lower() == "true" for part in value.split(",") if part]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure time from process start to the first successful /token")
+    parser.add_argument("--runs", type=int, default=5, help="server starts per case (the median is reported)")
+    parser.add_argument("--warmup", type=bool_list, default=[False, True], help="comma separated STARTUP_WARMUP values to compare")
+    parser.add_argument("--cold-bytecode", action="store_true", help="start every server without compiled bytecode")
+    parser.add_argument("--port", type=int, default=8767, help="port for the server started by the benchmark")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for a server to become ready")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None, help="previous result JSON to compare time_to_token_ms against")
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark user for the next run")
+    asyncio.run(main(parser.parse_args()))
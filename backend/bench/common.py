@@ -0,0 +1,76 @@
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+from typing import List, Sequence
+
+# ベンチマークの集計と結果ファイルの書き出し（bench/ 配下のスクリプトで共用）
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+def percentile(values: Sequence[float], p: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(latencies_ms: List[float], elapsed_seconds: float) -> dict:
+    return {
+        "n": len(latencies_ms),
+        "throughput_rps": len(latencies_ms) / elapsed_seconds if elapsed_seconds > 0 else 0.0,
+        "p50_ms": percentile(latencies_ms, 50),
+        "p95_ms": percentile(latencies_ms, 95),
+        "p99_ms": percentile(latencies_ms, 99),
+        "max_ms": max(latencies_ms, default=0.0),
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def write_results(name: str, params: dict, results: List[dict], output: str = None) -> str:
+    # コミットごとに比較できるよう、パラメータと実行環境も一緒に JSON で保存する
+    commit = git_commit()
+    started_at = datetime.now(timezone.utc)
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{started_at:%Y%m%dT%H%M%S}-{commit}.json")
+    document = {
+        "benchmark": name,
+        "commit": commit,
+        "created_at": started_at.isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "params": params,
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(document, f, indent=2)
+    return output
+
+def load_results(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+def compare(previous: dict, results: List[dict], key_fields: Sequence[str], metric: str):
+    # 前回の結果と同じキーの行を突き合わせて変化率を表示する
+    def key(row):
+        return tuple(row.get(field) for field in key_fields)
+    before = {key(row): row for row in previous.get("results", [])}
+    print(f"compared with {previous.get('commit')} ({previous.get('created_at')}), metric: {metric}")
+    for row in results:
+        old = before.get(key(row))
+        if old is None or not old.get(metric):
+            continue
+        change = (row[metric] - old[metric]) / old[metric] * 100
+        label = " ".join(str(part) for part in key(row))
+        print(f"  {label:<40} {old[metric]:10.2f} -> {row[metric]:10.2f} ({change:+.1f}%)")
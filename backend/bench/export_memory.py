@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app.database import AsyncSessionLocal, engine
+from app.core.export import format_rows
+from app.crud.training import EXPORT_COLUMNS, stream_training_log_rows
+
+# エクスポート中の RSS が件数に比例して増えないことを確認するベンチマーク
+#   uv run python bench/export_memory.py --rows 2000000 --format csv
+# 専用のユーザーに --rows 件のログを generate_series で入れ、書き出しながら RSS を記録する。
+# 終わったらそのユーザーとログは削除する（--keep で残す）。
+
+BENCH_EMAIL = "bench-export@example.invalid"
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+async def seed(rows: int) -> int:
+    async with AsyncSessionLocal() as db:
+        user_id = await db.scalar(text("SELECT id FROM users WHERE email = :email"), {"email": BENCH_EMAIL})
+        if user_id is None:
+            user_id = await db.scalar(text(
+                "INSERT INTO users (username, email, hashed_password, is_active) "
+                "VALUES ('benchexp', :email, 'x', true) RETURNING id"
+            ), {"email": BENCH_EMAIL})
+        existing = await db.scalar(text("SELECT count(*) FROM training_logs WHERE user_id = :uid"), {"uid": user_id})
+        if existing < rows:
+            await db.execute(text(
+                "INSERT INTO training_logs (user_id, performed_at, exercise_name, count, duration) "
+                "SELECT :uid, now() - g * interval '1 minute', "
+                "(ARRAY['pushup', 'squat', 'plank'])[g % 3 + 1], "
+                "CASE WHEN g % 3 = 2 THEN NULL ELSE 10 END, CASE WHEN g % 3 = 2 THEN 30 ELSE NULL END "
+                "FROM generate_series(1, :n) g"
+            ), {"uid": user_id, "n": rows - existing})
+        await db.commit()
+        return user_id
+
+async def cleanup(user_id: int):
+    async with AsyncSessionLocal() as db:
+        await db.execute(text("DELETE FROM training_logs WHERE user_id = :uid"), {"uid": user_id})
+        await db.execute(text("DELETE FROM users WHERE id = :uid"), {"uid": user_id})
+        await db.commit()
+
+async def main(args):
+    user_id = await seed(args.rows)
+    samples = []
+    exported = 0
+    start = time.perf_counter()
+    try:
+        async with AsyncSessionLocal() as db:
+            rows = stream_training_log_rows(db, user_id=user_id, batch_size=args.batch_size)
+            async for chunk in format_rows(rows, EXPORT_COLUMNS, args.format):
+                exported += chunk.count("\n")
+                if not samples or exported - samples[-1][0] >= args.rows // 20:
+                    samples.append((exported, rss_mb()))
+        elapsed = time.perf_counter() - start
+    finally:
+        if not args.keep:
+            await cleanup(user_id)
+        await engine.dispose()
+
+    print(f"exported ~{exported} lines as {args.format} in {elapsed:.1f}s ({exported / elapsed:,.0f} rows/s)")
+    print(f"{'rows':>12}  {'rss (MB)':>9}")
+    for count, rss in samples:
+        print(f"{count:>12}  {rss:>9.1f}")
+    growth = samples[-1][1] - samples[0][1]
+    print(f"RSS growth from first to last sample: {growth:+.1f} MB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure RSS while streaming a large training_logs export")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark user and its rows")
+    asyncio.run(main(parser.parse_args()))
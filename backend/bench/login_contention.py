@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from sqlalchemy import text
+from bench.common import percentile
+from main import app
+from app.database import AsyncSessionLocal
+
+# /token への同時ログインが続いている間も、同じプロセスの /training-logs/stats の
+# レイテンシが悪化しないことを確認するベンチマーク
+#   uv run python bench/login_contention.py --logins 16 --seconds 10
+# アプリをプロセス内 (ASGI) で動かすので、bcrypt がイベントループを止めていれば
+# stats の p99 がログイン負荷ありのときだけ bcrypt 1 回分以上跳ね上がる。
+# 終わったらベンチ用のユーザーは削除する。
+
+BENCH_EMAIL = "bench-login@example.com"
+BENCH_PASSWORD = "bench-password"
+
+async def measure_stats(client: httpx.AsyncClient, headers: dict, seconds: float):
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        r = await client.get("/training-logs/stats", headers=headers)
+        r.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+async def login_loop(client: httpx.AsyncClient, stop: asyncio.Event, results: dict):
+    while not stop.is_set():
+        r = await client.post("/token", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+        results[r.status_code] = results.get(r.status_code, 0) + 1
+        if r.status_code == 503:
+            await asyncio.sleep(0.05)
+
+def report(label: str, latencies):
+    print(
+        f"{label:<16} n={len(latencies):<6} "
+        f"p50={percentile(latencies, 50):7.2f}ms p95={percentile(latencies, 95):7.2f}ms "
+        f"p99={percentile(latencies, 99):7.2f}ms max={max(latencies, default=0):7.2f}ms"
+    )
+
+async def main(args):
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.post("/signup", json={"username": "benchlogin", "email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+            r = await client.post("/token", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+            r.raise_for_status()
+            headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+            try:
+                baseline = await measure_stats(client, headers, args.seconds)
+
+                stop = asyncio.Event()
+                statuses = {}
+                logins = [asyncio.create_task(login_loop(client, stop, statuses)) for _ in range(args.logins)]
+                await asyncio.sleep(0.5)
+                loaded = await measure_stats(client, headers, args.seconds)
+                stop.set()
+                await asyncio.gather(*logins)
+
+                report("stats (idle)", baseline)
+                report("stats (logins)", loaded)
+                print("login responses: " + ", ".join(f"{code}={n}" for code, n in sorted(statuses.items())))
+            finally:
+                async with AsyncSessionLocal() as db:
+                    user_id = await db.scalar(text("SELECT id FROM users WHERE email = :email"), {"email": BENCH_EMAIL})
+                    await db.execute(text("DELETE FROM user_settings WHERE user_id = :uid"), {"uid": user_id})
+                    await db.execute(text("DELETE FROM users WHERE id = :uid"), {"uid": user_id})
+                    await db.commit()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure stats latency under concurrent login load")
+    parser.add_argument("--logins", type=int, default=16, help="number of concurrent login loops")
+    parser.add_argument("--seconds", type=float, default=10, help="measurement window per phase")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,98 @@
+import argparse
+import random
+import sys
+import os
+import timeit
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.common import write_results, load_results, compare
+from app.crud.aggregates import compute_streak_state
+from app.core.yucchin_rules import CatalogEntry, UnlockRules
+from app.core.leaderboard import Board
+
+# DB を使わない純粋な Python 部分のマイクロベンチマーク
+#   uv run python bench/micro.py
+#   uv run python bench/micro.py --compare bench/results/micro-....json
+# 連続日数の計算 (compute_streak_state) と、ゆっちん獲得候補の選定 (UnlockRules.select)。
+# 獲得候補の選定はゆっちんの数を増やしてもコストがほぼ変わらないことを確認する。
+# ランキング (Board) は参加ユーザー数を変えて、上位 N 人・自分の順位・スコア更新のコストを見る。
+
+def active_days(n: int, gap_every: int = 7):
+    # 約 gap_every 日に 1 日休む活動日の列
+    start = date(2020, 1, 1)
+    return [start + timedelta(days=i) for i in range(n) if i % gap_every != gap_every - 1]
+
+def catalog(size: int):
+    # 今のゆっちん一覧と同じ構成（Normal 10 / Rare 5 / SR 3 / UR / Secret）に、
+    # 累計のしきい値で獲得するゆっちんを size 体になるまで足したもの
+    entries = [CatalogEntry(i, f"n{i}", "normal", 1, "interval", "total", None, 30) for i in range(1, 11)]
+    entries += [CatalogEntry(i, f"r{i}", "rare", 2, "interval", "total", None, 100) for i in range(101, 106)]
+    entries += [
+        CatalogEntry(201, "sr-squat", "sr", 3, "threshold", "count", "squat", 300),
+        CatalogEntry(202, "sr-pushup", "sr", 3, "threshold", "count", "pushup", 300),
+        CatalogEntry(203, "sr-plank", "sr", 3, "threshold", "duration", "plank", 300),
+        CatalogEntry(301, "ur", "ur", 4, "threshold", "total", None, 1000),
+        CatalogEntry(401, "secret", "secret", 5, "threshold", "total", None, 3000),
+    ]
+    for i in range(size - len(entries)):
+        entries.append(CatalogEntry(1000 + i, f"extra{i}", "sr", 3, "threshold", "total", None, 5000 + 50 * i))
+    return entries
+
+def unlock_case(name: str):
+    exercises = {"pushup": (250, 0), "squat": (280, 0), "plank": (0, 290)}
+    if name == "single_log":
+        # 1 回の記録で 30 の倍数だけをまたぐ、いちばん多いケース
+        return set(), exercises, {**exercises, "pushup": (260, 0)}
+    if name == "batch_crossings":
+        # 一括登録で Rare / Normal / SR / UR をまとめてまたぐケース
+        return set(range(1, 6)), exercises, {"pushup": (400, 0), "squat": (400, 0), "plank": (0, 400)}
+    if name == "all_owned":
+        owned = set(range(1, 11)) | set(range(101, 106)) | {201, 202, 203, 301, 401}
+        return owned, exercises, {"pushup": (1000, 0), "squat": (1000, 0), "plank": (0, 1100)}
+    raise ValueError(name)
+
+def bench(label: str, func, number: int, repeat: int) -> dict:
+    timings = timeit.repeat(func, number=number, repeat=repeat)
+    best = min(timings) / number
+    print(f"{label:<44} {best * 1e6:10.2f} us/op")
+    return {"case": label, "us_per_op": best * 1e6, "number": number, "repeat": repeat}
+
+def main(args):
+    results = []
+    for n in (30, 365, 3650):
+        days = active_days(n)
+        results.append(bench(f"compute_streak_state days={n}", lambda: compute_streak_state(days), args.number, args.repeat))
+
+    for size in (20, 500):
+        rules = UnlockRules(catalog(size))
+        for name in ("single_log", "batch_crossings", "all_owned"):
+            case = unlock_case(name)
+            rng = random.Random(0)
+            results.append(bench(f"unlock select catalog={size} {name}", lambda: rules.select(*case, rng=rng), args.number, args.repeat))
+
+    for users in (1_000, 100_000):
+        rng = random.Random(0)
+        board = Board({uid: rng.randint(0, 100_000) for uid in range(users)})
+        middle = users // 2
+        results.append(bench(f"leaderboard users={users} top10", lambda: board.top(10), args.number, args.repeat))
+        results.append(bench(f"leaderboard users={users} rank", lambda: board.rank(middle), args.number, args.repeat))
+        results.append(bench(
+            f"leaderboard users={users} update",
+            lambda: board.update(rng.randrange(users), board.scores.get(middle, 0) + rng.randint(1, 50)),
+            args.number, args.repeat,
+        ))
+
+    path = write_results("micro", {"number": args.number, "repeat": args.repeat}, results, args.output)
+    print(f"results written to {path}")
+    if args.compare:
+        compare(load_results(args.compare), results, ("case",), "us_per_op")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks for pure-Python hot paths")
+    parser.add_argument("--number", type=int, default=2000, help="calls per timing")
+    parser.add_argument("--repeat", type=int, default=5, help="timings per case (best is reported)")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None)
+    main(parser.parse_args())
@@ -0,0 +1,295 @@
+import argparse
+import asyncio
+import json
+import random
+import resource
+import subprocess
+import sys
+import os
+import time
+import uuid
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import websockets
+from sqlalchemy import text
+from bench.common import summarize, percentile, write_results, load_results, compare
+from app.database import AsyncSessionLocal, engine
+from app.core.security import create_access_token
+
+# /ws/training の同時接続数のキャパシティテスト
+#   uv run python bench/ws_sessions.py --sessions 1000,3000,5000 --seconds 30
+#   uv run python bench/ws_sessions.py --url ws://localhost:8000/ws/training --sessions 2000   # 起動中のサーバー
+#
+# 既定では uvicorn のワーカーを 1 つ子プロセスで起動し、--sessions 本の接続を張る。
+# 各接続は --rep-interval 秒ごとに 1 回分の progress を送り、--reps-per-set 回ごとに end_set で記録する。
+# 接続にかかった時間、ping → pong の往復時間、end_set → saved と end_session → closed の時間と、
+# サーバーの RSS（子プロセスのときだけ）を測る。
+# クライアントも 1 プロセスで全接続を動かすので、数千本を超えるときはクライアント側の CPU が先に詰まっていないか
+# （loop_lag_ms）も確認する。ファイルディスクリプタの上限はソフトリミットをハードリミットまで上げる。
+# ベンチ用のユーザー (--users 人) は --keep を付けない限り最後に削除する。
+
+BENCH_EMAIL_PREFIX = "bench-ws"
+EXERCISES = ("pushup", "squat")
+
+def bench_email(index: int) -> str:
+    return f"{BENCH_EMAIL_PREFIX}-{index}@example.com"
+
+async def seed_users(n: int) -> list:
+    # ログインは測らないので、パスワードは使えない値にしてトークンを直接作る
+    tokens = []
+    async with AsyncSessionLocal() as db:
+        for index in range(n):
+            email = bench_email(index)
+            row = (await db.execute(text("SELECT id, token_version FROM users WHERE email = :email"), {"email": email})).first()
+            if row is None:
+                user_id = await db.scalar(text(
+                    "INSERT INTO users (username, email, hashed_password, is_active) "
+                    "VALUES (:username, :email, '!', true) RETURNING id"
+                ), {"username": f"bw{index}"[:10], "email": email})
+                await db.execute(text("INSERT INTO user_settings (user_id) VALUES (:uid)"), {"uid": user_id})
+                version = 0
+            else:
+                user_id, version = row
+            tokens.append(create_access_token({"sub": email, "uid": user_id, "ver": version}))
+        await db.commit()
+    return tokens
+
+async def delete_users():
+    pattern = f"{BENCH_EMAIL_PREFIX}-%@example.com"
+    user_ids = "SELECT id FROM users WHERE email LIKE :pattern"
+    async with AsyncSessionLocal() as db:
+        for table in ("training_logs", "user_yucchins", "user_settings"):
+            await db.execute(text(f"DELETE FROM {table} WHERE user_id IN ({user_ids})"), {"pattern": pattern})
+        await db.execute(text("DELETE FROM users WHERE email LIKE :pattern"), {"pattern": pattern})
+        await db.commit()
+
+def rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+def start_server(port: int, sessions: int) -> subprocess.Popen:
+    env = {**os.environ, "WS_MAX_SESSIONS": str(sessions * 2)}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env,
+    )
+    return process
+
+async def wait_for_server(url: str, token: str, timeout: float = 30):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            async with websockets.connect(f"{url}?session_id={uuid.uuid4().hex}", additional_headers={"Authorization": f"Bearer {token}"}) as ws:
+                await ws.recv()
+                await ws.send(json.dumps({"type": "end_session", "seq": 1}))
+                return
+        except (OSError, websockets.InvalidStatus):
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+class Stats:
+    def __init__(self):
+        self.connect_ms = []
+        self.pong_ms = []
+        self.saved_ms = []
+        self.closed_ms = []
+        self.connect_errors = 0
+        self.dropped = 0
+        self.events = 0
+        self.unlocked = 0
+
+async def session(url: str, token: str, args, stats: Stats, connected: asyncio.Semaphore, all_connected: asyncio.Event, deadline_holder: list):
+    rng = random.Random()
+    headers = {"Authorization": f"Bearer {token}"}
+    started = time.perf_counter()
+    try:
+        async with connected:
+            ws = await websockets.connect(f"{url}?session_id={uuid.uuid4().hex}", additional_headers=headers, open_timeout=60)
+            await ws.recv()
+    except Exception:
+        stats.connect_errors += 1
+        return
+    stats.connect_ms.append((time.perf_counter() - started) * 1000)
+
+    waiting = {}
+    seq = 0
+
+    async def reader():
+        async for message in ws:
+            event = json.loads(message)
+            if event["type"] == "ping":
+                await ws.send('{"type":"pong"}')
+            elif event["type"] in ("pong", "saved"):
+                key = event["type"] if event["type"] == "pong" else ("saved", event["set"])
+                sent = waiting.pop(key, None)
+                if sent is not None:
+                    (stats.pong_ms if event["type"] == "pong" else stats.saved_ms).append((time.perf_counter() - sent) * 1000)
+            elif event["type"] == "unlocked":
+                stats.unlocked += 1
+            elif event["type"] == "closed":
+                stats.closed_ms.append((time.perf_counter() - waiting.pop("closed")) * 1000)
+
+    reading = asyncio.create_task(reader())
+    try:
+        await all_connected.wait()
+        # 全接続が同じ瞬間に送らないよう、最初の送信をずらす
+        await asyncio.sleep(rng.uniform(0, args.rep_interval))
+        exercise = rng.choice(EXERCISES)
+        set_no = reps = 0
+        while time.perf_counter() < deadline_holder[0]:
+            seq += 1
+            await ws.send(json.dumps({"type": "progress", "seq": seq, "set": set_no, "exercise_name": exercise, "count": 1}))
+            stats.events += 1
+            reps += 1
+            if reps == args.reps_per_set:
+                seq += 1
+                waiting[("saved", set_no)] = time.perf_counter()
+                await ws.send(json.dumps({"type": "end_set", "seq": seq, "set": set_no}))
+                set_no += 1
+                reps = 0
+            elif "pong" not in waiting and rng.random() < 0.1:
+                waiting["pong"] = time.perf_counter()
+                await ws.send('{"type":"ping"}')
+            await asyncio.sleep(args.rep_interval)
+        seq += 1
+        waiting["closed"] = time.perf_counter()
+        await ws.send(json.dumps({"type": "end_session", "seq": seq}))
+        await asyncio.wait_for(reading, args.drain_seconds)
+    except (websockets.ConnectionClosedError, asyncio.TimeoutError):
+        stats.dropped += 1
+    finally:
+        reading.cancel()
+        await ws.close()
+
+async def measure_loop_lag(stop: asyncio.Event, lags: list):
+    # クライアント側のイベントループの遅れ（大きければ測定値はクライアントの限界）
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.1)
+        lags.append((time.perf_counter() - started - 0.1) * 1000)
+
+async def run_case(url: str, tokens: list, sessions: int, args, server_pid) -> dict:
+    stats = Stats()
+    all_connected = asyncio.Event()
+    deadline_holder = [0.0]
+    baseline_rss = rss_bytes(server_pid) if server_pid else None
+
+    connecting = asyncio.Semaphore(args.connect_concurrency)
+    started = time.perf_counter()
+    tasks = [
+        asyncio.create_task(session(url, tokens[i % len(tokens)], args, stats, connecting, all_connected, deadline_holder))
+        for i in range(sessions)
+    ]
+    while len(stats.connect_ms) + stats.connect_errors < sessions:
+        await asyncio.sleep(0.05)
+    connect_seconds = time.perf_counter() - started
+    connected_rss = rss_bytes(server_pid) if server_pid else None
+
+    lags = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lags))
+    deadline_holder[0] = time.perf_counter() + args.seconds
+    all_connected.set()
+    await asyncio.gather(*tasks)
+    stop.set()
+    await lag_task
+
+    result = {
+        "sessions": sessions,
+        "connected": len(stats.connect_ms),
+        "connect_errors": stats.connect_errors,
+        "dropped": stats.dropped,
+        "connect_seconds": connect_seconds,
+        "connect_p99_ms": percentile(stats.connect_ms, 99),
+        "events_per_second": stats.events / args.seconds,
+        "sets_saved": len(stats.saved_ms),
+        "unlocked_messages": stats.unlocked,
+        "pong": summarize(stats.pong_ms, args.seconds),
+        "saved": summarize(stats.saved_ms, args.seconds),
+        "saved_p99_ms": percentile(stats.saved_ms, 99),
+        # 全接続の end_session がまとめて届いたときに、残りのセットを記録し終わるまで
+        "closed": summarize(stats.closed_ms, args.seconds),
+        "loop_lag_p99_ms": percentile(lags, 99),
+    }
+    if server_pid:
+        result["server_rss_bytes"] = connected_rss
+        result["server_bytes_per_session"] = (connected_rss - baseline_rss) / max(1, len(stats.connect_ms))
+    return result
+
+def print_result(result: dict):
+    line = (
+        f"sessions={result['sessions']:<6} connected={result['connected']:<6} errors={result['connect_errors']} "
+        f"dropped={result['dropped']} events/s={result['events_per_second']:8.1f} "
+        f"pong p50={result['pong']['p50_ms']:6.1f}ms p99={result['pong']['p99_ms']:7.1f}ms "
+        f"saved p50={result['saved']['p50_ms']:6.1f}ms p99={result['saved']['p99_ms']:7.1f}ms "
+        f"closed p99={result['closed']['p99_ms']:7.1f}ms "
+        f"client lag p99={result['loop_lag_p99_ms']:.1f}ms"
+    )
+    if "server_rss_bytes" in result:
+        line += f" rss={result['server_rss_bytes'] / 2**20:.0f}MiB ({result['server_bytes_per_session'] / 1024:.1f}KiB/session)"
+    print(line, flush=True)
+
+async def main(args):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    if max(args.sessions) + 100 > hard:
+        print(f"warning: file descriptor limit {hard} is below the number of sessions", flush=True)
+
+    tokens = await seed_users(args.users)
+    results = []
+    try:
+        for sessions in args.sessions:
+            server = None
+            url = args.url
+            if url is None:
+                # ケースごとにサーバーを起動し直して、前のケースのメモリを持ち越さない
+                server = start_server(args.port, sessions)
+                url = f"ws://127.0.0.1:{args.port}/ws/training"
+            try:
+                await wait_for_server(url, tokens[0])
+                result = await run_case(url, tokens, sessions, args, server.pid if server else None)
+            finally:
+                if server is not None:
+                    server.terminate()
+                    server.wait()
+            result.update({"rep_interval": args.rep_interval, "reps_per_set": args.reps_per_set})
+            results.append(result)
+            print_result(result)
+    finally:
+        if not args.keep:
+            await delete_users()
+        await engine.dispose()
+
+    params = {
+        "sessions": args.sessions, "users": args.users, "seconds": args.seconds,
+        "rep_interval": args.rep_interval, "reps_per_set": args.reps_per_set, "target": args.url or "subprocess",
+    }
+    path = write_results("ws_sessions", params, results, args.output)
+    print(f"results written to {path}")
+    if args.compare:
+        compare(load_results(args.compare), results, ("sessions",), "saved_p99_ms")
+
+def int_list(value: str):
+    return [int(part) for part in value.split(",") if part]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Capacity test for concurrent /ws/training sessions")
+    parser.add_argument("--sessions", type=int_list, default=[1000, 3000], help="comma separated numbers of concurrent sessions")
+    parser.add_argument("--users", type=int, default=100, help="sessions are spread over this many users")
+    parser.add_argument("--seconds", type=float, default=30, help="how long every session keeps sending after all are connected")
+    parser.add_argument("--rep-interval", type=float, default=2.0, help="seconds between progress events per session")
+    parser.add_argument("--reps-per-set", type=int, default=10)
+    parser.add_argument("--drain-seconds", type=float, default=120, help="how long a session waits for its last sets to be saved")
+    parser.add_argument("--connect-concurrency", type=int, default=200, help="handshakes in flight at once")
+    parser.add_argument("--url", default=None, help="ws:// URL of a running server (default: start one worker)")
+    parser.add_argument("--port", type=int, default=8766, help="port for the server started by the benchmark")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None, help="previous result JSON to compare saved p99 against")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded users for the next run")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,114 @@
+import asyncio
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from sqlalchemy import text
+from main import app
+from app.database import AsyncSessionLocal, engine
+from app.core.principal import principal_cache, token_version_cache
+from app.core.conditional import data_version_cache
+from app.core.stats_cache import get_stats_cache
+from app.core.leaderboard import clear_boards
+from app.core.query_budget import count_queries, get_query_budget, format_violation
+
+# ルーターに宣言したクエリバジェット (@query_budget) を超えていないか、
+# 実際にアプリを (ASGI で) 呼び出して確認するコマンド
+#   uv run python check_query_budgets.py   # 超過があれば発行した SQL を表示して終了コード 1
+#
+# キャッシュが効いていない最悪の場合で数えるため、各リクエストの前に認証情報のキャッシュを空にする。
+# 確認用のユーザーは最後に削除する。
+
+CHECK_EMAIL = "budgetcheck@example.com"
+CHECK_PASSWORD = "budget-check"
+
+def scenario():
+    # (メソッド, パス, リクエストの引数)。バジェットを宣言したルートはすべてここで呼ぶ
+    log = {"performed_at": "2026-01-01T10:00:00Z", "exercise_name": "pushup", "count": 10}
+    return [
+        ("POST", "/signup", {"json": {"username": "budgetchk", "email": CHECK_EMAIL, "password": CHECK_PASSWORD}}),
+        ("POST", "/token", {"json": {"email": CHECK_EMAIL, "password": CHECK_PASSWORD}}),
+        ("GET", "/users/me", {}),
+        ("GET", "/settings/me", {}),
+        ("PUT", "/settings/me", {"json": {"bgm_volume": 40}}),
+        ("POST", "/training-logs", {"json": log}),
+        ("POST", "/training-logs/batch", {"json": {"logs": [log, {**log, "exercise_name": "squat"}]}}),
+        # 過去の日の記録（連続日数を数え直す経路）。バッチは何日分でもクエリ数が変わらないことを確かめる
+        ("POST", "/training-logs", {"json": {**log, "performed_at": "2025-12-31T10:00:00Z"}}),
+        ("POST", "/training-logs/batch", {"json": {"logs": [
+            {**log, "performed_at": f"2025-12-{day:02d}T10:00:00Z", "exercise_name": name}
+            for day in (1, 2, 3, 5, 8, 13, 21, 29, 30) for name in ("pushup", "squat")
+        ]}}),
+        ("GET", "/training-logs", {}),
+        ("GET", "/training-logs/stats", {}),
+        ("GET", "/training-logs/series", {"params": {"bucket": "week"}}),
+        ("GET", "/yucchins/catalog", {}),
+        ("GET", "/leaderboards/pushup", {"params": {"period": "week"}}),
+        ("GET", "/yucchins", {}),
+        ("POST", "/yucchins", {"json": {"yucchin_type": 999, "yucchin_name": "budget"}}),
+        ("PUT", "/users/me", {"json": {"username": "budgetch2"}}),
+    ]
+
+async def cleanup():
+    async with AsyncSessionLocal() as db:
+        user_id = await db.scalar(text("SELECT id FROM users WHERE email = :email"), {"email": CHECK_EMAIL})
+        if user_id is not None:
+            for table in ("training_logs", "user_yucchins", "user_settings"):
+                await db.execute(text(f"DELETE FROM {table} WHERE user_id = :uid"), {"uid": user_id})
+            await db.execute(text("DELETE FROM users WHERE id = :uid"), {"uid": user_id})
+            await db.commit()
+
+def find_route(method: str, path: str):
+    # パスパラメータ付きのルートにも当たるよう、ルーティングと同じ正規表現で探す
+    for route in app.routes:
+        path_regex = getattr(route, "path_regex", None)
+        if path_regex is not None and path_regex.match(path) and method in getattr(route, "methods", ()):
+            return route
+    return None
+
+async def main():
+    failures = 0
+    checked = set()
+    try:
+        await cleanup()
+        transport = httpx.ASGITransport(app=app)
+        async with app.router.lifespan_context(app), httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+            for method, path, kwargs in scenario():
+                route = find_route(method, path)
+                budget = get_query_budget(route)
+                principal_cache.clear()
+                token_version_cache.clear()
+                data_version_cache.clear()
+                get_stats_cache().clear()
+                clear_boards()
+                with count_queries() as recorder:
+                    response = await client.request(method, path, **kwargs)
+                if response.status_code >= 400:
+                    failures += 1
+                    print(f"[FAIL] {method} {path}: HTTP {response.status_code} {response.text[:200]}")
+                    continue
+                if budget is None:
+                    print(f"[skip] {method} {path}: {recorder.count} queries (no budget declared)")
+                    continue
+                checked.add(id(route))
+                if recorder.count > budget:
+                    failures += 1
+                    print("[FAIL] " + format_violation(method, path, budget, recorder))
+                else:
+                    print(f"[ok]   {method} {path}: {recorder.count}/{budget} queries")
+
+        for route in app.routes:
+            if get_query_budget(route) is not None and id(route) not in checked:
+                failures += 1
+                print(f"[FAIL] {', '.join(sorted(route.methods))} {route.path}: budget declared but not exercised")
+    finally:
+        await cleanup()
+        await engine.dispose()
+
+    print(f"{failures} query budget violation(s)")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
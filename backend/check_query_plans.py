@@ -0,0 +1,119 @@
+import asyncio
+import re
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import engine
+from app.models.user import User
+from app.models.settings import UserSettings
+from app.crud.user import get_user_by_email, get_data_version
+from app.crud.leaderboard import load_board, has_leaderboard
+from app.core.conditional import invalidate_data_version
+from app.core.leaderboard import current_board_key
+from app.crud.settings import get_settings_by_user_id
+from app.crud.yucchin import get_yucchins, load_unlock_rules
+from app.crud.training import get_training_logs, get_training_stats, create_training_log, encode_log_cursor, series_range, get_training_series
+from app.schemas.training import TrainingLogCreate
+
+# ホットパスのクエリを実際に crud 経由で発行し、その SQL を EXPLAIN して
+# インデックスが使われずに Seq Scan に落ちていないかを確認するコマンド
+#   uv run python check_query_plans.py   # 退行があれば終了コード 1
+#
+# 全体を 1 トランザクションで実行して最後にロールバックするので、DB にデータは残らない。
+# テーブルが小さいとプランナーはインデックスがあっても Seq Scan を選ぶため、
+# enable_seqscan = off にして「使えるインデックスがない」場合だけ Seq Scan が残るようにしている。
+
+SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+def hot_paths(user: User):
+    log = TrainingLogCreate(
+        performed_at=datetime.now(timezone.utc) - timedelta(days=3),
+        exercise_name="pushup",
+        count=10,
+    )
+    # 上のログより前の日: 連続日数を数え直す経路
+    backdated = log.model_copy(update={"performed_at": log.performed_at - timedelta(days=2)})
+    heatmap = series_range("day", datetime.now(timezone.utc).date(), None, None)
+    cursor = encode_log_cursor(SimpleNamespace(performed_at=datetime.now(timezone.utc), id=2**31 - 1))
+    return [
+        ("get_user_by_email", lambda db: get_user_by_email(db, email=user.email)),
+        ("get_settings_by_user_id", lambda db: get_settings_by_user_id(db, user.id)),
+        ("get_yucchins", lambda db: get_yucchins(db, user_id=user.id)),
+        ("get_training_logs", lambda db: get_training_logs(db, user_id=user.id)),
+        ("get_training_logs (before cursor)", lambda db: get_training_logs(db, user_id=user.id, before=cursor, exercise_name="pushup")),
+        ("get_training_logs (after cursor)", lambda db: get_training_logs(db, user_id=user.id, after=cursor)),
+        ("get_training_stats", lambda db: get_training_stats(db, user_id=user.id)),
+        ("get_training_series (1 year, day)", lambda db: get_training_series(db, user.id, "day", *heatmap, tz=ZoneInfo("UTC"))),
+        ("create_training_log", lambda db: create_training_log(db, log=log, user_id=user.id)),
+        ("create_training_log (backdated)", lambda db: create_training_log(db, log=backdated, user_id=user.id)),
+        ("get_data_version", lambda db: (invalidate_data_version(user.id), get_data_version(db, user.id))[1]),
+        ("load_board", lambda db: load_board(db, current_board_key("week", "pushup"))),
+        ("has_leaderboard", lambda db: has_leaderboard(db, "pushup")),
+    ]
+
+async def main():
+    captured = []
+    capturing = False
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if capturing and not executemany:
+            captured.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    failures = 0
+    try:
+        async with engine.connect() as conn:
+            trans = await conn.begin()
+            await conn.execute(text("SET LOCAL enable_seqscan = off"))
+            db = AsyncSession(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False)
+
+            user = User(username="plancheck", email="plancheck@example.invalid", hashed_password="x", is_active=True)
+            db.add(user)
+            await db.flush()
+            db.add(UserSettings(user_id=user.id))
+            await db.flush()
+            # ゆっちんの獲得条件はアプリと同じく事前に読み込んでおく（全件読み込みはホットパスではない）
+            await load_unlock_rules(db)
+
+            for name, run in hot_paths(user):
+                captured.clear()
+                capturing = True
+                try:
+                    await run(db)
+                finally:
+                    capturing = False
+
+                path_failures = 0
+                for statement, parameters in captured:
+                    if not statement.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")):
+                        continue
+                    plan = await conn.exec_driver_sql("EXPLAIN " + statement, parameters)
+                    plan_text = "\n".join(row[0] for row in plan)
+                    tables = SEQ_SCAN.findall(plan_text)
+                    if tables:
+                        path_failures += 1
+                        print(f"[FAIL] {name}: sequential scan on {', '.join(tables)}")
+                        print("  " + " ".join(statement.split()))
+                        print("  " + plan_text.replace("\n", "\n  "))
+                if not path_failures:
+                    print(f"[ok]   {name}: {len(captured)} statement(s) checked")
+                failures += path_failures
+
+            await db.close()
+            await trans.rollback()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+        await engine.dispose()
+
+    print(f"{failures} query plan regression(s)")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,182 @@
+import asyncio
+import sys
+import os
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from sqlalchemy import text
+from main import app
+from app.database import AsyncSessionLocal, engine
+from app.models.settings import DEFAULT_TIMEZONE
+from app.crud.user import deactivate_user
+from app.crud.aggregates import check_exercise_totals, check_daily_totals, check_streaks, check_leaderboard_scores
+from app.core.leaderboard import loaded_board_keys
+
+# 書き込みの結果がいくつかの手順で正しいかを、実際にアプリを (ASGI で) 呼び出して確認するコマンド
+#   uv run python check_scenarios.py   # 失敗があれば内容を表示して終了コード 1
+#
+# シナリオごとに確認用のユーザーを作り、最後に削除する。
+# 各シナリオのあとに、そのユーザーの集計テーブルが training_logs から作り直した結果と一致するかも確かめる。
+
+CHECK_PASSWORD = "scenario-check"
+AGGREGATE_CHECKS = [
+    ("user_exercise_totals", check_exercise_totals),
+    ("user_daily_totals", check_daily_totals),
+    ("user_streaks", check_streaks),
+    ("leaderboard_scores", check_leaderboard_scores),
+]
+
+SCENARIOS = []
+
+def scenario(fn):
+    SCENARIOS.append(fn)
+    return fn
+
+class ScenarioFailed(Exception):
+    pass
+
+def expect(actual, expected, what: str):
+    if actual != expected:
+        raise ScenarioFailed(f"{what}: expected {expected!r}, got {actual!r}")
+
+def local_noon(days_ago: int) -> str:
+    # 確認用のユーザーのタイムゾーン（既定値）で days_ago 日前の正午
+    tz = ZoneInfo(DEFAULT_TIMEZONE)
+    day = datetime.now(tz).date() - timedelta(days=days_ago)
+    return datetime.combine(day, time(12), tz).isoformat()
+
+def log(days_ago: int, exercise_name: str = "pushup", count: int = 10) -> dict:
+    return {"performed_at": local_noon(days_ago), "exercise_name": exercise_name, "count": count}
+
+@scenario
+async def backdated_batch_joins_streak(client: httpx.AsyncClient):
+    # 今日のあとに、1 回のバッチで 2 日前と昨日を記録すると 3 日連続になる
+    response = await client.post("/training-logs", json=log(0))
+    expect(response.status_code, 200, "POST /training-logs")
+    response = await client.post("/training-logs/batch", json={"logs": [log(2), log(1)]})
+    expect(response.status_code, 200, "POST /training-logs/batch")
+    stats = (await client.get("/training-logs/stats")).json()
+    expect((stats["streak_days"], stats["longest_streak"]), (3, 3), "streak after backdated batch")
+
+@scenario
+async def backdated_batch_bridges_gap(client: httpx.AsyncClient):
+    # 5〜4 日前と今日の間を 1 回のバッチで埋めると、前の連続区間ともつながる
+    response = await client.post("/training-logs/batch", json={"logs": [log(5), log(4)]})
+    expect(response.status_code, 200, "POST /training-logs/batch")
+    response = await client.post("/training-logs", json=log(0))
+    expect(response.status_code, 200, "POST /training-logs")
+    response = await client.post("/training-logs/batch", json={"logs": [log(1), log(3, "squat"), log(2)]})
+    expect(response.status_code, 200, "POST /training-logs/batch")
+    stats = (await client.get("/training-logs/stats")).json()
+    expect((stats["streak_days"], stats["longest_streak"]), (6, 6), "streak after bridging batch")
+
+@scenario
+async def backdated_batch_after_long_history(client: httpx.AsyncClient):
+    # 長い履歴のあとに古い日を含むバッチを送っても、数え直す範囲（最長連続日数ぶん）の外まで続く区間を正しく数える
+    # 700〜430 日前は 1 日おき、420〜411 日前は 10 日連続（最長）、今日
+    history = [log(days_ago) for days_ago in range(700, 429, -2)] + [log(days_ago) for days_ago in range(420, 410, -1)]
+    response = await client.post("/training-logs/batch", json={"logs": history})
+    expect(response.status_code, 200, "POST /training-logs/batch (history)")
+    response = await client.post("/training-logs", json=log(0))
+    expect(response.status_code, 200, "POST /training-logs")
+    # 410 日前で 420〜410 日前の 11 日連続になり、昨日で今日と 2 日連続になる
+    response = await client.post("/training-logs/batch", json={"logs": [log(400), log(410, "squat"), log(1)]})
+    expect(response.status_code, 200, "POST /training-logs/batch (backdated)")
+    stats = (await client.get("/training-logs/stats")).json()
+    expect((stats["streak_days"], stats["longest_streak"]), (2, 11), "streak after backdated batch")
+
+@scenario
+async def unknown_exercise_has_no_leaderboard(client: httpx.AsyncClient):
+    # 誰も記録していない種目は 404 で、メモリ上のボードも作らない
+    for period in ("week", "month", "all"):
+        response = await client.get("/leaderboards/nosuchexercise", params={"period": period})
+        expect(response.status_code, 404, f"GET /leaderboards/nosuchexercise?period={period}")
+    expect([key for key in loaded_board_keys() if key[2] == "nosuchexercise"], [], "boards for an unknown exercise")
+    response = await client.post("/training-logs", json=log(0, "nosuchexercise"))
+    expect(response.status_code, 200, "POST /training-logs")
+    response = await client.get("/leaderboards/nosuchexercise", params={"period": "week"})
+    expect((response.status_code, response.json().get("total_users")), (200, 1), "leaderboard after the first log")
+
+@scenario
+async def null_settings_are_unchanged(client: httpx.AsyncClient):
+    # PUT /settings/me で null を指定した項目は変更しない（NOT NULL の列に書き込んで 500 にならない）
+    response = await client.put("/settings/me", json={"timezone": "UTC", "bgm_volume": 30})
+    expect(response.status_code, 200, "PUT /settings/me")
+    response = await client.put("/settings/me", json={"timezone": None, "bgm_volume": None, "fps": 30})
+    expect(response.status_code, 200, "PUT /settings/me with nulls")
+    settings = response.json()
+    expect((settings["timezone"], settings["bgm_volume"], settings["fps"]), ("UTC", 30, 30), "settings after nulls")
+
+@scenario
+async def deactivated_user_token_stops_working(client: httpx.AsyncClient):
+    # 無効化したユーザーの発行済みトークンは（キャッシュに残っていても）すぐに 401 になり、ログインもできない
+    response = await client.post("/training-logs", json=log(0))
+    expect(response.status_code, 200, "POST /training-logs")
+    me = (await client.get("/users/me")).json()
+    async with AsyncSessionLocal() as db:
+        await deactivate_user(db, me["id"])
+    for method, path in (("GET", "/users/me"), ("GET", "/training-logs/stats")):
+        response = await client.request(method, path)
+        expect(response.status_code, 401, f"{method} {path} after deactivation")
+    response = await client.post("/token", json={"email": me["email"], "password": CHECK_PASSWORD})
+    expect(response.status_code, 401, "POST /token after deactivation")
+
+async def create_check_user(client: httpx.AsyncClient, index: int) -> int:
+    email = f"scenario{index}@scenario.example.com"
+    response = await client.post("/signup", json={"username": f"scenario{index}", "email": email, "password": CHECK_PASSWORD})
+    if response.status_code != 200:
+        raise ScenarioFailed(f"signup: HTTP {response.status_code} {response.text[:200]}")
+    response = await client.post("/token", json={"email": email, "password": CHECK_PASSWORD})
+    client.cookies.set("access_token", response.json()["access_token"])
+    return (await client.get("/users/me")).json()["id"]
+
+async def check_aggregates(user_id: int):
+    async with AsyncSessionLocal() as db:
+        for table, check in AGGREGATE_CHECKS:
+            mismatches = await check(db, user_id=user_id)
+            if mismatches:
+                raise ScenarioFailed(f"{table}: {mismatches}")
+
+async def cleanup():
+    async with AsyncSessionLocal() as db:
+        user_ids = (await db.scalars(text("SELECT id FROM users WHERE email LIKE '%@scenario.example.com'"))).all()
+        for user_id in user_ids:
+            for table in ("training_logs", "user_yucchins", "user_settings"):
+                await db.execute(text(f"DELETE FROM {table} WHERE user_id = :uid"), {"uid": user_id})
+            await db.execute(text("DELETE FROM users WHERE id = :uid"), {"uid": user_id})
+        await db.commit()
+
+async def main():
+    failures = 0
+    try:
+        await cleanup()
+        transport = httpx.ASGITransport(app=app)
+        async with app.router.lifespan_context(app):
+            for index, fn in enumerate(SCENARIOS):
+                async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+                    try:
+                        user_id = await create_check_user(client, index)
+                        await fn(client)
+                        await check_aggregates(user_id)
+                    except ScenarioFailed as e:
+                        failures += 1
+                        print(f"[FAIL] {fn.__name__}: {e}")
+                        continue
+                    except Exception as e:
+                        # アプリの例外 (500) もそのまま失敗として数える
+                        failures += 1
+                        print(f"[FAIL] {fn.__name__}: {e!r}")
+                        continue
+                print(f"[ok]   {fn.__name__}")
+    finally:
+        await cleanup()
+        await engine.dispose()
+
+    print(f"{failures} scenario failure(s)")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
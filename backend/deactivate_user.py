@@ -0,0 +1,43 @@
+import argparse
+import asyncio
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import AsyncSessionLocal, engine
+from app.crud.user import get_user_by_email, deactivate_user
+from app.core.principal import PRINCIPAL_CACHE_TTL_SECONDS
+
+# ユーザーを無効化するコマンド（ログインできなくなり、発行済みのトークンも使えなくなる。ランキングからも外れる）
+#   uv run python deactivate_user.py --email user@example.com
+#   uv run python deactivate_user.py --user-id 1
+#
+# token_version を上げてトークンを無効にする。動いているサーバーは認証情報をプロセスごとにキャッシュしているので、
+# 発行済みのトークンが使えなくなるのは最大 PRINCIPAL_CACHE_TTL_SECONDS 後。
+
+async def main(args):
+    try:
+        async with AsyncSessionLocal() as db:
+            user_id = args.user_id
+            if args.email is not None:
+                user = await get_user_by_email(db, email=args.email)
+                if user is None:
+                    print(f"user {args.email} not found")
+                    return 1
+                user_id = user.id
+            user = await deactivate_user(db, user_id)
+            if user is None:
+                print(f"user {user_id} not found")
+                return 1
+            print(f"deactivated user {user.id} ({user.email}); existing tokens stop working within {PRINCIPAL_CACHE_TTL_SECONDS:g}s")
+            return 0
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deactivate a user and revoke their tokens")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--user-id", type=int, help="user id")
+    target.add_argument("--email", help="user email")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,35 @@
+import argparse
+import asyncio
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import AsyncSessionLocal
+from app.core.export import EXPORT_FORMATS, format_rows
+from app.crud.training import EXPORT_COLUMNS, stream_training_log_rows
+
+# training_logs をストリーミングで書き出す管理用コマンド（全ユーザー分の一括エクスポート）
+#   uv run python export_training_logs.py --format csv --output logs.csv
+#   uv run python export_training_logs.py --user-id 1 > user1.ndjson
+
+async def export(output, fmt: str, user_id=None, batch_size: int = 1000) -> None:
+    async with AsyncSessionLocal() as db:
+        rows = stream_training_log_rows(db, user_id=user_id, batch_size=batch_size)
+        async for chunk in format_rows(rows, EXPORT_COLUMNS, fmt):
+            output.write(chunk)
+
+async def main(args):
+    if args.output == "-":
+        await export(sys.stdout, args.format, args.user_id, args.batch_size)
+    else:
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            await export(f, args.format, args.user_id, args.batch_size)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream training_logs as NDJSON or CSV")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--user-id", type=int, default=None, help="export a single user (default: all users)")
+    parser.add_argument("--output", default="-", help="output file (default: stdout)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows fetched per round trip")
+    asyncio.run(main(parser.parse_args()))
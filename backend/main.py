@@ -1,45 +1,153 @@
+# 以降の import にかかった時間を測るので最初に読み込む
+from app.core.startup import finish_imports, startup_phase, mark_ready, mark_not_ready
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
-from app.routers import auth, users, settings, yucchin, training
+from app.routers import auth, users, settings, yucchin, training, leaderboard, live_training, health
 
-from contextlib import asynccontextmanager
-from app.database import engine, Base
-# Import all models to ensure they are registered with Base.metadata
-from app.models import user, settings as settings_model
+import asyncio
+import logging
+import anyio
+import os
+from contextlib import asynccontextmanager, suppress
+from app.database import engine, replica_engine, AsyncSessionLocal, warm_up_pool, check_replica
+from app.crud.user import warm_up_auth_queries
+from app.crud.yucchin import load_unlock_rules, reload_unlock_rules_if_changed
+from app.crud.leaderboard import refresh_leaderboards
+from app.crud.live_training import flush_expired_live_sessions, flush_all_live_sessions
+from app.core.live_training import WS_RESUME_SECONDS
+from app.core.replica import DB_REPLICA_CHECK_SECONDS, replica_state
+from app.core.origins import ALLOWED_ORIGINS
+from app.migrations import verify_schema_version
+from app.core.security import PasswordHashingBusyError, PASSWORD_HASH_RETRY_AFTER_SECONDS, warm_up_security
+
+logger = logging.getLogger("app")
+
+# yucchin_catalog を読み直す間隔（0 以下なら起動時だけ読む）
+CATALOG_RELOAD_SECONDS = float(os.getenv("CATALOG_RELOAD_SECONDS", "60"))
+# 読み込み済みのランキングを読み直す間隔（他のワーカーでの書き込みはこの間隔で反映される。0 以下なら読み直さない）
+LEADERBOARD_REFRESH_SECONDS = float(os.getenv("LEADERBOARD_REFRESH_SECONDS", "30"))
+# 起動時に接続プール・よく使う SQL・bcrypt を準備してから受け付ける（false なら最初のリクエストで準備される）
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+
+async def reload_catalog(db):
+    if await reload_unlock_rules_if_changed(db):
+        logger.info("yucchin catalog reloaded")
+
+async def check_replica_health(db):
+    # レプリカの遅延を測り、読み取りをレプリカに振り分けるかを決め直す（db はプライマリなので使わない）
+    await check_replica()
+
+async def run_periodically(seconds: float, name: str, job):
+    while True:
+        await asyncio.sleep(seconds)
+        try:
+            async with AsyncSessionLocal() as db:
+                await job(db)
+        except Exception:
+            logger.exception("periodic job %s failed", name)
+
+async def warm_up():
+    # 最初のリクエスト（特にデプロイ直後のログイン）が接続を張る時間・SQL のコンパイル・bcrypt の読み込みを待たないようにする
+    with startup_phase("warm_up_pool"):
+        await warm_up_pool(prepare=warm_up_auth_queries)
+    if replica_engine is not None and replica_state.healthy:
+        with startup_phase("warm_up_replica_pool"):
+            await warm_up_pool(replica_engine)
+    with startup_phase("warm_up_security"):
+        await warm_up_security()
+    with startup_phase("warm_up_threads"):
+        # 同期の依存関係（トークンの読み取りなど）を実行する anyio のバックエンドとワーカースレッドを用意しておく
+        await anyio.to_thread.run_sync(lambda: None)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # テスト環境か本番環境かを判定し、マイグレーションの要否を判断する
-    # 現時点では、指示に従い、単純な create_all を実行する
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    finish_imports()
+    # スキーマの作成・変更は migrate.py で行う。起動時はバージョンの確認だけ
+    with startup_phase("verify_schema"):
+        await verify_schema_version(engine)
+    # ゆっちんの獲得条件を読み込んでインデックスを作っておく（GET /yucchins/catalog の JSON もここで作る）
+    with startup_phase("load_unlock_rules"):
+        async with AsyncSessionLocal() as db:
+            await load_unlock_rules(db)
+    if replica_engine is not None:
+        # 最初の確認が終わるまでは全員プライマリから読む（レプリカが止まっていても起動は続ける）
+        with startup_phase("check_replica"):
+            await check_replica()
+    if STARTUP_WARMUP:
+        await warm_up()
+    jobs = [
+        (CATALOG_RELOAD_SECONDS, "yucchin_catalog", reload_catalog),
+        (LEADERBOARD_REFRESH_SECONDS, "leaderboards", refresh_leaderboards),
+        # 再接続されなかった /ws/training のセッションの残りを記録する
+        (min(max(WS_RESUME_SECONDS, 1), 30), "live_training_sessions", flush_expired_live_sessions),
+        (DB_REPLICA_CHECK_SECONDS if replica_engine is not None else 0, "replica_health", check_replica_health),
+    ]
+    tasks = [asyncio.create_task(run_periodically(*job)) for job in jobs if job[0] > 0]
+    mark_ready()
     yield
+    mark_not_ready()
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        with suppress(asyncio.CancelledError):
+            await task
+    # 接続はすべて閉じているので、切断中のセッションも含めて残りのセットを記録する
+    async with AsyncSessionLocal() as db:
+        await flush_all_live_sessions(db)
 
 app = FastAPI(lifespan=lifespan)
 
 # CORS configuration
-import os
-origins = [
-    "http://localhost:5173",  # Vite default port
-    "http://localhost:5174",  # Second Vite port
-    "http://127.0.0.1:5173",
-    "http://127.0.0.1:5174",
-]
-
-frontend_url = os.getenv("FRONTEND_URL")
-if frontend_url:
-    origins.append(frontend_url)
-
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=origins,
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["Content-Type", "Authorization"],
 )
 
 from fastapi import Request
+from fastapi.responses import JSONResponse
+from app.core.metrics import start_request_stats, observe_request
+from app.core.query_budget import count_queries, get_query_budget, format_violation
+import time
+
+@app.exception_handler(PasswordHashingBusyError)
+async def password_hashing_busy_handler(request: Request, exc: PasswordHashingBusyError):
+    # パスワードのハッシュ計算待ちが詰まっているときは、ループを止めずにすぐ断る
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "只今混み合っています。しばらくしてから再度お試しください"},
+        headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER_SECONDS)},
+    )
+
+# DEBUG_QUERY_COUNT=true のときだけ、レスポンスに X-Query-Count を付け、
+# クエリバジェットを超えたリクエストは発行した SQL と一緒にログに出す
+if os.getenv("DEBUG_QUERY_COUNT", "false").lower() == "true":
+    @app.middleware("http")
+    async def add_query_count_header(request: Request, call_next):
+        with count_queries() as recorder:
+            response = await call_next(request)
+        response.headers["X-Query-Count"] = str(recorder.count)
+        route = request.scope.get("route")
+        budget = get_query_budget(route)
+        if budget is not None and recorder.count > budget:
+            logger.warning("query budget exceeded\n%s", format_violation(request.method, route.path, budget, recorder))
+        return response
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # ルートごとのレイテンシと、リクエスト内で発行した SQL の件数・時間・プール待ち時間を記録する
+    # (ストリーミングのレスポンスはヘッダーを返すまでの時間)
+    stats = start_request_stats()
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    # パスそのものではなくルートのテンプレートをラベルにする（存在しないパスは 1 つにまとめる）
+    route_path = route.path if route is not None else "unmatched"
+    observe_request(request.method, route_path, response.status_code, time.perf_counter() - started, stats)
+    return response
 
 @app.middleware("http")
 async def add_security_headers(request: Request, call_next):
@@ -61,6 +169,9 @@ app.include_router(users.router)
 app.include_router(settings.router, prefix="/settings", tags=["settings"])
 app.include_router(yucchin.router, tags=["yucchins"])
 app.include_router(training.router, tags=["training"])
+app.include_router(leaderboard.router, tags=["leaderboards"])
+app.include_router(live_training.router, tags=["training"])
+app.include_router(health.router, tags=["health"])
 
 @app.get("/")
 async def get():
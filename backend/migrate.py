@@ -0,0 +1,38 @@
+import argparse
+import asyncio
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import engine
+from app.migrations import MIGRATIONS, LATEST_VERSION, get_schema_version, upgrade
+
+# スキーマのマイグレーションを適用するコマンド
+#   uv run python migrate.py            # 最新まで適用
+#   uv run python migrate.py --status   # 現在のバージョンを表示
+
+async def main(args):
+    try:
+        if args.status:
+            async with engine.connect() as conn:
+                current = await get_schema_version(conn)
+            print(f"schema version: {current} (latest: {LATEST_VERSION})")
+            for migration in MIGRATIONS:
+                mark = "x" if current is not None and migration.VERSION <= current else " "
+                print(f"  [{mark}] {migration.VERSION:04d} {migration.DESCRIPTION}")
+            return 0 if current == LATEST_VERSION else 1
+
+        applied = await upgrade(engine, target=args.target)
+        for version in applied:
+            print(f"applied migration {version:04d}")
+        print("schema is up to date" if not applied else f"{len(applied)} migration(s) applied")
+        return 0
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply database schema migrations")
+    parser.add_argument("--status", action="store_true", help="show the current schema version and exit")
+    parser.add_argument("--target", type=int, default=None, help="migrate up to this version")
+    sys.exit(asyncio.run(main(parser.parse_args())))
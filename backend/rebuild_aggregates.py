@@ -0,0 +1,38 @@
+import argparse
+import asyncio
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import AsyncSessionLocal
+from app.crud.aggregates import AGGREGATES
+
+# 集計テーブルを training_logs から再構築 / 整合性チェックするコマンド
+#   uv run python rebuild_aggregates.py            # 全ユーザーを再構築
+#   uv run python rebuild_aggregates.py --user-id 1
+#   uv run python rebuild_aggregates.py --check    # 食い違いがあれば終了コード 1
+
+async def main(args):
+    async with AsyncSessionLocal() as db:
+        if args.check:
+            total_mismatches = 0
+            for table, _, check in AGGREGATES:
+                mismatches = await check(db, user_id=args.user_id)
+                for m in mismatches:
+                    print(f"{table}: " + " ".join(f"{k}={v}" for k, v in m.items()))
+                print(f"{table}: {len(mismatches)} mismatch(es)")
+                total_mismatches += len(mismatches)
+            return 1 if total_mismatches else 0
+
+        for table, rebuild, _ in AGGREGATES:
+            rows = await rebuild(db, user_id=args.user_id)
+            print(f"{table}: rebuilt {rows} row(s)")
+        await db.commit()
+        return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild or verify aggregate tables from training_logs")
+    parser.add_argument("--user-id", type=int, default=None, help="limit to a single user")
+    parser.add_argument("--check", action="store_true", help="only compare aggregates against the raw log")
+    sys.exit(asyncio.run(main(parser.parse_args())))
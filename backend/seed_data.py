@@ -0,0 +1,176 @@
+import argparse
+import asyncio
+import random
+import sys
+import os
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+from app.database import AsyncSessionLocal, engine
+from app.core.security import pwd_context
+from app.crud.aggregates import AGGREGATES
+from app.crud.yucchin import load_unlock_rules
+from app.core.yucchin_rules import UnlockRules
+
+# ベンチマーク・動作確認用の大量データを投入するコマンド
+#   uv run python seed_data.py --users 1000 --logs-per-user 2000 --seed 42 --rebuild
+#   uv run python seed_data.py --replace ...   # 前回投入した seed ユーザーを消してから入れ直す
+#
+# create_user などの crud を通さず、asyncpg の COPY で直接流し込む
+# （パスワードのハッシュは 1 回だけ計算して全ユーザーで共有する。パスワードは --password）。
+# 同じ --seed と --until なら毎回同じデータになる。
+# ユーザーは seed-<番号>@example.com で作るので、--replace でまとめて消せる。
+# 集計テーブル (user_exercise_totals・leaderboard_scores など) は --rebuild を付けたときだけ作り直す。
+
+EMAIL_DOMAIN = "example.com"
+TIMEZONES = ("Asia/Tokyo", "Asia/Tokyo", "Asia/Tokyo", "America/Los_Angeles", "Europe/London", "UTC")
+EXERCISES = ("pushup", "squat", "plank")
+EXERCISE_WEIGHTS = (0.4, 0.4, 0.2)
+COPY_BATCH_SIZE = 50_000
+
+def seed_email(prefix: str, index: int) -> str:
+    return f"{prefix}-{index}@{EMAIL_DOMAIN}"
+
+def generate_logs(rng: random.Random, user_id: int, n_logs: int, until: date, days: int, tz: ZoneInfo):
+    # 1 日に何セットかまとめて記録する人を想定し、活動日を履歴の期間からランダムに選ぶ
+    # (最後の数日は高い確率で活動していて、連続日数が 0 にならないようにする)
+    per_day = rng.randint(3, 9)
+    active = min(days, max(1, -(-n_logs // per_day)))
+    streak = rng.randint(0, min(active, 14))
+    recent = set(range(streak))
+    others = [offset for offset in rng.sample(range(days), active) if offset not in recent]
+    offsets = sorted(recent | set(others[: active - streak]))
+
+    emitted = 0
+    for offset in reversed(offsets):
+        day = until - timedelta(days=offset)
+        session_start = datetime.combine(day, dt_time(rng.randint(6, 21), rng.randint(0, 59)), tz)
+        for i in range(per_day):
+            if emitted >= n_logs:
+                return
+            exercise = rng.choices(EXERCISES, EXERCISE_WEIGHTS)[0]
+            performed_at = (session_start + timedelta(minutes=2 * i)).astimezone(timezone.utc)
+            if exercise == "plank":
+                yield (user_id, performed_at, exercise, None, rng.randint(20, 180))
+            else:
+                yield (user_id, performed_at, exercise, rng.randint(5, 50), None)
+            emitted += 1
+
+def owned_yucchins(rules: UnlockRules, rng: random.Random, totals: dict):
+    # 累計 0 から今の累計までを 1 回で記録したとみなして、獲得条件に沿って持っているはずのゆっちんを決める
+    return rules.select(set(), {}, totals, rng)
+
+async def delete_seed_users(db, prefix: str) -> int:
+    pattern = f"{prefix}-%@{EMAIL_DOMAIN}"
+    user_ids = "SELECT id FROM users WHERE email LIKE :pattern"
+    for table in ("training_logs", "user_yucchins", "user_settings"):
+        await db.execute(text(f"DELETE FROM {table} WHERE user_id IN ({user_ids})"), {"pattern": pattern})
+    result = await db.execute(text("DELETE FROM users WHERE email LIKE :pattern"), {"pattern": pattern})
+    return result.rowcount
+
+async def main(args):
+    rng = random.Random(args.seed)
+    until = args.until or datetime.now(timezone.utc).date()
+    started = time.perf_counter()
+
+    try:
+        async with AsyncSessionLocal() as db:
+            if args.replace:
+                deleted = await delete_seed_users(db, args.prefix)
+                print(f"deleted {deleted} previously seeded users")
+
+            conn = await db.connection()
+            raw = (await conn.get_raw_connection()).driver_connection
+
+            user_ids = list(await db.scalars(
+                text("SELECT nextval('users_id_seq') FROM generate_series(1, :n)"), {"n": args.users}
+            ))
+            rules = await load_unlock_rules(db)
+            hashed = pwd_context.hash(args.password)
+            await raw.copy_records_to_table(
+                "users",
+                columns=["id", "username", "email", "hashed_password", "is_active"],
+                records=[
+                    (user_id, f"{args.prefix[:2]}{index}"[:10], seed_email(args.prefix, index), hashed, True)
+                    for index, user_id in enumerate(user_ids)
+                ],
+            )
+
+            timezones = {user_id: rng.choice(TIMEZONES) for user_id in user_ids}
+            await raw.copy_records_to_table(
+                "user_settings",
+                columns=["user_id", "timezone"],
+                records=[(user_id, name) for user_id, name in timezones.items()],
+            )
+            print(f"{args.users} users inserted ({time.perf_counter() - started:.1f}s)", flush=True)
+
+            # ログはユーザーごとに生成しながら COPY_BATCH_SIZE 件ずつ流す
+            total_logs = 0
+            yucchin_rows = []
+            batch = []
+            for user_id in user_ids:
+                n_logs = max(1, int(rng.expovariate(1 / args.logs_per_user)))
+                totals = {}
+                for row in generate_logs(rng, user_id, n_logs, until, args.days, ZoneInfo(timezones[user_id])):
+                    batch.append(row)
+                    count, duration = totals.get(row[2], (0, 0))
+                    totals[row[2]] = (count + (row[3] or 0), duration + (row[4] or 0))
+                if len(batch) >= COPY_BATCH_SIZE:
+                    await raw.copy_records_to_table(
+                        "training_logs",
+                        columns=["user_id", "performed_at", "exercise_name", "count", "duration"],
+                        records=batch,
+                    )
+                    total_logs += len(batch)
+                    batch = []
+                    print(f"  {total_logs} logs ({time.perf_counter() - started:.1f}s)", flush=True)
+                obtained_at = datetime.combine(until, dt_time(), timezone.utc)
+                yucchin_rows.extend(
+                    (user_id, yucchin_type, rules.name_of(yucchin_type), obtained_at)
+                    for yucchin_type in owned_yucchins(rules, rng, totals)
+                )
+            if batch:
+                await raw.copy_records_to_table(
+                    "training_logs",
+                    columns=["user_id", "performed_at", "exercise_name", "count", "duration"],
+                    records=batch,
+                )
+                total_logs += len(batch)
+
+            await raw.copy_records_to_table(
+                "user_yucchins",
+                columns=["user_id", "yucchin_type", "yucchin_name", "obtained_at"],
+                records=yucchin_rows,
+            )
+            elapsed = time.perf_counter() - started
+            print(f"{total_logs} logs, {len(yucchin_rows)} yucchins inserted ({elapsed:.1f}s, {total_logs / elapsed * 60:,.0f} logs/min)")
+
+            if args.rebuild:
+                rebuild_started = time.perf_counter()
+                # rebuild_aggregates.py と同じくランキングのスコアまですべて作り直す
+                for _, rebuild, _ in AGGREGATES:
+                    await rebuild(db)
+                print(f"aggregates rebuilt ({time.perf_counter() - rebuild_started:.1f}s)")
+            else:
+                print("aggregates not rebuilt; run `uv run python rebuild_aggregates.py` before using stats")
+
+            await db.commit()
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load synthetic users, training logs and yucchins")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--logs-per-user", type=int, default=1000, help="average number of logs per user")
+    parser.add_argument("--days", type=int, default=365, help="length of the history in days")
+    parser.add_argument("--until", type=date.fromisoformat, default=None, help="last day of the history (default: today, UTC)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--prefix", default="seed", help="email prefix of the generated users")
+    parser.add_argument("--password", default="password", help="password shared by all generated users")
+    parser.add_argument("--replace", action="store_true", help="delete previously seeded users with the same prefix first")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild aggregate tables afterwards")
+    asyncio.run(main(parser.parse_args()))
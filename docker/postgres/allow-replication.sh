@@ -0,0 +1,4 @@
+#!/bin/sh
+# レプリカ (docker compose --profile replica) からのストリーミングレプリケーションの接続を許可する
+# docker-entrypoint-initdb.d に置くので、ボリュームが空の初回起動時にだけ実行される
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
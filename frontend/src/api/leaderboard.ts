@@ -0,0 +1,29 @@
+import client from "./client";
+
+export type LeaderboardPeriod = "week" | "month" | "all";
+
+export interface LeaderboardEntry {
+    rank: number;
+    username: string;
+    score: number;
+    is_me: boolean;
+}
+
+export interface LeaderboardResponse {
+    period: LeaderboardPeriod;
+    period_start: string;
+    exercise_name: string;
+    total_users: number;
+    entries: LeaderboardEntry[];
+    me: LeaderboardEntry | null;
+}
+
+export const leaderboardApi = {
+    // 種目ごとのランキング（スコアは回数 + 秒数）と自分の順位。誰も記録していない種目は 404
+    getLeaderboard: async (exerciseName: string, period: LeaderboardPeriod = "week", limit = 10): Promise<LeaderboardResponse> => {
+        const response = await client.get<LeaderboardResponse>(`/leaderboards/${encodeURIComponent(exerciseName)}`, {
+            params: { period, limit },
+        });
+        return response.data;
+    },
+};
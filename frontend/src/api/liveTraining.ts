@@ -0,0 +1,134 @@
+// /ws/training: トレーニング中の回数・秒数を 1 本の WebSocket で送り、セットごとにサーバーで記録する
+// 認証は HttpOnly Cookie（ブラウザの WebSocket は Authorization ヘッダーを付けられない）。
+// 送ったイベントは記録されるまで手元に残し、切断したら再接続して ack より後のものを送り直す。
+
+export interface LiveSetSaved {
+    type: "saved";
+    set: number;
+    log_id: number | null;
+    created: boolean;
+    exercise_name: string | null;
+    count: number;
+    duration: number;
+    ack: number;
+}
+
+type ClientEvent =
+    | { type: "progress"; seq: number; set: number; exercise_name: string; count?: number; duration?: number }
+    | { type: "end_set"; seq: number; set: number }
+    | { type: "end_session"; seq: number };
+
+type ServerMessage =
+    | { type: "ready"; session_id: string; resumed: boolean; ack: number; saved_sets: number[]; heartbeat_seconds: number; resume_seconds: number }
+    | LiveSetSaved
+    | { type: "unlocked"; yucchin_types: number[] }
+    | { type: "ping"; ack: number }
+    | { type: "pong"; ack: number }
+    | { type: "error"; detail: string; seq?: number; sets?: number[] | null }
+    | { type: "closed"; ack: number };
+
+export interface LiveTrainingHandlers {
+    onSaved?: (saved: LiveSetSaved) => void;
+    onUnlocked?: (yucchinTypes: number[]) => void;
+    onError?: (detail: string) => void;
+    onConnectionChange?: (connected: boolean) => void;
+}
+
+// 再接続しないで閉じるコード（正常終了・認証エラー・同じセッションを別のタブで開いた）
+const FINAL_CLOSE_CODES = [1000, 1008, 4000];
+const MAX_RECONNECT_DELAY_MS = 10_000;
+
+const liveTrainingUrl = (sessionId: string) => {
+    const base = (import.meta.env.VITE_API_URL || "http://localhost:8000").replace(/^http/, "ws");
+    return `${base}/ws/training?session_id=${sessionId}`;
+};
+
+export class LiveTrainingSession {
+    readonly sessionId = crypto.randomUUID().replace(/-/g, "");
+    private socket: WebSocket | null = null;
+    private seq = 0;
+    private currentSet = 0;
+    // 記録されるまで送り直す可能性のあるイベント
+    private pending: ClientEvent[] = [];
+    private reconnectDelay = 500;
+    private closing: ((value: void) => void) | null = null;
+    private finished = false;
+
+    constructor(private handlers: LiveTrainingHandlers = {}) {}
+
+    connect() {
+        const socket = new WebSocket(liveTrainingUrl(this.sessionId));
+        this.socket = socket;
+        socket.onmessage = (event) => this.handleMessage(JSON.parse(event.data) as ServerMessage);
+        socket.onclose = (event) => {
+            if (this.socket !== socket) return;
+            this.socket = null;
+            this.handlers.onConnectionChange?.(false);
+            if (this.finished || FINAL_CLOSE_CODES.includes(event.code)) {
+                this.closing?.();
+                return;
+            }
+            setTimeout(() => this.connect(), this.reconnectDelay);
+            this.reconnectDelay = Math.min(this.reconnectDelay * 2, MAX_RECONNECT_DELAY_MS);
+        };
+    }
+
+    addReps(exerciseName: string, count = 1) {
+        this.send({ type: "progress", seq: ++this.seq, set: this.currentSet, exercise_name: exerciseName, count });
+    }
+
+    addDuration(exerciseName: string, seconds: number) {
+        this.send({ type: "progress", seq: ++this.seq, set: this.currentSet, exercise_name: exerciseName, duration: seconds });
+    }
+
+    endSet() {
+        this.send({ type: "end_set", seq: ++this.seq, set: this.currentSet });
+        this.currentSet += 1;
+    }
+
+    // 残りのセットを記録して閉じる（サーバーの closed を待つ）
+    endSession(): Promise<void> {
+        return new Promise((resolve) => {
+            this.closing = resolve;
+            this.send({ type: "end_session", seq: ++this.seq });
+        });
+    }
+
+    private send(event: ClientEvent) {
+        this.pending.push(event);
+        if (this.socket?.readyState === WebSocket.OPEN) {
+            this.socket.send(JSON.stringify(event));
+        }
+    }
+
+    private handleMessage(message: ServerMessage) {
+        switch (message.type) {
+            case "ready": {
+                // サーバーが処理済みのものと記録済みのセットの分を捨て、残りを送り直す
+                const saved = new Set(message.saved_sets);
+                this.pending = this.pending.filter((e) => e.seq > message.ack && !("set" in e && saved.has(e.set)));
+                this.reconnectDelay = 500;
+                this.handlers.onConnectionChange?.(true);
+                for (const event of this.pending) this.socket?.send(JSON.stringify(event));
+                break;
+            }
+            case "saved":
+                this.pending = this.pending.filter((e) => !("set" in e) || e.set !== message.set);
+                this.handlers.onSaved?.(message);
+                break;
+            case "unlocked":
+                this.handlers.onUnlocked?.(message.yucchin_types);
+                break;
+            case "ping":
+                this.socket?.send(JSON.stringify({ type: "pong" }));
+                break;
+            case "error":
+                this.handlers.onError?.(message.detail);
+                break;
+            case "closed":
+                this.finished = true;
+                this.pending = [];
+                break;
+        }
+    }
+}
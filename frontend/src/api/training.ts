@@ -5,6 +5,12 @@ export interface TrainingLogCreate {
     exercise_name: string;
     count?: number;
     duration?: number;
+    idempotency_key?: string; // 再送しても二重登録されないようにするキー
+}
+
+export interface TrainingLogBatchResponse {
+    items: { id: number; idempotency_key: string | null; created: boolean }[];
+    unlocked_yucchin_types: number[];
 }
 
 export interface TrainingLogResponse {
@@ -18,6 +24,21 @@ export interface TrainingLogResponse {
     unlocked_yucchin_types: number[];
 }
 
+export interface TrainingLogPage {
+    items: TrainingLogResponse[];
+    next_cursor: string | null;
+    prev_cursor: string | null;
+}
+
+export interface TrainingLogQuery {
+    limit?: number;
+    before?: string;
+    after?: string;
+    from?: string; // ISO 8601 (inclusive)
+    to?: string; // ISO 8601 (exclusive)
+    exercise_name?: string;
+}
+
 export interface ExerciseStats {
     exercise_name: string;
     total_count: number;
@@ -26,18 +47,76 @@ export interface ExerciseStats {
 
 export interface TrainingStatsResponse {
     streak_days: number;
+    longest_streak: number;
     today_stats: ExerciseStats[];
     total_stats: ExerciseStats[];
 }
 
+export type SeriesBucket = "day" | "week" | "month";
+
+export interface TrainingSeriesQuery {
+    bucket?: SeriesBucket;
+    from?: string; // YYYY-MM-DD（ユーザーのタイムゾーン）
+    to?: string;
+    exercise?: string;
+}
+
+export interface ExerciseSeries {
+    exercise_name: string;
+    // start から順に length 個のバケットの合計
+    count: number[];
+    duration: number[];
+}
+
+export interface TrainingSeriesResponse {
+    bucket: SeriesBucket;
+    timezone: string;
+    start: string;
+    end: string;
+    length: number;
+    series: ExerciseSeries[];
+}
+
 export const trainingApi = {
     createLog: async (log: TrainingLogCreate): Promise<TrainingLogResponse> => {
         const response = await client.post<TrainingLogResponse>("/training-logs", log);
         return response.data;
     },
 
-    getLogs: async (): Promise<TrainingLogResponse[]> => {
-        const response = await client.get<TrainingLogResponse[]>("/training-logs");
+    createLogs: async (logs: TrainingLogCreate[]): Promise<TrainingLogBatchResponse> => {
+        const response = await client.post<TrainingLogBatchResponse>("/training-logs/batch", { logs });
+        return response.data;
+    },
+
+    getLogPage: async (params: TrainingLogQuery = {}): Promise<TrainingLogPage> => {
+        const response = await client.get<TrainingLogPage>("/training-logs", { params });
+        return response.data;
+    },
+
+    // 指定した日（ローカル時間）のログをすべて取得する
+    getLogsForDay: async (date: Date): Promise<TrainingLogResponse[]> => {
+        const from = new Date(date.getFullYear(), date.getMonth(), date.getDate());
+        const to = new Date(from);
+        to.setDate(from.getDate() + 1);
+
+        const logs: TrainingLogResponse[] = [];
+        let before: string | undefined;
+        do {
+            const page = await trainingApi.getLogPage({
+                limit: 200,
+                from: from.toISOString(),
+                to: to.toISOString(),
+                before,
+            });
+            logs.push(...page.items);
+            before = page.next_cursor ?? undefined;
+        } while (before);
+        return logs;
+    },
+
+    // 日・週・月ごとの推移（省略時は 1 年分の日別。ヒートマップ用）
+    getSeries: async (params: TrainingSeriesQuery = {}): Promise<TrainingSeriesResponse> => {
+        const response = await client.get<TrainingSeriesResponse>("/training-logs/series", { params });
         return response.data;
     },
 
@@ -0,0 +1,20 @@
+import client from "./client";
+
+export interface YucchinCatalogEntry {
+    id: number;
+    name: string;
+    rarity: string;
+    priority: number;
+    unlock_kind: "threshold" | "interval";
+    metric: "total" | "count" | "duration";
+    exercise_name: string | null;
+    unlock_value: number;
+}
+
+export const yucchinApi = {
+    // ゆっちんの一覧と獲得条件（ETag 付きなので、2 回目以降はブラウザのキャッシュから 304 で返る）
+    getCatalog: async (): Promise<YucchinCatalogEntry[]> => {
+        const response = await client.get<YucchinCatalogEntry[]>("/yucchins/catalog");
+        return response.data;
+    },
+};
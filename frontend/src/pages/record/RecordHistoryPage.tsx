@@ -1,4 +1,4 @@
-import { useEffect, useState, useMemo } from "react";
+import { useEffect, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import { ChevronLeft, ChevronRight } from "lucide-react";
 import { trainingApi, type TrainingLogResponse } from "@/api/training";
@@ -8,32 +8,31 @@ import { Button } from "@/components/ui/button";
 
 export default function RecordHistoryPage() {
   const navigate = useNavigate();
-  const [allLogs, setAllLogs] = useState<TrainingLogResponse[]>([]);
+  const [dayLogs, setDayLogs] = useState<TrainingLogResponse[]>([]);
   const [selectedDate, setSelectedDate] = useState(new Date());
   const [loading, setLoading] = useState(true);
 
+  // Fetch only the logs of the selected date
   useEffect(() => {
+    let cancelled = false;
     const fetchData = async () => {
       try {
-        const logsData = await trainingApi.getLogs();
-        setAllLogs(logsData);
+        const logsData = await trainingApi.getLogsForDay(selectedDate);
+        if (!cancelled) setDayLogs(logsData);
       } catch (err) {
         console.error("Failed to fetch record data", err);
       } finally {
-        setLoading(false);
+        if (!cancelled) setLoading(false);
       }
     };
 
     fetchData();
-  }, []);
+    return () => {
+      cancelled = true;
+    };
+  }, [selectedDate]);
 
-  // Filter logs based on selected date
-  const filteredLogs = useMemo(() => {
-    const targetDateStr = selectedDate.toDateString();
-    return allLogs.filter(
-      (log) => new Date(log.performed_at).toDateString() === targetDateStr
-    );
-  }, [allLogs, selectedDate]);
+  const filteredLogs = dayLogs;
 
   // Handle date navigation
   const handlePrevDay = () => {
@@ -20,18 +20,12 @@ export default function RecordPage() {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const [statsData, logsData] = await Promise.all([
+        const [statsData, todays] = await Promise.all([
           trainingApi.getStats(),
-          trainingApi.getLogs(),
+          trainingApi.getLogsForDay(new Date()),
         ]);
 
         setStats(statsData);
-
-        // Filter logs for today
-        const today = new Date().toDateString();
-        const todays = logsData.filter(
-          (log) => new Date(log.performed_at).toDateString() === today
-        );
         setTodayLogs(todays);
       } catch (err) {
         console.error("Failed to fetch record data", err);